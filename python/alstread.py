@@ -18,8 +18,12 @@ import sys
 
 sys.path.append(os.path.dirname(__file__))
 import libgnsstime
+import libio
+import libmetrics
+import libperf
 import libtrace
 
+@libperf.timed('crc')
 def checksum(payload):  # ref. [1]
     csum1 = 0
     csum2 = 0
@@ -28,26 +32,35 @@ def checksum(payload):  # ref. [1]
         csum2 = (csum1 + csum2) & 0xff
     return csum1, csum2
 
+def encode_l6(prn, gpsw, gpst, snr, l6):  # ref. [1]
+    ''' returns Allystar L6 raw message with checksum
+        gpst: GPS time of week in millisecond, l6: QZS L6 frame of 250 bytes
+    '''
+    msg = b'\x02\x10' + (264).to_bytes(2, 'little') + \
+        (prn + 700).to_bytes(2, 'little') + bytes([0, 63 + 2]) + \
+        gpsw.to_bytes(2, 'big') + gpst.to_bytes(4, 'big') + bytes([snr, 0]) + \
+        l6[:250] + bytes(2)
+    csum1, csum2 = checksum(msg)
+    return b'\xf1\xd9' + msg + bytes([csum1, csum2])
+
 class AllystarReceiver:
-    dict_snr  = {}   # SNR dictionary
-    dict_data = {}   # payload data dictionary
     last_gpst = 0    # last received GPS time
     l6        = b''  # L6 message
 
-    def __init__(self, trace):
-        self.trace = trace
+    def __init__(self, trace, fp=None):
+        self.trace     = trace
+        self.fp        = fp or libio.fp_in  # own input for multiplexer
+        self.dict_snr  = {}  # SNR dictionary
+        self.dict_data = {}  # payload data dictionary
 
+    @libperf.timed('read')
     def read(self):  # ref. [1]
-        sync = bytes(4)
-        while True:
-            b = sys.stdin.buffer.read(1)
-            if not b:
-                return False
-            sync = sync[1:4] + b
-            if sync == b'\xf1\xd9\x02\x10':
-                break
-        l6 = b'\x02\x10' + sys.stdin.buffer.read(266)
-        csum = sys.stdin.buffer.read(2)
+        nskip = libio.find_sync(self.fp, b'\xf1\xd9\x02\x10')  # number of skipped bytes
+        if nskip < 0:
+            return False
+        libmetrics.bytes_skipped.inc(n=nskip)
+        l6 = b'\x02\x10' + self.fp.read(266)
+        csum = self.fp.read(2)
         if not l6 or not csum:
             return False
         len_l6    = int.from_bytes(l6[ 2: 4], 'little')
@@ -69,6 +82,9 @@ class AllystarReceiver:
         if flag & 0x01                         : self.err += "RS "
         if flag & 0x02                         : self.err += "Week "
         if flag & 0x04                         : self.err += "TOW "
+        if csum[0] != csum1 or csum[1] != csum2: libmetrics.check_failed.inc('checksum')
+        if flag & 0x01                         : libmetrics.check_failed.inc('parity')
+        libmetrics.frames_read.inc()
         return True
 
     def select_sat(self, s_prn):
@@ -118,7 +134,27 @@ if __name__ == '__main__':
     parser.add_argument(
         '-p', '--prn', type=int, default=0,
         help='satellite PRN to be specified (0, 193-211).')
+    parser.add_argument(
+        '--input', metavar='FILE',
+        help='read FILE by memory mapping, or by decompression if FILE is gzip, xz, or bzip2 file, or receive from tcp://HOST:PORT or ntrip://[USER[:PASSWD]@]HOST[:PORT]/MOUNTPOINT with reconnection, instead of stdin.')
+    parser.add_argument(
+        '--input-thread', action='store_true',
+        help='decompress --input FILE in a background thread.')
+    parser.add_argument(
+        '--input-retry', metavar='N', type=int, default=0,
+        help='stop after N consecutive reconnection failures of --input URL (0: unlimited), default 0.')
+    parser.add_argument(
+        '--perf-report', action='store_true',
+        help='show performance report of processing stages to stderr at exit.')
+    parser.add_argument(
+        '--metrics', metavar='TARGET',
+        help='export metrics in Prometheus text format to TARGET file rewritten periodically, or to http://127.0.0.1:TARGET/metrics when TARGET is a port number.')
     args = parser.parse_args()
+    libio.open_input(args.input, args.input_thread, args.input_retry)
+    if args.perf_report:
+        libperf.enable()
+    if args.metrics:
+        libmetrics.start(parser.prog, args.metrics)
     fp_disp, fp_raw = sys.stdout, None
     if args.l6:  # QZS L6 raw message output to stdout
         fp_disp, fp_raw = None, sys.stdout
@@ -18,19 +18,33 @@
 #     Signal B2b (Version 1.0), BDS-SIS-ICD-OS-B2b-1.0, July 2020.
 # [3] Tomoji Takasu, Pocket SDR -An Open-Source GNSS SDR, ver. 0.11,
 #     https://github.com/tomojitakasu/PocketSDR
+# [4] Radio Technical Commission for Maritime Services (RTCM),
+#     Differential GNSS (Global Navigation Satellite Systems) Services
+#     - Version 3, RTCM Standard 10403.3, Apr. 24 2020.
 
 POCKET_SDR_LDPC = 0            # change this to 1 if you use 64-ary LDPC function of Pocket SDR (ref.[3])
 LEN_BCNAV3      = 125          # BDS CNAV3 page size is 1000 sym (125 byte)
 PREAMBLE_BCNAV3 = b'\xeb\x90'  # preamble for BDS B2b message
+UI_ORBIT        = 48           # B2b orbit     correction update interval in second
+UI_CLOCK        = 6            # B2b clock     correction update interval in second
+UI_CBIAS        = 86400        # B2b code bias correction update interval in second
+BDT_GPST        = 14           # GPS time minus BDS time in second
 
 import argparse
+import datetime
 import os
 import sys
 
 sys.path.append(os.path.dirname(__file__))
 import libgnsstime
+import libio
+import libmetrics
+import libperf
+import libserve
 import libssr
+import libsummary
 import libtrace
+from   rtcmread import send_rtcm
 
 try:
     import bitstring
@@ -49,6 +63,7 @@ except ModuleNotFoundError:
     POCKET_SDR_LDPC = 0
 
 
+@libperf.timed('crc')
 def rtk_crc24(data):
     ''' calculate CRC24 for BDS B2b message
         g(x) = x^24 + x^23 + x^18 + x^17 + x^14 + x^11 + x^10 + x^7 + x^6 + x^5 + x^4 + x^3 + x + 1
@@ -100,22 +115,44 @@ def sigmask2signame(satsys, sigmask):
             f'unassigned signal name for satsys={satsys} and sigmask={sigmask}')
     return signame
 
+def sigcode2stmi(satsys, sigcode):
+    ''' convert satellite system and B2b signal code to RTCM SSR signal and
+        tracking mode identifier (DF380), ref.[4], or returns None
+        B2b I and Q are mapped to B2 I and Q that share the same frequency
+    '''
+    if   satsys == 'C':
+        stmi = {0: 0, 1: 9, 2: 10, 4: 12, 5: 13, 7: 6, 8: 7, 12: 3}
+    elif satsys == 'G':
+        stmi = {0: 0, 1: 1, 4: 18, 5: 19, 7: 8, 8: 9, 11: 14, 12: 15, 13: 16}
+    else:
+        stmi = {}
+    return stmi.get(sigcode)
+
 class BdsB2():
     epoch  =  0  # epoch in second within one BDT day
     iodssr = -1  # issue of data indicating configuration change of data generation
     iodp   = -1  # issue of data indicating the PRN mask change
     mask   = bitstring.BitStream(255)  # satellite mask
+    sow    = -1  # BDT second of week from message type 10, 30, or 40
+    fp_rtcm = None  # file pointer for RTCM SSR output
+    now     = None  # UTC to resolve the day of epoch, or None for the current time
+    summary = None  # message counts for summary mode
 
     def __init__(self, trace, stat):
         self.trace = trace
         self.stat  = stat
         self.ssr   = libssr.Ssr(trace)
+        self.orbit = {}     # {sat: (IODN, IODCorr, radial, along, cross)} in meter
+        self.clock = {}     # {sat: (IODCorr, c0)} in meter
+        self.cbias = {}     # {sat: [(RTCM signal ID, code bias), ...]} in meter
+        self.updated = set()  # corrections updated by the current frame
 
     def __del__(self):
         if self.stat:
             self.ssr.show_cssr_stat()
 
     def decode(self, raw, prn_s):
+        libmetrics.frames_read.inc()
         rawb = bitstring.ConstBitStream(raw)
         preamble   = rawb.read( 16)
         prn        = rawb.read(  6).u
@@ -135,17 +172,26 @@ class BdsB2():
             self.trace.show(2, mesdata.hex)
             return
         if POCKET_SDR_LDPC:  # if Pocket SDR (ref.[3]) LDPC python module is available
-            syms = np.fromstring((b2b_data + b2b_parity).bin, 'u1') - ord('0')
-            bits, _ = sdr_ldpc.decode_LDPC_BCNV3(syms)
-            b2b_data = bitstring.Bits(bits)[:486]
+            with libperf.Measure('fec'):
+                syms = np.fromstring((b2b_data + b2b_parity).bin, 'u1') - ord('0')
+                bits, _ = sdr_ldpc.decode_LDPC_BCNV3(syms)
+                b2b_data = bitstring.Bits(bits)[:486]
         pad = bitstring.Bits('uint2=0')  # padding for byte alignment
         frame = (pad + mestype + mesdata).tobytes()
         crc_test = rtk_crc24(frame)
         if crc.tobytes() != crc_test:
+            libmetrics.check_failed.inc('crc')
             msg += self.trace.msg(0, f"CRC error {crc_test.hex()} != {crc.hex}", fg='red')
             self.trace.show(0, msg)
             self.trace.show(2, mesdata.hex)
             return
+        if self.summary:  # counts message type without decoding
+            minute = None
+            if 1 <= mestype.u <= 5:  # epoch in second within one BDT day
+                minute = libsummary.tod2minute(mesdata[:17].u)
+            self.summary.add(f'C{prn:02d}', f'MT{mestype.u}', minute)
+            return
+        self.updated = set()
         if   mestype.u ==  1: msg += self.decode_b2b_1 (mesdata)  # ref.[1], p.15, sect.6.2.2
         elif mestype.u ==  2: msg += self.decode_b2b_2 (mesdata)  # ref.[1], p.17, sect.6.2.3
         elif mestype.u ==  3: msg += self.decode_b2b_3 (mesdata)  # ref.[1], p.20, sect.6.2.4
@@ -161,15 +207,21 @@ class BdsB2():
             msg += self.trace.msg(0, "(unknown message type) ", fg='yellow')
         self.trace.show(0, msg)
         # self.trace.show(2,  mesdata.hex)
+        if self.fp_rtcm:
+            self.send_rtcm_ssr()
 
+    @libperf.timed('decode', 'B2b MT1')
     def decode_b2b_1(self, mesdata):
         ''' decode B2b message type 1
             satellite mask
         '''
         self.epoch  = mesdata.read( 17).u
         mesdata.pos += 4  # reserved
-        self.iodssr = mesdata.read(  2).u
+        iodssr      = mesdata.read(  2).u
         iodp        = mesdata.read(  4).u
+        if iodssr != self.iodssr:  # corrections of previous IODSSR are void
+            self.orbit, self.clock, self.cbias = {}, {}, {}
+        self.iodssr = iodssr
         self.mask   = mesdata.read(255)
         mesdata.pos += 174  # reserved
         msg = self.trace.msg(0, f'MASK  {libssr.epoch2time(self.epoch)} IODSSR={self.iodssr} IODP={iodp}', fg='cyan')
@@ -183,6 +235,7 @@ class BdsB2():
         msg += self.trace.msg(2, f'\nMask: {self.mask.bin}')
         return msg
 
+    @libperf.timed('decode', 'B2b MT2')
     def decode_b2b_2(self, mesdata):
         ''' decode B2b message type 2
             satellite orbit correction and user range accuracy index
@@ -206,9 +259,11 @@ class BdsB2():
             if slot == 0:
                 continue
             msg += self.trace.msg(1, f'\n{slot2satname(slot)} {iodn:{libssr.FMT_IODE}} {iodcorr:7d}   {radial*0.0016:{libssr.FMT_ORB}}  {along*0.0064:{libssr.FMT_ORB}}  {cross*0.0064:{libssr.FMT_ORB}} {libssr.ura2dist(urai):{libssr.FMT_URA}}')
+            self.store_orbit(slot, iodn, iodcorr, radial, along, cross)
         mesdata.pos += 19  # reserved
         return msg
 
+    @libperf.timed('decode', 'B2b MT3')
     def decode_b2b_3(self, mesdata):
         ''' decode B2b message type 3
             differential code bias
@@ -227,12 +282,19 @@ class BdsB2():
             numcb = mesdata.read( 4).u
             satname = slot2satname(slot)
             satsys = satname[0]
+            cbias = []
             for _ in range(numcb):
                 sigcode = mesdata.read( 4).u
                 cb      = mesdata.read(12).i
                 msg += self.trace.msg(1, f'\n{satname} {sigmask2signame(satsys, sigcode):{libssr.FMT_GSIG}}      {cb*0.017:{libssr.FMT_CB}}')
+                stmi = sigcode2stmi(satsys, sigcode)
+                if stmi is not None:
+                    cbias.append((stmi, cb*0.017))
+            self.cbias[satname] = cbias
+        self.updated.add('cbias')
         return msg
 
+    @libperf.timed('decode', 'B2b MT4')
     def decode_b2b_4(self, mesdata):
         ''' decode B2b message type 4
             satellite clock correction
@@ -260,10 +322,13 @@ class BdsB2():
             c0      = mesdata.read(15).i
             if self.mask[maskpos] and c0 != -16383:
                 msg += self.trace.msg(1, f'\n{slot2satname(maskpos+1)} {iodcorr:7d} {c0*0.0016:{libssr.FMT_CLK}}')
+            if self.mask[maskpos]:
+                self.store_clock(maskpos+1, iodcorr, c0)
             maskpos += 1
         mesdata.pos += 10  # reserved
         return msg
 
+    @libperf.timed('decode', 'B2b MT5')
     def decode_b2b_5(self, mesdata):
         ''' decode B2b message type 5
             user range accuracy index
@@ -293,6 +358,7 @@ class BdsB2():
         mesdata.pos += 6  # reserved
         return msg
 
+    @libperf.timed('decode', 'B2b MT6')
     def decode_b2b_6(self, mesdata):
         ''' decode B2b message type 6
             clock coreection and orbit correction - combination 1
@@ -317,6 +383,7 @@ class BdsB2():
             iodcorr = mesdata.read( 3).u
             c0      = mesdata.read(15).i
             msg += self.trace.msg(1, f'\n{slot2satname(slot_s)} {iodcorr} {c0*0.0016:{libssr.FMT_CLK}}m')
+            self.store_clock(slot_s, iodcorr, c0)
             slot_s += 1
         oepoch = mesdata.read(17).u
         mesdata.pos += 4  # reserved
@@ -337,11 +404,13 @@ class BdsB2():
             if slot == 0:
                 continue
             msg += self.trace.msg(1, f'\n{slot2satname(slot)} {iodn:{libssr.FMT_IODE}} {iodcorr:7d} {radial*0.0016:{libssr.FMT_ORB}} {along*0.0064:{libssr.FMT_ORB}} {cross*0.0064:{libssr.FMT_ORB}}')
+            self.store_orbit(slot, iodn, iodcorr, radial, along, cross)
             accuracy = libssr.ura2dist(urai)
             if accuracy != libssr.URA_INVALID:
                 msg += self.trace.msg(1, f'{accuracy:{libssr.FMT_URA}}')
         return msg
 
+    @libperf.timed('decode', 'B2b MT7')
     def decode_b2b_7(self, mesdata):
         ''' decode B2b message type 7
             clock coreection and orbit correction - combination 2
@@ -364,6 +433,7 @@ class BdsB2():
             if slot == 0:
                 continue
             msg += self.trace.msg(1, f'\n{slot2satname(slot)} {iodcorr:7d} {c0*0.0016:{libssr.FMT_CLK}}')
+            self.store_clock(slot, iodcorr, c0)
         oepoch = mesdata.read(17).u
         mesdata.pos += 4
         iodssr = mesdata.read( 2).u
@@ -383,13 +453,16 @@ class BdsB2():
             if slot == 0:
                 continue
             msg += self.trace.msg(1, f'\n{slot2satname(slot)} {iodn:{libssr.FMT_IODE}} {iodcorr} {radial*0.0016:{libssr.FMT_ORB}} {along*0.0064:{libssr.FMT_ORB}} {cross*0.0064:{libssr.FMT_ORB}} {libssr.ura2dist(urai):{libssr.FMT_URA}}')
+            self.store_orbit(slot, iodn, iodcorr, radial, along, cross)
         return msg
 
+    @libperf.timed('decode', 'B2b MT10')
     def decode_b2b_10(self, mesdata):
         ''' decode B2b message type 10
             ephemeris, DIF1, SIF1, AIF1, SISMA
         '''
         sow          = mesdata.read(20).u
+        self.sow     = sow
         mesdata.pos += 4  # reserved
         # ephemeris 1 (203 bit)
         toe          = mesdata.read(11).u
@@ -420,11 +493,13 @@ class BdsB2():
         msg = self.trace.msg(0, f'EPH  {libssr.epoch2timedate(sow)} TOE={toe} sattype={sattype}', fg='cyan')
         return msg
 
+    @libperf.timed('decode', 'B2b MT30')
     def decode_b2b_30(self, mesdata):
         ''' decode B2b message type 30
             Clock, TGD, Ionosphere, BDT-UTC, EOP, SISA, HS
         '''
         sow = mesdata.read(20).u
+        self.sow = sow
         wn  = mesdata.read(13).u
         mesdata.pos += 4  # reserved
         # clock correction parameters (69 bit)
@@ -473,11 +548,13 @@ class BdsB2():
         msg = self.trace.msg(0, f'CLK  {libgnsstime.gps2utc(wn, sow, "BDS")}', fg='cyan')
         return msg
 
+    @libperf.timed('decode', 'B2b MT40')
     def decode_b2b_40(self, mesdata):
         ''' decode B2b message type 40
             BGT0, MidiAlmana, WNa
         '''
         sow = mesdata.read(20).u
+        self.sow = sow
         # BGT0 (68 bit)
         gnssid  = mesdata.read( 3).u
         wn0bgto = mesdata.read(13).u
@@ -515,6 +592,7 @@ class BdsB2():
         msg = self.trace.msg(0, f'ALM  {libgnsstime.gps2utc(wn0bgto, t0bgto, "BDS")}', fg='cyan')
         return msg
 
+    @libperf.timed('decode', 'B2b MT63')
     def decode_b2b_63(self, mesdata):
         ''' decode B2b null message type 63
             null message
@@ -522,6 +600,74 @@ class BdsB2():
         msg = self.trace.msg(0, 'NULL', fg='cyan')
         return msg
 
+    def store_orbit(self, slot, iodn, iodcorr, radial, along, cross):
+        ''' stores B2b orbit correction of the satellite slot '''
+        satname = slot2satname(slot)
+        self.orbit[satname] = (iodn, iodcorr, radial*0.0016, along*0.0064, cross*0.0064)
+        self.updated.add('orbit')
+
+    def store_clock(self, slot, iodcorr, c0):
+        ''' stores B2b clock correction of the satellite slot '''
+        satname = slot2satname(slot)
+        if c0 == -16383:  # unavailable
+            self.clock.pop(satname, None)
+        else:
+            self.clock[satname] = (iodcorr, c0*0.0016)
+        self.updated.add('clock')
+
+    def epoch2tow(self):
+        ''' returns BDT second of week from B2b epoch (second of BDT day)
+            the day of week comes from the latest message type 10, 30, or 40,
+            or from the current time, or UTC now if given, until one of them
+            is received
+        '''
+        sow = self.sow
+        if sow < 0:
+            now = self.now
+            if now is None:
+                now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            sow = int(libgnsstime.utc2gps(now, 'BDS').split()[1])
+        tow = sow - sow % 86400 + self.epoch
+        if   tow - sow >  43200: tow -= 86400
+        elif sow - tow >  43200: tow += 86400
+        return tow % 604800
+
+    def send_rtcm_ssr(self):
+        ''' sends the corrections updated by the current frame as RTCM SSR
+            messages, ref.[4]. Orbit and clock corrections are sent for the
+            satellites whose IODCorr of orbit and clock are the same.
+            B2b clock correction has the opposite sign of RTCM one.
+        '''
+        if not self.updated:
+            return
+        bdt = self.epoch2tow()
+        for satsys in ['C', 'G']:
+            epoch = bdt if satsys == 'C' else (bdt + BDT_GPST) % 604800
+            orbit, clock = [], []
+            for satname, (iodn, iodcorr, radial, along, cross) in self.orbit.items():
+                if satname[0] != satsys or satname not in self.clock:
+                    continue
+                c_iodcorr, c0 = self.clock[satname]
+                if iodcorr != c_iodcorr:
+                    continue
+                # IODE is LSB 8 bit of IODC for GPS, while BeiDou IOD (toe
+                # modulo and IOD CRC) cannot be derived from IODN without
+                # B-CNAV ephemeris, and IODN is sent as it is with zero CRC
+                iode = iodn if satsys == 'C' else iodn % 256
+                orbit.append((int(satname[1:]), iode, radial, along, cross))
+                clock.append((int(satname[1:]), -c0))
+            if 'orbit' in self.updated and orbit:
+                send_rtcm(self.fp_rtcm, libssr.ssr_encode_orbit(satsys, epoch,
+                    libssr.ui2index(UI_ORBIT), self.iodssr, orbit))
+            if 'clock' in self.updated and clock:
+                send_rtcm(self.fp_rtcm, libssr.ssr_encode_clock(satsys, epoch,
+                    libssr.ui2index(UI_CLOCK), self.iodssr, clock))
+            cbias = [(int(satname[1:]), cb) for satname, cb in self.cbias.items()
+                if satname[0] == satsys and cb]
+            if 'cbias' in self.updated and cbias:
+                send_rtcm(self.fp_rtcm, libssr.ssr_encode_code_bias(satsys,
+                    epoch, libssr.ui2index(UI_CBIAS), self.iodssr, cbias))
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         description='BeiDou B2b message read')
@@ -534,14 +680,46 @@ if __name__ == '__main__':
     parser.add_argument(
         '-p', '--prn', type=int, default=0,
         help='show B2b message for specified PRN only.')
+    parser.add_argument(
+        '-r', '--rtcm', action='store_true',
+        help='send RTCM SSR messages to stdout (it also turns off display messages unless -m is specified). BeiDou orbit corrections carry IODN in place of the IOD of ephemeris, which does not identify a broadcast ephemeris.')
     parser.add_argument(
         '-s', '--statistics', action='store_true',
         help='show B2b statistics in display messages.')
+    parser.add_argument(
+        '--time', metavar='UTC',
+        help='UTC of "YYYY-MM-DD hh:mm:ss" or YYYY-MM-DDThh:mm:ss near the beginning of the input, which gives the day of B2b corrections for -r option until message type 10, 30, or 40 is received, instead of the current time.')
     parser.add_argument(
         '-t', '--trace', type=int, default=0,
         help='show display verbosely: 1=detail, 2=bit image.')
+    parser.add_argument(
+        '--input', metavar='FILE',
+        help='read FILE by memory mapping, or by decompression if FILE is gzip, xz, or bzip2 file, or receive from tcp://HOST:PORT or ntrip://[USER[:PASSWD]@]HOST[:PORT]/MOUNTPOINT with reconnection, instead of stdin.')
+    parser.add_argument(
+        '--input-thread', action='store_true',
+        help='decompress --input FILE in a background thread.')
+    parser.add_argument(
+        '--input-retry', metavar='N', type=int, default=0,
+        help='stop after N consecutive reconnection failures of --input URL (0: unlimited), default 0.')
+    parser.add_argument(
+        '--summary', action='store_true',
+        help='show counts of message types per PRN and per minute at the end, without decoding message fields (it also turns off display and RTCM messages).')
+    libserve.add_arguments(parser)
+    parser.add_argument(
+        '--perf-report', action='store_true',
+        help='show performance report of processing stages to stderr at exit.')
+    parser.add_argument(
+        '--metrics', metavar='TARGET',
+        help='export metrics in Prometheus text format to TARGET file rewritten periodically, or to http://127.0.0.1:TARGET/metrics when TARGET is a port number.')
     args = parser.parse_args()
-    fp_disp = sys.stdout
+    libio.open_input(args.input, args.input_thread, args.input_retry)
+    if args.perf_report:
+        libperf.enable()
+    if args.metrics:
+        libmetrics.start(parser.prog, args.metrics)
+    fp_disp, fp_rtcm = sys.stdout, None
+    if args.rtcm:  # RTCM message output to stdout
+        fp_disp, fp_rtcm = None, sys.stdout
     if args.message:  # show B2b message to stderr
         fp_disp = sys.stderr
     if args.trace < 0:
@@ -550,13 +728,34 @@ if __name__ == '__main__':
     if args.prn < 0:
         libtrace.err(f'PRN should be positive ({args.trace}).')
         sys.exit(1)
+    now = None  # UTC to resolve the day of epoch, or None for the current time
+    if args.time is not None:
+        try:
+            now = datetime.datetime.strptime(args.time.replace('T', ' '), libgnsstime.FORMAT_DT)
+        except ValueError:
+            libtrace.err(f'time should be "YYYY-MM-DD hh:mm:ss" or YYYY-MM-DDThh:mm:ss ({args.time}).')
+            sys.exit(1)
+    if args.summary:
+        fp_disp, fp_rtcm = None, None
+    server = libserve.open_server(args)
+    if server:  # standard output is sent to TCP clients
+        fp_disp = server if fp_disp is sys.stdout else fp_disp
+        fp_rtcm = server if fp_rtcm is sys.stdout else fp_rtcm
     trace = libtrace.Trace(fp_disp, args.trace, args.color)
     bdsb2 = BdsB2(trace, args.statistics)
+    bdsb2.fp_rtcm = fp_rtcm
+    bdsb2.now     = now
+    if args.summary:
+        bdsb2.summary = libsummary.Summary('PRN')
     try:
-        raw = sys.stdin.buffer.read(LEN_BCNAV3)
+        with libperf.Measure('read'):
+            raw = libio.fp_in.read(LEN_BCNAV3)
         while raw:
             bdsb2.decode(raw, args.prn)
-            raw = sys.stdin.buffer.read(LEN_BCNAV3)
+            with libperf.Measure('read'):
+                raw = libio.fp_in.read(LEN_BCNAV3)
+        if bdsb2.summary:
+            bdsb2.summary.show()
     except (BrokenPipeError, IOError):
         devnull = os.open(os.devnull, os.O_WRONLY)
         os.dup2(devnull, sys.stdout.fileno())
@@ -0,0 +1,42 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# clasgrid.py: CLAS compact network ID and grid points at user positions
+# A part of QZS L6 Tool, https://github.com/yoronneko/qzsl6tool
+#
+# Copyright (c) 2024 Satoshi Takahashi, all rights reserved.
+#
+# Released under BSD 2-clause license.
+
+import sys
+
+import libgrid
+import libssr
+
+def show_grid(lat, lon):
+    ''' shows network ID, and grid numbers and interpolation weights
+        in the network, a line per position
+    '''
+    nid, index, weight = libgrid.lookup(lat, lon)
+    for p in range(len(nid)):
+        grids = ' '.join(f'{libgrid.GRID_NO[i]}:{w:.3f}'
+            for i, w in zip(index[p], weight[p]) if 0 <= i)
+        name = libssr.CLASGRID[nid[p]-1][0] if nid[p] else 'NONE'
+        print(f"{lat[p]:.4f} {lon[p]:.4f} {nid[p]} ({name}) {grids}".rstrip())
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        show_grid([float(sys.argv[1])], [float(sys.argv[2])])
+    elif len(sys.argv) == 1 and not sys.stdin.isatty():
+        lat, lon = [], []
+        for line in sys.stdin:
+            if line.strip():
+                lat.append(float(line.split()[0]))
+                lon.append(float(line.split()[1]))
+        show_grid(lat, lon)
+    else:
+        print("Latitude Longitude to CLAS Network ID and Grid")
+        print(f"Usage: {sys.argv[0]} lat lon")
+        print(f"       {sys.argv[0]} < file of lines of lat lon")
+
+# EOF
@@ -0,0 +1,423 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# cssrgen.py: synthetic compact SSR (CSSR) message generation
+# A part of QZS L6 Tool, https://github.com/yoronneko/qzsl6tool
+#
+# Copyright (c) 2024 Satoshi Takahashi, all rights reserved.
+#
+# Released under BSD 2-clause license.
+#
+# References:
+# [1] Cabinet Office, Government of Japan, Quasi-Zenith Satellite System
+#     Interface Specification Centimeter Level Augmentation Service,
+#     IS-QZSS-L6-005, Sept. 21, 2022.
+# [2] Radio Technical Commission for Maritime Services (RTCM),
+#     Differential GNSS (Global Navigation Satellite Systems) Services
+#     - Version 3, RTCM Standard 10403.3, Apr. 24 2020.
+
+import argparse
+import io
+import os
+import random
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+import libssr
+import libtrace
+from   qzsl6read import send_l6
+from   rtcmread  import send_rtcm
+
+try:
+    import bitstring
+except ModuleNotFoundError:
+    libtrace.err('''\
+    This code needs bitstring module.
+    Please install this module such as \"pip install bitstring\".
+    ''')
+    sys.exit(1)
+
+LEN_DPART = 1695  # bit length of L6 data part
+N_DPART   = 5     # number of data parts in a subframe
+LEN_SF    = LEN_DPART * N_DPART  # bit length of messages in a subframe
+SF_PERIOD = 5     # subframe period in second
+N_SF      = 6     # number of subframes in a mask cycle
+UI        = 2     # update interval index of 5 s, ref. [1]
+
+def signames(satsys):
+    ''' returns signal names of satellite system in signal mask order '''
+    return [signame for signame in (libssr.sigmask2signame(satsys, sigmask)
+        for sigmask in range(16)) if signame]
+
+class CssrGen:
+    "Synthetic CSSR message generation class"
+    epoch  = 0  # GPS time of week in second
+    iodssr = 0  # IOD SSR
+    sfn    = 0  # subframe number
+
+    def __init__(self, gnss, nsat, nsig, cnid, seed):
+        self.ssr  = libssr.Ssr(libtrace.Trace(None))
+        self.rng  = random.Random(seed)
+        self.cnid = cnid
+        self.gsys = {}
+        self.gsig = {}
+        for satsys in gnss:
+            self.gsys[satsys] = [f'{satsys}{prn:02d}'
+                for prn in sorted(self.rng.sample(range(1, 41), nsat))]
+            self.gsig[satsys] = signames(satsys)[:nsig]
+        self.fp_l6   = None
+        self.fp_rtcm = None
+        self.prn     = 193
+        self.queue   = []  # messages waiting for the room of a subframe
+
+    def rand(self, bw, lsb):
+        ''' returns random value excluding invalid value of bit width bw '''
+        return self.rng.randrange(-(1 << (bw - 1)) + 1, 1 << (bw - 1)) * lsb
+
+    def sats(self):
+        ''' returns all satellite names in mask '''
+        return [gsys for satsys in self.gsys for gsys in self.gsys[satsys]]
+
+    def cells(self):
+        ''' returns all (satellite name, signal name) in mask '''
+        return [(gsys, gsig) for satsys in self.gsys
+            for gsys in self.gsys[satsys] for gsig in self.gsig[satsys]]
+
+    def gen_orbit(self):
+        return {sat: (self.rng.randrange(256), self.rand(15, 0.0016),
+            self.rand(13, 0.0064), self.rand(13, 0.0064)) for sat in self.sats()}
+
+    def gen_clock(self):
+        return {sat: self.rand(15, 0.0016) for sat in self.sats()}
+
+    def gen_cbias(self):
+        return {cell: self.rand(11, 0.02) for cell in self.cells()}
+
+    def gen_pbias(self):
+        return {cell: (self.rand(15, 0.001), self.rng.randrange(4))
+            for cell in self.cells()}
+
+    def gen_coeff(self):
+        return (self.rand(14, 0.05), self.rand(12, 0.02), self.rand(12, 0.02),
+            self.rand(10, 0.02), self.rand(8, 0.005), self.rand(8, 0.005))
+
+    def gen_messages(self):
+        ''' returns list of CSSR messages of the subframe in (encode, sats),
+            where encode(sats) returns the message, and the message of a
+            subset of sats is also valid unless sats is None
+        '''
+        ssr   = self.ssr
+        e     = self.epoch
+        iod   = self.iodssr
+        ngrid = libssr.CLASGRID[self.cnid-1][1]
+        msgs  = []
+        cycle = self.sfn % N_SF
+        def whole(msg):  # message that is not split
+            msgs.append((lambda _: msg, None))
+        if cycle == 0:
+            self.iodssr = iod = (self.iodssr + 1) % 16
+            whole(ssr.encode_cssr_st1(e, UI, iod, self.gsys, self.gsig))
+            whole(ssr.encode_cssr_st2(e, UI, iod, self.gen_orbit()))
+        whole(ssr.encode_cssr_st3(e, UI, iod, self.gen_clock()))
+        if cycle == 0:
+            whole(ssr.encode_cssr_st4(e, UI, iod, self.gen_cbias()))
+            whole(ssr.encode_cssr_st5(e, UI, iod, self.gen_pbias()))
+            whole(ssr.encode_cssr_st7(e, UI, iod,
+                {sat: self.rng.randrange(1, 64) for sat in self.sats()}))
+        elif cycle == 1:
+            sats  = self.sats()[::2]
+            cbias = self.gen_cbias()
+            pbias = self.gen_pbias()
+            msgs.append((lambda s: ssr.encode_cssr_st6(e, UI, iod,
+                cbias, pbias, self.cnid, s), sats))
+            stec = {sat: (self.rng.randrange(64), self.gen_coeff()) for sat in sats}
+            msgs.append((lambda s: ssr.encode_cssr_st8(e, UI, iod, 3,
+                self.cnid, {sat: stec[sat] for sat in s}), sats))
+        elif cycle == 2:
+            trop = [(2.3 + self.rand(9, 0.004), 0.252 + self.rand(8, 0.004))
+                for _ in range(ngrid)]
+            residual = [{sat: self.rand(7, 0.04) for sat in self.sats()}
+                for _ in range(ngrid)]
+            tqi = self.rng.randrange(64)
+            msgs.append((lambda s: ssr.encode_cssr_st9(e, UI, iod, self.cnid,
+                tqi, 0, trop, [{sat: res[sat] for sat in s} for res in residual]),
+                self.sats()))
+        elif cycle == 3:
+            orbit = self.gen_orbit()
+            clock = self.gen_clock()
+            msgs.append((lambda s: ssr.encode_cssr_st11(e, UI, iod,
+                orbit, clock, self.cnid, s), self.sats()[1::2]))
+            whole(ssr.encode_cssr_st10(self.sfn % 8,
+                bytes(self.rng.randrange(256) for _ in range(5))))
+        elif cycle == 4:
+            stec = {}
+            for sat in self.sats():
+                srs = self.rng.randrange(4)
+                bw  = [4, 4, 5, 7][srs]
+                lsb = [0.04, 0.12, 0.16, 0.24][srs]
+                stec[sat] = (self.rng.randrange(64), 3, self.gen_coeff(), srs,
+                    [self.rand(bw, lsb) for _ in range(ngrid)])
+            trop = (self.rng.randrange(64), 2, self.rand(9, 0.004),
+                self.rand(7, 0.002), self.rand(7, 0.002), self.rand(7, 0.001))
+            trop_res = (1, self.rng.randrange(16),
+                [self.rand(8, 0.004) for _ in range(ngrid)])
+            msgs.append((lambda s: ssr.encode_cssr_st12(e, UI, iod, self.cnid,
+                trop, trop_res, {sat: stec[sat] for sat in s}), self.sats()))
+        elif cycle == 5:
+            whole(ssr.encode_cssr_st11(e, UI, iod, None, self.gen_clock()))
+        return msgs
+
+    @staticmethod
+    def fit(encode, sats, room):
+        ''' returns the largest number of the first satellites of sats whose
+            message fits in room bits, or 0 if none
+        '''
+        lo, hi = 0, len(sats) if sats else 0
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if len(encode(sats[:mid])) <= room:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    def send(self):
+        ''' sends CSSR messages of the subframe, where the messages that
+            do not fit in the subframe are split over satellite subsets
+            or sent in the following subframes
+        '''
+        if self.sfn % N_SF == 0 and self.queue:
+            raise ValueError(f'messages of a cycle do not fit in {N_SF} subframes')
+        for encode, sats in self.gen_messages():
+            msg = encode(sats)
+            if self.fp_rtcm:
+                send_rtcm(self.fp_rtcm, msg)
+            elif LEN_SF < len(msg) and not self.fit(encode, sats, LEN_SF):
+                raise ValueError(f'ST{msg[12:16].u} ({len(msg)} bits) does not fit in a subframe')
+            else:
+                self.queue.append((encode, sats))
+        sf, queue = bitstring.BitStream(), []
+        for encode, sats in self.queue:  # the mask message ST1 is the first
+            msg = encode(sats)
+            if len(sf) + len(msg) <= LEN_SF:
+                sf += msg
+                continue
+            n = self.fit(encode, sats, LEN_SF - len(sf))
+            if n:  # the first satellites in this subframe, and the rest later
+                sf += encode(sats[:n])
+                sats = sats[n:]
+            queue.append((encode, sats))
+        self.queue = queue
+        if self.fp_l6:
+            sf += bitstring.Bits(LEN_SF - len(sf))
+            for dpn in range(N_DPART):
+                mtid = 0b10100000 | (1 if dpn == 0 else 0)  # CLAS, sf_ind
+                send_l6(self.fp_l6, self.prn, mtid,
+                    sf[dpn * LEN_DPART:(dpn + 1) * LEN_DPART])
+        self.sfn  += 1
+        self.epoch = (self.epoch + SF_PERIOD) % 604800
+
+def roundtrip_test(ntest=20, seed=0):
+    '''encodes random corrections of every CSSR subtype, decodes them,
+    and returns True if the decoded values agree with the encoded ones.
+    To execute this round-trip test,
+    python
+    >>> import cssrgen
+    >>> cssrgen.roundtrip_test()
+    '''
+    def decode(dec, payload):
+        ''' decodes the payload, and returns True if successful '''
+        payload = bitstring.ConstBitStream(payload)
+        if not dec.decode_cssr_head(payload):
+            return False
+        decoded = getattr(dec, f'decode_cssr_st{dec.subtype}')(payload)
+        if not decoded or payload.pos != len(payload):
+            print(f'test {n}: ST{dec.subtype} decode failed ({payload.pos}/{len(payload)})')
+            return False
+        return True
+
+    rng = random.Random(seed)
+    for n in range(ntest):
+        gnss = ''.join(rng.sample('GREJCS', rng.randrange(1, 7)))
+        gen  = CssrGen(gnss, rng.randrange(1, 41), rng.randrange(1, 4),
+            rng.randrange(1, libssr.N_NID + 1), rng.randrange(1 << 32))
+        enc  = gen.ssr
+        fp   = io.StringIO()
+        dec  = libssr.Ssr(libtrace.Trace(fp, 1))
+        dec.delta, dec.keyframe = 0., 1  # every decoded value is published
+        payloads = []  # (payload, published values expected, or None)
+        split    = []  # (payload, payloads of two subsets of the satellites)
+        for sfn in range(N_SF):
+            gen.sfn = sfn
+            for encode, sats in gen.gen_messages():
+                payloads.append((encode(sats), None))
+                if sats and 1 < len(sats):
+                    k = rng.randrange(1, len(sats))
+                    split.append((encode(sats), [encode(sats[:k]), encode(sats[k:])]))
+        # the message split over satellite subsets has the same values
+        dec_split = libssr.Ssr(libtrace.Trace(io.StringIO(), 1))
+        dec_split.delta, dec_split.keyframe = 0., 1
+        if not decode(dec_split, payloads[0][0]):  # mask of the cycle
+            return False
+        for payload, parts in split:
+            dec_split.published = {}
+            if not decode(dec_split, payload):
+                return False
+            expect = dec_split.published
+            dec_split.published = {}
+            for part in parts:
+                if not decode(dec_split, part):
+                    return False
+            if dec_split.published != expect:
+                print(f'test {n}: ST{dec_split.subtype} split mismatch')
+                return False
+        e     = gen.epoch
+        cnid  = gen.cnid
+        ngrid = libssr.CLASGRID[cnid-1][1]
+        sats  = gen.sats()
+        nets  = rng.sample(sats, rng.randrange(1, len(sats) + 1))
+        cellmask = {satsys: [rng.randrange(2) for _ in range(
+            len(gen.gsys[satsys]) * len(gen.gsig[satsys]))]
+            for satsys in gnss if rng.randrange(2)}
+        payloads.append((enc.encode_cssr_st1(e, UI, 0, gen.gsys, gen.gsig, cellmask), None))
+        masked = [(gsys, gsig) for i, satsys in enumerate(enc.satsys)
+            for j, gsys in enumerate(enc.gsys[satsys])
+            for k, gsig in enumerate(enc.gsig[satsys])
+            if enc.cellmask[i][j * len(enc.gsig[satsys]) + k]]
+        orbit = gen.gen_orbit()
+        payloads.append((enc.encode_cssr_st2(e, UI, 0, orbit),
+            {('ST2', sat): orbit[sat] for sat in sats}))
+        clock = gen.gen_clock()
+        payloads.append((enc.encode_cssr_st3(e, UI, 0, clock),
+            {('ST3', sat): (clock[sat],) for sat in sats}))
+        cbias = gen.gen_cbias()
+        payloads.append((enc.encode_cssr_st4(e, UI, 0, cbias),
+            {('cssr', *cell): (cbias[cell],) for cell in masked}))
+        pbias = gen.gen_pbias()
+        payloads.append((enc.encode_cssr_st5(e, UI, 0, pbias),
+            {('ST5', *cell): pbias[cell] for cell in masked}))
+        payloads.append((enc.encode_cssr_st6(e, UI, 0, None, pbias),
+            {('ST6', 0, *cell): pbias[cell] for cell in masked}))
+        payloads.append((enc.encode_cssr_st6(e, UI, 0, cbias, pbias, cnid, nets),
+            {('ST6', cnid, *cell): (cbias[cell], *pbias[cell])
+                for cell in masked if cell[0] in nets}))
+        ura = {sat: rng.randrange(64) for sat in sats}
+        dist = {sat: libssr.ura2dist(bitstring.Bits(uint=ura[sat], length=6)) for sat in sats}
+        payloads.append((enc.encode_cssr_st7(e, UI, 0, ura),
+            {('ST7', sat): (dist[sat],) for sat in sats if dist[sat] != libssr.URA_INVALID}))
+        stype = rng.randrange(4)
+        ncoef = [1, 3, 4, 6][stype]  # number of STEC coefficients of type
+        stec  = {sat: (ura[sat], gen.gen_coeff()) for sat in nets}
+        payloads.append((enc.encode_cssr_st8(e, UI, 0, stype, cnid, stec),
+            {('ST8', cnid, sat): (dist[sat], *stec[sat][1][:ncoef]) for sat in nets}))
+        trop = [(2.3 + gen.rand(9, 0.004), 0.252 + gen.rand(8, 0.004))
+            for _ in range(ngrid)]
+        res  = [{sat: gen.rand(16, 0.04) for sat in nets} for _ in range(ngrid)]
+        expect = {('ST9', cnid, grid): trop[grid] for grid in range(ngrid)}
+        expect.update({('ST9', cnid, grid, sat): (res[grid][sat],)
+            for grid in range(ngrid) for sat in nets})
+        payloads.append((enc.encode_cssr_st9(e, UI, 0, cnid, 0, 1, trop, res), expect))
+        payloads.append((enc.encode_cssr_st10(3, bytes(range(10))), {}))
+        payloads.append((enc.encode_cssr_st11(e, UI, 0, orbit, clock, cnid, nets),
+            {('ST11', cnid, sat): (*orbit[sat], clock[sat]) for sat in nets}))
+        payloads.append((enc.encode_cssr_st11(e, UI, 0, None, clock),
+            {('ST11', 0, sat): (clock[sat],) for sat in sats}))
+        trs, tro = rng.randrange(2), rng.randrange(16)
+        tpoly = (rng.randrange(64), 2, gen.rand(9, 0.004), gen.rand(7, 0.002),
+            gen.rand(7, 0.002), gen.rand(7, 0.001))
+        tres  = [gen.rand(8 if trs else 6, 0.004) for _ in range(ngrid)]
+        stec  = {}
+        expect = {('ST12', cnid): (libssr.ura2dist(bitstring.Bits(uint=tpoly[0],
+            length=6)), *tpoly[2:], tro*0.02)}
+        expect.update({('ST12', cnid, grid): (tres[grid],) for grid in range(ngrid)})
+        for sat in nets:
+            sct, srs = rng.randrange(4), rng.randrange(4)
+            bw  = [   4,    4,    5,    7][srs]
+            lsb = [0.04, 0.12, 0.16, 0.24][srs]
+            stec[sat] = (ura[sat], sct, gen.gen_coeff(), srs,
+                [gen.rand(bw, lsb) for _ in range(ngrid)])
+            expect[('ST12', cnid, sat)] = (dist[sat], *stec[sat][2][:[1, 3, 4, 6][sct]])
+            expect.update({('ST12', cnid, grid, sat): (stec[sat][4][grid],)
+                for grid in range(ngrid)})
+        payloads.append((enc.encode_cssr_st12(e, UI, 0, cnid, tpoly,
+            (trs, tro, tres), stec), expect))
+        for payload, expect in payloads:
+            dec.published = {}
+            if not decode(dec, payload):
+                return False
+            if expect is not None and dec.published != expect:
+                print(f'test {n}: ST{dec.subtype} value mismatch')
+                return False
+        if dec.gsys != enc.gsys or dec.gsig != enc.gsig or \
+            [c.bin for c in dec.cellmask] != [c.bin for c in enc.cellmask]:
+            print(f'test {n}: ST1 mask mismatch')
+            return False
+        if 'ST10 3:' + bytes(range(10)).hex() not in fp.getvalue().splitlines():
+            print(f'test {n}: ST10 data mismatch')
+            return False
+    return True
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Synthetic compact SSR (CSSR) message generation')
+    parser.add_argument(
+        '-g', '--gnss', default='GEJ',
+        help='satellite systems in mask (G, R, E, C, J, and S), default GEJ.')
+    parser.add_argument(
+        '-i', '--cnid', type=int, default=7,
+        help='compact network ID for network corrections, default 7 (KANTO).')
+    parser.add_argument(
+        '-n', '--number', type=int, default=0,
+        help='number of subframes to generate (0: endless), default 0.')
+    parser.add_argument(
+        '-p', '--prn', type=int, default=193,
+        help='PRN of QZS L6 message, default 193.')
+    parser.add_argument(
+        '-r', '--rtcm', action='store_true',
+        help='send RTCM message type 4073 instead of QZS L6 messages to stdout.')
+    parser.add_argument(
+        '-s', '--seed', type=int, default=0,
+        help='random seed, default 0.')
+    parser.add_argument(
+        '--nsat', type=int, default=10,
+        help='number of satellites for each satellite system, default 10.')
+    parser.add_argument(
+        '--nsig', type=int, default=2,
+        help='number of signals for each satellite system, default 2.')
+    args = parser.parse_args()
+    if not args.gnss or not set(args.gnss) <= set('GREJCS') or \
+        len(set(args.gnss)) != len(args.gnss):
+        libtrace.err(f'satellite systems should be a combination of G, R, E, C, J, and S ({args.gnss}).')
+        sys.exit(1)
+    if args.cnid < 1 or libssr.N_NID < args.cnid:
+        libtrace.err(f'compact network ID should be in 1-{libssr.N_NID} ({args.cnid}).')
+        sys.exit(1)
+    if args.nsat < 1 or 40 < args.nsat:
+        libtrace.err(f'number of satellites should be in 1-40 ({args.nsat}).')
+        sys.exit(1)
+    for satsys in args.gnss:
+        nsig = len(signames(satsys))
+        if args.nsig < 1 or nsig < args.nsig:
+            libtrace.err(f'number of signals of {satsys} should be in 1-{nsig} ({args.nsig}).')
+            sys.exit(1)
+    gen = CssrGen(args.gnss, args.nsat, args.nsig, args.cnid, args.seed)
+    gen.prn = args.prn
+    if args.rtcm:
+        gen.fp_rtcm = sys.stdout
+    else:
+        gen.fp_l6 = sys.stdout
+    try:
+        while args.number == 0 or gen.sfn < args.number:
+            gen.send()
+    except ValueError as e:
+        libtrace.err(f'{e}, reduce the number of satellites or signals.')
+        sys.exit(1)
+    except (BrokenPipeError, IOError):
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(1)
+    except KeyboardInterrupt:
+        libtrace.warn("User break - terminated")
+        sys.exit()
+
+# EOF
@@ -12,18 +12,29 @@
 # [1] Europe Union Agency for the Space Programme,
 #     Galileo High Accuracy Service Signal-in-Space Interface Control
 #     Document (HAS SIS ICD), Issue 1.0 May 2022.
+# [2] Radio Technical Commission for Maritime Services (RTCM),
+#     Differential GNSS (Global Navigation Satellite Systems) Services
+#     - Version 3, RTCM Standard 10403.3, Apr. 24 2020.
 
 LEN_CNAV_PAGE = 62  # C/NAV page size is 492 bit (61.5 byte)
 MAX_PAGES     = 32  # maximum page size
 T_HASS        = ["Test", "Operational", "Reserved", "Don't use"]  # HAS status table
 
 import argparse
+import datetime
 import os
 import sys
 
 sys.path.append(os.path.dirname(__file__))
+import libgnsstime
+import libio
+import libmetrics
+import libperf
+import libserve
 import libssr
+import libsummary
 import libtrace
+from   rtcmread import send_rtcm
 
 try:
     import bitstring
@@ -302,16 +313,20 @@ class GalE6():
     storing_has_pages = True  # allow storing has pages
     haspage  = [0b0 for i in range(MAX_PAGES)]
     hasindex = [0b0 for i in range(MAX_PAGES)]
+    fp_rtcm  = None   # file pointer for RTCM SSR output
+    now      = None   # UTC to resolve the hour of TOH, or None for the current time
 
     def __init__(self, trace, stat):
         self.trace = trace
         self.stat  = stat
         self.ssr   = libssr.Ssr(trace)
+        self.corr  = {'orbit': {}, 'clock': {}, 'cbias': {}}  # {key: (value, TOH, validity interval)}
 
     def __del__(self):
         if self.stat:
             self.ssr.show_cssr_stat()
 
+    @libperf.timed('decode', 'HAS page')
     def ready_decoding_has(self, satid, cnav):
         ''' returns True when HAS decode is ready, and
             stores HAS page, index, message id (MID), message size (MS)
@@ -348,6 +363,7 @@ class GalE6():
                 self.trace.show(0, disp_msg + ' -> duplicate message')
                 return False
         # store the HAS page and its index (pid: page id)
+        libmetrics.has_pages.inc()
         self.hasindex[self.num_has_pages] = pid
         self.haspage [self.num_has_pages] = [x for x in rawb[rawb.pos:].tobytes()]
         self.mid = mid
@@ -366,11 +382,30 @@ class GalE6():
         self.storing_has_pages = False  # we don't need additional HAS pages
         return True
 
+    def summarize(self, satid, cnav, summary):
+        ''' counts HAS pages per satellite and complete HAS messages per MID
+            from page header, without FEC decoding of the message
+        '''
+        head = bitstring.ConstBitStream(cnav)[14:14+24]  # HAS page header
+        mt   = head[4:6].u   # message type
+        mid  = head[6:11].u  # message id
+        if head.hex == 'af3bc3':
+            item = 'dummy'
+        elif mt != 1:
+            item = f'MT{mt}'
+        else:
+            item = f'MID{mid}'
+        summary.add(f'E{int(satid):02d}', item)
+        if self.ready_decoding_has(satid, cnav):
+            summary.add('HAS', f'MID{self.mid}')
+
     def decode_has_message(self):
-        d = GF(g[np.array(self.hasindex[:self.ms])-1, :self.ms])
-        w = GF(self.haspage[:self.ms])
-        m = np.linalg.inv(d) @ w
-        has_msg = bitstring.ConstBitStream(m.tobytes())
+        with libperf.Measure('fec'):
+            d = GF(g[np.array(self.hasindex[:self.ms])-1, :self.ms])
+            w = GF(self.haspage[:self.ms])
+            m = np.linalg.inv(d) @ w
+            has_msg = bitstring.ConstBitStream(m.tobytes())
+        libmetrics.has_decoded.inc(str(self.mid))
         self.trace.show(2, f'------ HAS decode with the pages of MID={self.mid} MS={self.ms} ------')
         self.trace.show(2, has_msg)
         self.trace.show(2, '------')
@@ -382,15 +417,23 @@ class GalE6():
         if self.f_orbit:
             if not self.ssr.decode_has_orbit(has_msg):
                 msg += '\n' + self.trace.msg(0, 'ORBIT error',fg='red')
+            else:
+                self.store_corr('orbit', self.ssr.orbit, True)
         if self.f_ckful:
             if not self.ssr.decode_has_ckful(has_msg):
                 msg += '\n' + self.trace.msg(0, 'CLOCK FULL error',fg='red')
+            else:
+                self.store_corr('clock', self.ssr.clock, True)
         if self.f_cksub:
             if not self.ssr.decode_has_cksub(has_msg):
                 msg += '\n' + self.trace.msg(0, 'CLOCK SUBSET error', fg='red')
+            else:
+                self.store_corr('clock', self.ssr.clock, False)
         if self.f_cbias:
             if not self.ssr.decode_has_cbias(has_msg):
                 msg += '\n' + self.trace.msg(0, 'CODE BIAS error', fg='red')
+            else:
+                self.store_corr('cbias', self.ssr.cbias, True)
         if self.f_pbias:
             if not self.ssr.decode_has_pbias(has_msg):
                 msg += '\n' + self.trace.msg(0, 'PHASE BIAS error', fg='red')
@@ -399,6 +442,13 @@ class GalE6():
         self.trace.show(2, '------ padding bits ------')
         self.trace.show(2, has_msg[has_msg.pos:].bin)
         self.trace.show(2, '------')
+        if self.fp_rtcm:
+            if self.f_orbit:
+                self.send_rtcm_ssr('orbit')
+            if self.f_ckful or self.f_cksub:
+                self.send_rtcm_ssr('clock')
+            if self.f_cbias:
+                self.send_rtcm_ssr('cbias')
 
     def decode_has_header(self, has_msg):
         ''' returns new HAS message position '''
@@ -423,6 +473,75 @@ class GalE6():
                    f'IOD Set ID      : {self.iodset}'
         self.trace.show(0, disp_msg)
 
+    def store_corr(self, ctype, corr, fullset):
+        ''' stores HAS corrections with the time of hour and validity interval
+            ctype: orbit, clock, or cbias
+            fullset: the corrections replace all the previous ones
+        '''
+        if fullset:
+            self.corr[ctype] = {}
+        for key, val in corr.items():
+            self.corr[ctype][key] = (val, self.toh, self.ssr.vi)
+
+    def valid_corr(self, ctype):
+        ''' returns the HAS corrections within the validity interval,
+            and removes the expired ones
+        '''
+        valid = {}
+        for key, (val, toh, vi) in list(self.corr[ctype].items()):
+            if vi <= (self.toh - toh) % 3600:
+                del self.corr[ctype][key]
+            else:
+                valid[key] = val
+        return valid
+
+    def send_rtcm_ssr(self, ctype):
+        ''' sends the valid HAS corrections as RTCM SSR messages, ref. [2]
+            ctype: orbit, clock, or cbias
+        '''
+        corr  = self.valid_corr(ctype)
+        epoch = toh2tow(self.toh, self.now)
+        ui    = libssr.ui2index(self.ssr.vi)
+        iod   = self.iodset % 16  # IOD SSR has 4 bits
+        for satsys in self.ssr.satsys:
+            if satsys not in {'G', 'E'}:  # HAS augments GPS and Galileo
+                continue
+            if ctype == 'orbit':
+                orbit = [(int(sat[1:]), *val) for sat, val in corr.items()
+                    if sat[0] == satsys]
+                if orbit:
+                    send_rtcm(self.fp_rtcm, libssr.ssr_encode_orbit(
+                        satsys, epoch, ui, iod, orbit))
+            elif ctype == 'clock':
+                clock = [(int(sat[1:]), c0) for sat, c0 in corr.items()
+                    if sat[0] == satsys]
+                if clock:
+                    send_rtcm(self.fp_rtcm, libssr.ssr_encode_clock(
+                        satsys, epoch, ui, iod, clock))
+            elif ctype == 'cbias':
+                cbias = {}
+                for (sat, sig), cb in corr.items():
+                    if sat[0] != satsys or sig not in libssr.SSR_SIGNAL[satsys]:
+                        continue
+                    cbias.setdefault(int(sat[1:]), []).append(
+                        (libssr.SSR_SIGNAL[satsys][sig], cb))
+                if cbias:
+                    send_rtcm(self.fp_rtcm, libssr.ssr_encode_code_bias(
+                        satsys, epoch, ui, iod, list(cbias.items())))
+
+def toh2tow(toh, now=None):
+    ''' returns GPS time of week from HAS time of hour (TOH)
+        C/NAV pages do not carry the hour, so we take the hour of the current
+        GPS time, or of UTC now if given, that is the closest to the TOH.
+    '''
+    if now is None:
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    tow = int(libgnsstime.utc2gps(now).split()[1])
+    tow_toh = tow - tow % 3600 + toh
+    if   tow_toh - tow >  1800: tow_toh -= 3600
+    elif tow - tow_toh >  1800: tow_toh += 3600
+    return tow_toh % 604800
+
 def icd_test():
     '''self test described in [1] attached file,
     Galileo-HAS-SIS-ICD_1.0_Annex_D_HAS_Message_Decoding_Example.txt
@@ -449,31 +568,98 @@ if __name__ == '__main__':
     parser.add_argument(
         '-m', '--message', action='store_true',
         help='show display messages to stderr')
+    parser.add_argument(
+        '-r', '--rtcm', action='store_true',
+        help='send RTCM SSR messages to stdout (it also turns off display messages unless -m is specified).')
     parser.add_argument(
         '-s', '--statistics', action='store_true',
         help='show HAS statistics in display messages.')
+    parser.add_argument(
+        '--time', metavar='UTC',
+        help='UTC of "YYYY-MM-DD hh:mm:ss" or YYYY-MM-DDThh:mm:ss near the beginning of the input, which gives the hour of HAS corrections for -r option, instead of the current time.')
     parser.add_argument(
         '-t', '--trace', type=int, default=0,
         help='show display verbosely: 1=detail, 2=bit image.')
+    parser.add_argument(
+        '--delta', metavar='TOL', type=float,
+        help='show only corrections that changed by more than TOL from the last shown values at trace level 1, with full output at keyframes.')
+    parser.add_argument(
+        '--keyframe', metavar='N', type=int, default=10,
+        help='show all corrections at every N-th mask message for --delta option (0: no keyframe), default 10.')
+    parser.add_argument(
+        '--input', metavar='FILE',
+        help='read FILE by memory mapping, or by decompression if FILE is gzip, xz, or bzip2 file, or receive from tcp://HOST:PORT or ntrip://[USER[:PASSWD]@]HOST[:PORT]/MOUNTPOINT with reconnection, instead of stdin.')
+    parser.add_argument(
+        '--input-thread', action='store_true',
+        help='decompress --input FILE in a background thread.')
+    parser.add_argument(
+        '--input-retry', metavar='N', type=int, default=0,
+        help='stop after N consecutive reconnection failures of --input URL (0: unlimited), default 0.')
+    parser.add_argument(
+        '--summary', action='store_true',
+        help='show counts of HAS pages per satellite and of complete HAS messages per MID at the end, without FEC decoding (it also turns off display and RTCM messages).')
+    libserve.add_arguments(parser)
+    parser.add_argument(
+        '--perf-report', action='store_true',
+        help='show performance report of processing stages to stderr at exit.')
+    parser.add_argument(
+        '--metrics', metavar='TARGET',
+        help='export metrics in Prometheus text format to TARGET file rewritten periodically, or to http://127.0.0.1:TARGET/metrics when TARGET is a port number.')
     args = parser.parse_args()
-    fp_disp = sys.stdout
+    libio.open_input(args.input, args.input_thread, args.input_retry)
+    if args.perf_report:
+        libperf.enable()
+    if args.metrics:
+        libmetrics.start(parser.prog, args.metrics)
+    fp_disp, fp_rtcm = sys.stdout, None
     if args.trace < 0:
         libtrace.err(f'trace level should be positive ({args.trace}).')
         sys.exit(1)
+    if (args.delta is not None and args.delta < 0) or args.keyframe < 0:
+        libtrace.err(f'delta tolerance and keyframe interval should be positive ({args.delta}, {args.keyframe}).')
+        sys.exit(1)
+    now = None  # UTC to resolve the hour of TOH, or None for the current time
+    if args.time is not None:
+        try:
+            now = datetime.datetime.strptime(args.time.replace('T', ' '), libgnsstime.FORMAT_DT)
+        except ValueError:
+            libtrace.err(f'time should be "YYYY-MM-DD hh:mm:ss" or YYYY-MM-DDThh:mm:ss ({args.time}).')
+            sys.exit(1)
+    if args.rtcm:  # RTCM message output to stdout
+        fp_disp, fp_rtcm = None, sys.stdout
     if args.message:  # show HAS message to stderr
         fp_disp = sys.stderr
+    summary = None
+    if args.summary:
+        fp_disp, fp_rtcm = None, None
+        summary = libsummary.Summary('SAT')
+    server = libserve.open_server(args)
+    if server:  # standard output is sent to TCP clients
+        fp_disp = server if fp_disp is sys.stdout else fp_disp
+        fp_rtcm = server if fp_rtcm is sys.stdout else fp_rtcm
     trace = libtrace.Trace(fp_disp, args.trace, args.color)
     gale6 = GalE6(trace, args.statistics)
+    gale6.fp_rtcm = fp_rtcm
+    gale6.now     = now
+    gale6.ssr.delta    = args.delta
+    gale6.ssr.keyframe = args.keyframe
     try:
         while True:
-            raw = sys.stdin.buffer.read(LEN_CNAV_PAGE + 1)
+            with libperf.Measure('read'):
+                raw = libio.fp_in.read(LEN_CNAV_PAGE + 1)
             if not raw:
                 break
+            libmetrics.frames_read.inc()
             satid = int.from_bytes(raw[0:1], 'little')
             cnav  = raw[1:]
+            if summary:
+                gale6.summarize(satid, cnav, summary)
+                continue
             if not gale6.ready_decoding_has(satid, cnav):
                 continue
             gale6.decode_has_message()
+        if summary:
+            summary.show()
     except (BrokenPipeError, IOError):
         devnull = os.open(os.devnull, os.O_WRONLY)
         os.dup2(devnull, sys.stdout.fileno())
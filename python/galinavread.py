@@ -24,6 +24,9 @@ import sys
 sys.path.append(os.path.dirname(__file__))
 import libeph
 import libgnsstime
+import libio
+import libmetrics
+import libperf
 import libtrace
 from   rtcmread import rtk_crc24q
 
@@ -401,6 +404,7 @@ class GalInav:
         self.sar_param [svid] = bitstring.BitStream()
         return msg
 
+    @libperf.timed('decode', 'I/NAV')
     def decode_inav(self, svid, inav):
         ''' returns decoded message
             svid: 1-36
@@ -432,6 +436,7 @@ class GalInav:
         frame = (bitstring.Bits('uint4=0') + inav[0:196]).tobytes()
         crc_frame = rtk_crc24q(frame, len(frame))
         if crc_frame != crc.tobytes():
+            libmetrics.check_failed.inc('crc')
             return msg + self.trace.msg(0, f'Word {wt:2d} CRC error: {crc_frame.hex()} != {crc.hex}', fg='red')
         if eo1.u != 0 or eo2.u != 1:
             return msg + self.trace.msg(0, 'Even/Odd page error', fg='red')
@@ -477,20 +482,43 @@ if __name__ == '__main__':
     parser.add_argument(
         '-c', '--color', action='store_true',
         help='apply ANSI color escape sequences even for non-terminal.')
+    parser.add_argument(
+        '--input', metavar='FILE',
+        help='read FILE by memory mapping, or by decompression if FILE is gzip, xz, or bzip2 file, or receive from tcp://HOST:PORT or ntrip://[USER[:PASSWD]@]HOST[:PORT]/MOUNTPOINT with reconnection, instead of stdin.')
+    parser.add_argument(
+        '--input-thread', action='store_true',
+        help='decompress --input FILE in a background thread.')
+    parser.add_argument(
+        '--input-retry', metavar='N', type=int, default=0,
+        help='stop after N consecutive reconnection failures of --input URL (0: unlimited), default 0.')
+    parser.add_argument(
+        '--perf-report', action='store_true',
+        help='show performance report of processing stages to stderr at exit.')
+    parser.add_argument(
+        '--metrics', metavar='TARGET',
+        help='export metrics in Prometheus text format to TARGET file rewritten periodically, or to http://127.0.0.1:TARGET/metrics when TARGET is a port number.')
     args = parser.parse_args()
+    libio.open_input(args.input, args.input_thread, args.input_retry)
+    if args.perf_report:
+        libperf.enable()
+    if args.metrics:
+        libmetrics.start(parser.prog, args.metrics)
     fp_disp = sys.stdout
     trace = libtrace.Trace(fp_disp, 0, args.color)
     galinav = GalInav(trace)
     try:
-        raw = sys.stdin.buffer.read(30)
+        with libperf.Measure('read'):
+            raw = libio.fp_in.read(30)
         while raw:
+            libmetrics.frames_read.inc()
             payload = bitstring.ConstBitStream(raw)
             svid = payload.read(8).u
             inav = payload.read(LEN_INAV)
             payload.pos += 4  # spare
             msg = galinav.decode_inav(svid, inav)
             galinav.trace.show(0, msg)
-            raw = sys.stdin.buffer.read(30)
+            with libperf.Measure('read'):
+                raw = libio.fp_in.read(30)
     except (BrokenPipeError, IOError):
         devnull = os.open(os.devnull, os.O_WRONLY)
         os.dup2(devnull, sys.stdout.fileno())
@@ -16,6 +16,10 @@
 import argparse
 import os
 import sys
+import libio
+import libmetrics
+import libperf
+import libserve
 import libtrace
 from   rtcmread import send_rtcm
 try:
@@ -27,19 +31,23 @@ except ModuleNotFoundError:
     ''')
     sys.exit(1)
 
+fp_rtcm = sys.stdout  # RTCM output, or fan-out server
+
+@libperf.timed('read')
 def read_l6():  # ref. [1]
     ''' reads L6 message and returns True if success '''
-    sync = bytes(4)
-    while sync != b'\x1a\xcf\xfc\x1d':
-        b = sys.stdin.buffer.read(1)
-        if not b:
-            return None
-        sync = sync[1:4] + b
-    b = sys.stdin.buffer.read(1+1+212+32)
+    sync = b'\x1a\xcf\xfc\x1d'
+    nskip = libio.find_sync(libio.fp_in, sync)  # number of skipped bytes
+    if nskip < 0:
+        return None
+    libmetrics.bytes_skipped.inc(n=nskip)
+    b = libio.fp_in.read(1+1+212+32)
     if not b:
         return None
+    libmetrics.frames_read.inc()
     return sync + b
 
+@libperf.timed('output')
 def write_rtcm4050(l6msg):
     ''' reads QZS L6 messages from stdin and writes RTCM message type 4050 to stdout
         l6msg: 2000 bit (250 byte)
@@ -59,13 +67,35 @@ def write_rtcm4050(l6msg):
     rtcm  += bitstring.Bits(uint=mtid.u,  length= 8)  # CSSR message type ID (4073)
     rtcm  += bitstring.Bits(uint=alert.u, length= 1)  # alert flag
     rtcm  += l6[49:-256]                              # L6 message without preamble and RS error correction bits
-    send_rtcm(sys.stdout, rtcm)
+    send_rtcm(fp_rtcm, rtcm)
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
     description='QZS L6 message to RTCM message type 4050 conversion')
+    parser.add_argument(
+        '--input', metavar='FILE',
+        help='read FILE by memory mapping, or by decompression if FILE is gzip, xz, or bzip2 file, or receive from tcp://HOST:PORT or ntrip://[USER[:PASSWD]@]HOST[:PORT]/MOUNTPOINT with reconnection, instead of stdin.')
+    parser.add_argument(
+        '--input-thread', action='store_true',
+        help='decompress --input FILE in a background thread.')
+    parser.add_argument(
+        '--input-retry', metavar='N', type=int, default=0,
+        help='stop after N consecutive reconnection failures of --input URL (0: unlimited), default 0.')
+    libserve.add_arguments(parser)
+    parser.add_argument(
+        '--perf-report', action='store_true',
+        help='show performance report of processing stages to stderr at exit.')
+    parser.add_argument(
+        '--metrics', metavar='TARGET',
+        help='export metrics in Prometheus text format to TARGET file rewritten periodically, or to http://127.0.0.1:TARGET/metrics when TARGET is a port number.')
     args = parser.parse_args()
+    libio.open_input(args.input, args.input_thread, args.input_retry)
+    if args.perf_report:
+        libperf.enable()
+    if args.metrics:
+        libmetrics.start(parser.prog, args.metrics)
+    fp_rtcm = libserve.open_server(args) or sys.stdout
     try:
         l6msg = read_l6()
         while l6msg:
@@ -15,38 +15,590 @@
 # [2] Cabinet Office, Government of Japan, Quasi-Zenith Satellite System
 #     Interface Specification Satellite Positioning, Navigation and Timing
 #     Service, IS-QZSS-PNT-005, Oct. 2022.
+# [3] Space Force Space Systems Command, Navstar GPS Space Segment/
+#     Navigation User Segment Interfaces, IS-GPS-200N, Aug. 2022.
+# [4] China Satellite Navigation Office, BeiDou Navigation Satellite System
+#     Signal In Space Interface Control Document Open Service Signal B1I
+#     (Version 3.0), Feb. 2019.
+# [5] Russian Institute of Space Device Engineering, Global Navigation
+#     Satellite System GLONASS Interface Control Document, Edition 5.1,
+#     2008.
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+import libtrace
+
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    libtrace.err('''\
+    This code needs numpy module.
+    Please install this module such as \"pip install numpy\".
+    ''')
+    sys.exit(1)
 
 # constants
 PI = 3.1415926535898            # Ratio of a circle's circumference
 MU = 3.986004418  * (10**14)    # Geocentric gravitational constant [m^3/s^2]
 OE = 7.2921151467 * (10**(-5))  # Mean angular velocity of the Earth [rad/s]
 C  = 299792458                  # Speed of light [m/s]
+MU_GPS = 3.986005 * (10**14)    # gravitational constant of GPS, QZS, and IRN
+OE_BDS = 7.292115 * (10**(-5))  # angular velocity of the Earth of BDS [rad/s]
+WEEK_S = 604800                 # seconds in a week
+BDT_GPST = 14                   # BDT behind GPST [s]
+GPST_UTC = 18                   # GPST ahead of UTC, leap seconds [s]
+DAY_S  = 86400                  # seconds in a day
+MU_GLO = 3.986004418 * (10**14) # gravitational constant of PZ-90 [m^3/s^2]
+OE_GLO = 7.292115 * (10**(-5))  # angular velocity of the Earth of PZ-90 [rad/s]
+AE_GLO = 6378136                # semi-major axis of the Earth of PZ-90 [m]
+J2_GLO = 1082625.75 * (10**(-9))  # second zonal harmonic of geopotential
+GLO_STEP = 60                   # integration step of GLONASS orbit [s]
+SSR_CACHE = 64                  # broadcast orbits cached for SSR correction
+BDS_GEO = {1, 2, 3, 4, 5, 59, 60, 61, 62, 63}  # BeiDou GEO satellite ids
+KEPLER_ITER = 30                # maximum iterations of Kepler equation
+KEPLER_TOL  = 1e-15             # convergence of eccentric anomaly [rad]
+KEPLER_CHUNK = 8192            # epochs times rows evaluated at once
 N_GPSSAT = 63   # maximum number of GPS     satellites
 N_GLOSAT = 63   # maximum number of GLONASS satellites
 N_GALSAT = 63   # maximum number of Galileo satellites
 N_QZSSAT = 11   # maximum number of QZSS    satellites
 N_BDSAT  = 63   # maximum number of BeiDou  satellites
 N_IRNSAT = 9    # maximum number of NavIC   satellites
+N_IODE   = 4    # number of IODEs kept per satellite
 
 # format definitions
 FMT_IODC = '<4d'  # format string for issue of data clock
 FMT_IODE = '<4d'  # format string for issue of data ephemeris
 
+# table definitions in SI units: second, meter, and radian
+DTYPE_KEPLER = np.dtype([  # Keplerian ephemeris of GPS, GAL, QZS, BDS, and IRN
+    ('svid' , 'i2'),  # satellite id, 0 for empty row
+    ('iode' , 'i4'),  # IODE, IODnav, AODE, or IODEC referred to by SSR
+    ('iodc' , 'i4'),  # IODC, IODnav, AODC, or IODEC
+    ('week' , 'i4'),  # week number in the time system of the satellite
+    ('toe'  , 'f8'),  # ephemeris reference time of week [s]
+    ('toc'  , 'f8'),  # clock reference time of week [s]
+    ('sqrta', 'f8'),  # square root of semi-major axis [m^0.5]
+    ('e'    , 'f8'),  # eccentricity
+    ('i0'   , 'f8'),  # inclination angle at reference time [rad]
+    ('omg0' , 'f8'),  # longitude of ascending node at weekly epoch [rad]
+    ('omg'  , 'f8'),  # argument of perigee [rad]
+    ('m0'   , 'f8'),  # mean anomaly at reference time [rad]
+    ('dn'   , 'f8'),  # mean motion difference [rad/s]
+    ('omgd' , 'f8'),  # rate of right ascension [rad/s]
+    ('idot' , 'f8'),  # rate of inclination angle [rad/s]
+    ('cuc'  , 'f8'),  # cos correction to argument of latitude [rad]
+    ('cus'  , 'f8'),  # sin correction to argument of latitude [rad]
+    ('crc'  , 'f8'),  # cos correction to orbit radius [m]
+    ('crs'  , 'f8'),  # sin correction to orbit radius [m]
+    ('cic'  , 'f8'),  # cos correction to inclination angle [rad]
+    ('cis'  , 'f8'),  # sin correction to inclination angle [rad]
+    ('af0'  , 'f8'),  # clock bias [s]
+    ('af1'  , 'f8'),  # clock drift [s/s]
+    ('af2'  , 'f8'),  # clock drift rate [s/s^2]
+    ('tgd'  , 'f8'),  # group delay, T_GD, BGD(E1, E5a), or T_GD1 [s]
+    ('svh'  , 'i4'),  # satellite health
+])
+DTYPE_GLO = np.dtype([  # GLONASS ephemeris in PZ-90 coordinates
+    ('svid' , 'i2'   ),  # satellite id, 0 for empty row
+    ('iode' , 'i4'   ),  # t_b index referred to by SSR
+    ('fcn'  , 'i2'   ),  # frequency channel number
+    ('tb'   , 'f8'   ),  # reference time of day in Moscow time [s]
+    ('tk'   , 'f8'   ),  # frame start time of day in Moscow time [s]
+    ('pos'  , 'f8', 3),  # position [m]
+    ('vel'  , 'f8', 3),  # velocity [m/s]
+    ('acc'  , 'f8', 3),  # lunisolar acceleration [m/s^2]
+    ('taun' , 'f8'   ),  # clock bias to GLONASS time [s]
+    ('gmn'  , 'f8'   ),  # relative frequency bias
+    ('svh'  , 'i4'   ),  # satellite health
+])
+
+SCALE_GPS = {  # table field: (ephemeris attribute, scale factor), [1] DF071-DF103
+    'iodc' : ('iodc', 1              ), 'week' : ('wn'  , 1              ),
+    'toe'  : ('toe' , 2**4           ), 'toc'  : ('toc' , 2**4           ),
+    'sqrta': ('a12' , 2**(-19)       ), 'e'    : ('e'   , 2**(-33)       ),
+    'i0'   : ('i0'  , 2**(-31)*PI    ), 'omg0' : ('omg0', 2**(-31)*PI    ),
+    'omg'  : ('omg' , 2**(-31)*PI    ), 'm0'   : ('m0'  , 2**(-31)*PI    ),
+    'dn'   : ('dn'  , 2**(-43)*PI    ), 'omgd' : ('omgd', 2**(-43)*PI    ),
+    'idot' : ('idot', 2**(-43)*PI    ), 'cuc'  : ('cuc' , 2**(-29)       ),
+    'cus'  : ('cus' , 2**(-29)       ), 'crc'  : ('crc' , 2**(-5)        ),
+    'crs'  : ('crs' , 2**(-5)        ), 'cic'  : ('cic' , 2**(-29)       ),
+    'cis'  : ('cis' , 2**(-29)       ), 'af0'  : ('af0' , 2**(-31)       ),
+    'af1'  : ('af1' , 2**(-43)       ), 'af2'  : ('af2' , 2**(-55)       ),
+    'tgd'  : ('tgd' , 2**(-31)       ), 'svh'  : ('svh' , 1              ),
+}
+SCALE_QZS = {**SCALE_GPS,  # [1] DF429-DF457
+    'dn'   : ('dn0' , 2**(-43)*PI    ), 'omg'  : ('omgn', 2**(-31)*PI    ),
+    'idot' : ('i0d' , 2**(-43)*PI    ), 'svh'  : ('svhu', 1              ),
+}
+SCALE_GAL = {**SCALE_GPS,  # [1] DF289-DF317
+    'iodc' : ('iodn', 1              ), 'toe'  : ('toe' , 60             ),
+    'toc'  : ('toc' , 60             ), 'omgd' : ('omgd0', 2**(-43)*PI   ),
+    'af0'  : ('af0' , 2**(-34)       ), 'af1'  : ('af1' , 2**(-46)       ),
+    'af2'  : ('af2' , 2**(-59)       ), 'tgd'  : ('be5a', 2**(-32)       ),
+}
+SCALE_BDS = {**SCALE_GPS,  # [1] DF488-DF515
+    'iodc' : ('aodc', 1              ), 'toe'  : ('toe' , 2**3           ),
+    'toc'  : ('toc' , 2**3           ), 'cuc'  : ('cuc' , 2**(-31)       ),
+    'cus'  : ('cus' , 2**(-31)       ), 'crc'  : ('crc' , 2**(-6)        ),
+    'crs'  : ('crs' , 2**(-6)        ), 'cic'  : ('cic' , 2**(-31)       ),
+    'cis'  : ('cis' , 2**(-31)       ), 'af0'  : ('a0'  , 2**(-33)       ),
+    'af1'  : ('a1'  , 2**(-50)       ), 'af2'  : ('a2'  , 2**(-66)       ),
+    'tgd'  : ('tgd1', 1e-10          ),
+}
+SCALE_IRN = {**SCALE_GPS,  # [1] DF516-DF545
+    'iodc' : ('iodec', 1             ), 'dn'   : ('dn'  , 2**(-41)*PI    ),
+    'omgd' : ('omgd', 2**(-41)*PI    ), 'cuc'  : ('cuc' , 2**(-28)       ),
+    'cus'  : ('cus' , 2**(-28)       ), 'crc'  : ('crc' , 2**(-4)        ),
+    'crs'  : ('crs' , 2**(-4)        ), 'cic'  : ('cic' , 2**(-28)       ),
+    'cis'  : ('cis' , 2**(-28)       ), 'svh'  : ('svhu', 1              ),
+}
+
 class EphNull:
     pass
 
+def scaled(eph, scale):
+    ''' returns dict of table fields in SI units from ephemeris attributes '''
+    return {name: getattr(eph, attr) * factor for name, (attr, factor) in scale.items()}
+
+class EphTable:
+    "Decoded ephemerides in NumPy structured array, a row per satellite and IODE"
+
+    def __init__(self, nsat, dtype, nkeep=N_IODE):
+        self.nsat  = nsat
+        self.nkeep = nkeep
+        self.data  = np.zeros(nsat * nkeep, dtype)  # rows of svid from (svid-1)*nkeep
+        self.index = {}           # {(svid, iode): row}
+        self.next  = [0] * nsat   # next slot of each satellite, the oldest one
+        self.last  = {}           # {svid: row of the last received ephemeris}
+
+    def add(self, svid, iode, values):
+        ''' stores the dict of values in SI units, overwriting the row of
+            the same IODE or the oldest row of the satellite, and returns
+            the row, or None if svid is out of range
+        '''
+        if not 1 <= svid <= self.nsat:
+            return None
+        row = self.index.get((svid, iode))
+        if row is None:
+            slot = self.next[svid-1]
+            self.next[svid-1] = (slot + 1) % self.nkeep
+            row = (svid - 1) * self.nkeep + slot
+            if self.data['svid'][row]:  # evicts the oldest IODE
+                del self.index[(svid, int(self.data['iode'][row]))]
+            self.index[(svid, iode)] = row
+        values['svid'] = svid
+        values['iode'] = iode
+        self.data[row] = tuple(values.get(name, 0) for name in self.data.dtype.names)
+        self.last[svid] = row
+        return row
+
+    def get(self, svid, iode):
+        ''' returns the ephemeris of satellite and IODE, or None '''
+        row = self.index.get((svid, iode))
+        return None if row is None else self.data[row]
+
+    def latest(self, svid):
+        ''' returns the last received ephemeris of satellite, or None '''
+        row = self.last.get(svid)
+        return None if row is None else self.data[row]
+
+    def rows(self):
+        ''' returns the stored ephemerides ordered by satellite '''
+        return self.data[self.data['svid'] > 0]
+
+    def current(self):
+        ''' returns the last received ephemeris of each satellite ordered by satellite '''
+        return self.data[sorted(self.last.values())]
+
+    def show(self, fp, satsys):
+        ''' writes the stored ephemerides, a line per satellite and IODE '''
+        for eph in self.rows():
+            fields = []
+            for name in self.data.dtype.names[1:]:
+                value = eph[name]
+                if value.ndim:
+                    fields.append(f'{name}=' + ','.join(f'{v:.12g}' for v in value))
+                else:
+                    fields.append(f'{name}={value:.12g}')
+            print(f'{satsys}{eph["svid"]:02d} ' + ' '.join(fields), file=fp)
+
+KEPLER = {  # gravitational constant and angular velocity of the Earth
+    'G': (MU_GPS, OE    ), 'E': (MU, OE    ), 'J': (MU_GPS, OE),
+    'C': (MU    , OE_BDS), 'I': (MU_GPS, OE),
+}
+
+def eccentric_anomaly(m, e):
+    ''' solves Kepler equation M = E - e sin E for arrays by Newton
+        method, and returns sin E and cos E, starting from the series of
+        E - M to e^3, where all the elements take the same steps on the
+        whole arrays until the largest error converges, and the steps
+        are on small E - M, whose sin and cos are faster than those of E
+    '''
+    bound = np.max(e / (2 * (1 - e)), initial=0)  # error after a step is below bound * d^2
+    sin_m, cos_m = np.sin(m), np.cos(m)
+    de    = sin_m * sin_m                       # E - M by series to e^3
+    de   *= -1.5 * e * e
+    de   += e * e
+    de   += e * cos_m
+    de   += 1
+    de   *= e * sin_m
+    for _ in range(KEPLER_ITER):
+        sin_e, cos_e = rotate(np.sin(de), np.cos(de), sin_m, cos_m)
+        d    = e * sin_e                        # d = (E - e sin E - M) / (1 - e cos E)
+        np.subtract(de, d, out=d)
+        den  = e * cos_e
+        np.subtract(1, den, out=den)
+        d   /= den
+        if bound * np.max(np.abs(d), initial=0)**2 < KEPLER_TOL:
+            break
+        de  -= d
+    return rotate(sin_e, cos_e, *small_sincos(np.negative(d, out=d)))  # E after the last step
+
+def small_sincos(x):
+    ''' returns sin x and cos x of small angle x [rad] by Taylor series '''
+    x2   = x * x
+    sin  = x2 * (-1 / 6)
+    sin += 1
+    sin *= x
+    cos  = x2 * (1 / 24)
+    cos -= 0.5
+    cos *= x2
+    cos += 1
+    return sin, cos
+
+def rotate(sin_a, cos_a, sin_b, cos_b):
+    ''' returns sin(a + b) and cos(a + b), overwriting sin_a and cos_a '''
+    tmp    = cos_a * sin_b
+    cos_a *= cos_b
+    cos_a -= sin_a * sin_b
+    sin_a *= cos_b
+    sin_a += tmp
+    return sin_a, cos_a
+
+def harmonic(cs, cc, sin2, cos2):
+    ''' returns harmonic correction cs sin 2phi + cc cos 2phi, and its
+        derivative by 2phi
+    '''
+    c   = cs * sin2
+    c  += cc * cos2
+    cd  = cs * cos2
+    cd -= cc * sin2
+    return c, cd
+
+def tdiff(t, t0):
+    ''' returns t - t0 of time of week with week crossover '''
+    dt = t - t0
+    dt[dt >  WEEK_S / 2] -= WEEK_S
+    dt[dt < -WEEK_S / 2] += WEEK_S
+    return dt
+
+def bds_geo(pos, vel, ang, oe):
+    ''' returns ECEF position and velocity of BeiDou GEO satellite from
+        those in the inertial frame, rotated by -5 degrees about x axis
+        and by angle ang about z axis, [4] 5.2.4.12
+    '''
+    sin_x, cos_x = np.sin(np.radians(-5)), np.cos(np.radians(-5))
+    sin_z, cos_z = np.sin(ang), np.cos(ang)
+    x , y , z  = pos[..., 0], pos[..., 1] * cos_x + pos[..., 2] * sin_x, \
+                 pos[..., 2] * cos_x - pos[..., 1] * sin_x
+    xd, yd, zd = vel[..., 0], vel[..., 1] * cos_x + vel[..., 2] * sin_x, \
+                 vel[..., 2] * cos_x - vel[..., 1] * sin_x
+    xe, ye = x * cos_z + y * sin_z, y * cos_z - x * sin_z
+    pos = np.stack([xe, ye, z], axis=-1)
+    vel = np.stack([
+        xd * cos_z + yd * sin_z + oe * ye,
+        yd * cos_z - xd * sin_z - oe * xe, zd], axis=-1)
+    return pos, vel
+
+def kepler(eph, tow, satsys):
+    ''' returns ECEF position [m], velocity [m/s], and clock offset [s]
+        of Keplerian ephemerides eph (a row or rows of DTYPE_KEPLER) at
+        time of week tow (a scalar or array) in the time system of
+        satsys (G, E, J, C, or I), in shape of (rows, epochs, 3) and
+        (rows, epochs), [3] 20.3.3.4.3 and [4] 5.2.4
+    '''
+    mu, oe = KEPLER[satsys]
+    eph = np.atleast_1d(eph)
+    tow = np.atleast_1d(np.asarray(tow, dtype=float))
+    pos = np.empty((3, len(eph), len(tow)))  # components first to write at once
+    vel = np.empty((3, len(eph), len(tow)))
+    dts = np.empty((len(eph), len(tow)))
+    if not len(eph):
+        return np.moveaxis(pos, 0, -1), np.moveaxis(vel, 0, -1), dts
+    geo = np.isin(eph['svid'], list(BDS_GEO)) if satsys == 'C' else None
+    # constants of rows, computed once for all the epochs
+    orb = {name: eph[name][:, np.newaxis].copy() for name in eph.dtype.names}
+    a   = orb['sqrta'] ** 2
+    e   = orb['e']
+    n   = np.sqrt(mu / a**3) + orb['dn']
+    sq  = np.sqrt(1 - e**2)
+    omd = orb['omgd'] - oe
+    if geo is not None:                         # GEO in inertial frame
+        omd = np.where(geo[:, np.newaxis], orb['omgd'], omd)
+    orb.update({
+        'a': a, 'n': n, 'sq': sq, 'aen': a * e * n, 'sqn': sq * n,
+        'sin_w' : np.sin(orb['omg']), 'cos_w' : np.cos(orb['omg']),
+        'sin_i0': np.sin(orb['i0' ]), 'cos_i0': np.cos(orb['i0' ]),
+        'omd': omd, 'node': orb['omg0'] - oe * orb['toe'],
+        'toe_toc': tdiff(orb['toe'], orb['toc']),
+        'rel': -2 * np.sqrt(mu) / C**2 * e * orb['sqrta'],  # relativity
+    })
+    chunk = max(1, KEPLER_CHUNK // len(eph))
+    for k in range(0, len(tow), chunk):         # in chunks fitting in cache
+        t = slice(k, k + chunk)
+        kepler_chunk(orb, tdiff(tow[np.newaxis, t], orb['toe']), oe, geo,
+                     pos[:, :, t], vel[:, :, t], dts[:, t])
+    return np.moveaxis(pos, 0, -1), np.moveaxis(vel, 0, -1), dts
+
+def kepler_chunk(orb, tk, oe, geo, pos, vel, dts):
+    ''' writes position, velocity, and clock offset of rows x epochs at
+        time tk from toe into pos, vel, and dts, where orb is the
+        constants of rows, and geo is a boolean array of BeiDou GEO
+        rows, or None; the arrays of rows x epochs are updated in place
+        to keep the temporaries few
+    '''
+    e    = orb['e']
+    m    = orb['n'] * tk
+    m   += orb['m0']
+    sin_e, cos_e = eccentric_anomaly(m, e)
+    dt   = tk + orb['toe_toc']                  # time from toc
+    dts[:] = orb['af2'] * dt
+    dts += orb['af1']
+    dts *= dt
+    dts += orb['af0']
+    dts += orb['rel'] * sin_e
+    r    = e * cos_e                            # a (1 - e cos E)
+    np.subtract(1, r, out=r)
+    den  = 1 / r
+    r   *= orb['a']
+    rd   = orb['aen'] * sin_e                   # a e sin E dE/dt
+    rd  *= den
+    phd  = den * den                            # d(phi)/dt
+    phd *= orb['sqn']
+    phd2 = 2 * phd
+    sin_e *= orb['sq']                          # true anomaly v, times den
+    cos_e -= e
+    sin_p, cos_p = rotate(sin_e, cos_e, orb['sin_w'], orb['cos_w'])
+    sin_p *= den                                # argument of latitude phi
+    cos_p *= den
+    sin2  = sin_p * cos_p
+    sin2 *= 2
+    cos2  = sin_p * sin_p
+    cos2 *= -2
+    cos2 += 1
+    du, ud  = harmonic(orb['cus'], orb['cuc'], sin2, cos2)
+    dr, drd = harmonic(orb['crs'], orb['crc'], sin2, cos2)
+    di, idt = harmonic(orb['cis'], orb['cic'], sin2, cos2)
+    ud  *= phd2                                 # d(u)/dt
+    ud  += phd
+    r   += dr
+    drd *= phd2                                 # d(r)/dt
+    rd  += drd
+    idt *= phd2                                 # d(i)/dt
+    idt += orb['idot']
+    di  += orb['idot'] * tk
+    sin_u, cos_u = rotate(sin_p, cos_p, *small_sincos(du))
+    sin_i, cos_i = rotate(*small_sincos(di), orb['sin_i0'], orb['cos_i0'])
+    xp   = r * cos_u                            # position in orbital plane
+    yp   = r * sin_u
+    xpd  = rd * cos_u
+    xpd -= yp * ud
+    ypd  = rd * sin_u
+    ypd += xp * ud
+    omd  = orb['omd']
+    omg  = omd * tk
+    omg += orb['node']
+    sin_o, cos_o = np.sin(omg), np.cos(omg)
+    x, y, z = pos
+    ycos = yp * cos_i
+    np.multiply(yp, sin_i, out=z)
+    np.multiply(xp, cos_o, out=x)
+    x   -= ycos * sin_o
+    np.multiply(xp, sin_o, out=y)
+    y   += ycos * cos_o
+    tmp  = ypd * cos_i                          # d(ycos)/dt
+    tmp -= z * idt
+    vx, vy, vz = vel
+    np.multiply(xpd, cos_o, out=vx)
+    vx  -= tmp * sin_o
+    vx  -= omd * y
+    np.multiply(xpd, sin_o, out=vy)
+    vy  += tmp * cos_o
+    vy  += omd * x
+    np.multiply(ycos, idt, out=vz)
+    vz  += ypd * sin_i
+    if geo is not None and np.any(geo):
+        pos, vel = np.moveaxis(pos, 0, -1), np.moveaxis(vel, 0, -1)
+        pos[geo], vel[geo] = bds_geo(pos[geo], vel[geo], oe * tk[geo], oe)
+
+def glo_deriv(state, acc):
+    ''' returns time derivative of GLONASS state array (x, y, z, vx, vy,
+        vz) in PZ-90 with lunisolar acceleration acc, [5] A.3.1.2
+    '''
+    x, y, z, vx, vy, vz = state
+    r2  = x * x + y * y + z * z
+    r3  = r2 * np.sqrt(r2)
+    j2  = 1.5 * J2_GLO * MU_GLO * AE_GLO**2 / (r2 * r3)
+    z5  = 5 * z * z / r2
+    c   = OE_GLO**2 - MU_GLO / r3 - j2 * (1 - z5)
+    return np.stack([vx, vy, vz,
+        c * x + 2 * OE_GLO * vy + acc[0],
+        c * y - 2 * OE_GLO * vx + acc[1],
+        (-MU_GLO / r3 - j2 * (3 - z5)) * z + acc[2]])
+
+def glo_rk4(state, h, acc):
+    ''' returns GLONASS state after a fourth-order Runge-Kutta step h '''
+    k1 = glo_deriv(state, acc)
+    k2 = glo_deriv(state + h / 2 * k1, acc)
+    k3 = glo_deriv(state + h / 2 * k2, acc)
+    k4 = glo_deriv(state + h * k3, acc)
+    return state + h / 6 * (k1 + 2 * (k2 + k3) + k4)
+
+class GloOrbit:
+    "GLONASS orbit propagated from ephemerides, caching states at every integration step"
+
+    def __init__(self, eph, step=GLO_STEP):
+        self.eph  = np.atleast_1d(eph)
+        self.step = step
+        self.acc  = self.eph['acc'].T
+        state = np.concatenate([self.eph['pos'], self.eph['vel']], axis=-1).T
+        self.fwd  = [state]  # states (6 x rows) at t_b + k step, k = 0, 1, ...
+        self.bwd  = [state]  # states (6 x rows) at t_b - k step, k = 0, 1, ...
+
+    def extend(self, nodes, n, h):
+        ''' integrates the cached states up to n steps of h '''
+        while len(nodes) <= n:
+            nodes.append(glo_rk4(nodes[-1], h, self.acc))
+
+    def propagate(self, tod):
+        ''' returns position [m] and velocity [m/s] in PZ-90, and clock
+            offset [s] of the ephemerides at Moscow time of day tod (a
+            scalar or array), in shape of (rows, epochs, 3) and
+            (rows, epochs); each epoch is a step from the nearest cached
+            state, so that repeated queries integrate only once
+        '''
+        tod = np.atleast_1d(np.asarray(tod, dtype=float))
+        pos = np.empty((len(self.eph), len(tod), 3))
+        vel = np.empty((len(self.eph), len(tod), 3))
+        if not len(self.eph) or not len(tod):
+            return pos, vel, np.empty((len(self.eph), len(tod)))
+        dt  = (tod[np.newaxis, :] - self.eph['tb'][:, np.newaxis] + DAY_S / 2) \
+            % DAY_S - DAY_S / 2
+        k   = np.rint(dt / self.step).astype(int)
+        self.extend(self.fwd,  k.max(),  self.step)
+        self.extend(self.bwd, -k.min(), -self.step)
+        nodes = np.stack(self.bwd[:0:-1] + self.fwd, axis=-1)  # 6 x rows x steps
+        row = np.arange(len(self.eph))[:, np.newaxis]
+        acc = self.acc[..., np.newaxis]
+        chunk = max(1, KEPLER_CHUNK // len(self.eph))
+        for j in range(0, len(tod), chunk):  # in chunks fitting in cache
+            t = slice(j, j + chunk)
+            state = glo_rk4(nodes[:, row, k[:, t] + len(self.bwd) - 1],
+                dt[:, t] - k[:, t] * self.step, acc)
+            pos[:, t] = np.moveaxis(state[:3], 0, -1)
+            vel[:, t] = np.moveaxis(state[3:], 0, -1)
+        dts = -self.eph['taun'][:, np.newaxis] + self.eph['gmn'][:, np.newaxis] * dt
+        return pos, vel, dts
+
+def rac2ecef(pos, vel):
+    ''' returns rotation matrices (..., 3, 3) from radial, along-track,
+        and cross-track to ECEF, whose columns are the unit vectors,
+        [1] 3.5.12.6
+    '''
+    ea = vel / np.linalg.norm(vel, axis=-1, keepdims=True)
+    ec = np.cross(pos, vel)
+    ec /= np.linalg.norm(ec, axis=-1, keepdims=True)
+    return np.stack([np.cross(ea, ec), ea, ec], axis=-1)
+
+class SsrOrbit:
+    "Broadcast orbits and clocks corrected by SSR, caching broadcast states and RAC rotations per epoch"
+
+    def __init__(self, ephs, ncache=SSR_CACHE):
+        self.ephs  = ephs        # {satsys: ephemeris of EphGps, EphGlo, ...}
+        self.ncache = ncache
+        self.cache = {}          # {(satsys, time, keys): (pos, vel, dts, rot)}
+        self.glo   = {}          # {keys: GloOrbit}
+
+    def broadcast(self, satsys, keys, t):
+        ''' returns broadcast position, velocity, clock offset, and RAC
+            rotation of (svid, iode) keys at time t in the time system
+            of satsys, or Moscow time of day for GLONASS
+        '''
+        key = (satsys, t, keys)
+        if key in self.cache:
+            return self.cache[key]
+        table = self.ephs[satsys].table
+        rows  = table.data[[table.index[k] for k in keys]]
+        if satsys == 'R':
+            if keys not in self.glo:
+                if len(self.glo) >= self.ncache:
+                    del self.glo[next(iter(self.glo))]
+                self.glo[keys] = GloOrbit(rows)
+            pos, vel, dts = self.glo[keys].propagate(t)
+        else:
+            pos, vel, dts = kepler(rows, t, satsys)
+        pos, vel, dts = pos[:, 0], vel[:, 0], dts[:, 0]
+        if len(self.cache) >= self.ncache:  # evicts the oldest epoch
+            del self.cache[next(iter(self.cache))]
+        self.cache[key] = (pos, vel, dts, rac2ecef(pos, vel))
+        return self.cache[key]
+
+    def compute(self, tow, orbit, clock, orbit_rate=None, clock_rate=None, systems=None):
+        ''' returns satellite names, and precise ECEF positions [m] and
+            clock offsets [s] at GPS time of week tow of the satellites
+            having orbit {sat: (iode, radial, along, cross)} and clock
+            {sat: c0} corrections in meter and broadcast ephemeris of
+            the IODE, optionally with the rates {sat: (epoch, radial,
+            along, cross)} and {sat: (epoch, c1, c2)} in meter per second,
+            for the satellite systems, or all systems if None
+        '''
+        orbit_rate = orbit_rate or {}
+        clock_rate = clock_rate or {}
+        names, pos_p, dts_p = [], [], []
+        for satsys in systems or self.ephs:
+            if satsys == 'R':
+                t, period = (tow - GPST_UTC + 3 * 3600) % DAY_S, DAY_S
+            else:
+                t, period = tow - (BDT_GPST if satsys == 'C' else 0), WEEK_S
+            index = self.ephs[satsys].table.index
+            sats  = [sat for sat in orbit if sat[0] == satsys and sat in clock
+                and (int(sat[1:]), orbit[sat][0]) in index]
+            if not sats:
+                continue
+            keys = tuple((int(sat[1:]), orbit[sat][0]) for sat in sats)
+            pos, vel, dts, rot = self.broadcast(satsys, keys, t)
+            d_orb = np.array([orbit[sat][1:] for sat in sats])
+            d_clk = np.array([clock[sat] for sat in sats])
+            for i, sat in enumerate(sats):  # rates from the reference epoch
+                if sat in orbit_rate:
+                    t0, *rate = orbit_rate[sat]
+                    d_orb[i] += np.multiply(rate, (t - t0 + period / 2) % period - period / 2)
+                if sat in clock_rate:
+                    t0, c1, c2 = clock_rate[sat]
+                    dt = (t - t0 + period / 2) % period - period / 2
+                    d_clk[i] += c1 * dt + c2 * dt * dt
+            names += sats
+            pos_p.append(pos - np.einsum('nij,nj->ni', rot, d_orb))
+            dts_p.append(dts + d_clk / C)
+        if not names:
+            return names, np.empty((0, 3)), np.empty(0)
+        return names, np.concatenate(pos_p), np.concatenate(dts_p)
+
 class EphGps:
     ''' GPS ephemeris data '''
 
     def __init__(self, trace):
         self.trace = trace
-        self.eph   = [EphNull() for _ in range(N_GPSSAT)]
+        self.table = EphTable(N_GPSSAT, DTYPE_KEPLER)
         self.alm   = [EphNull() for _ in range(N_GPSSAT)]
 
     def decode_rtcm(self, payload):
         ''' read and decode RTCM GPS ephemeris '''
         svid     = payload.read( 6).u  # satellite id, DF009
-        eph      = self.eph[svid-1]
+        eph      = EphNull()
         eph.wn   = payload.read(10).u  # week number, DF076
         eph.sva  = payload.read( 4).u  # SV accuracy DF077
         eph.gpsc = payload.read( 2)    # GPS code L2, DF078
@@ -76,6 +628,7 @@ class EphGps:
         eph.svh  = payload.read( 6).u  # SV health, DF102
         eph.l2p  = payload.read( 1).u  # P flag, DF103
         eph.fi   = payload.read( 1).u  # fit interval, DF137
+        self.table.add(svid, eph.iode, scaled(eph, SCALE_GPS))
         msg = f'G{svid:02d} WN={eph.wn} IODE={eph.iode:{FMT_IODE}} IODC={eph.iodc:{FMT_IODC}}'
         if   eph.gpsc == '0b01': msg += ' L2P'
         elif eph.gpsc == '0b10': msg += ' L2C/A'
@@ -85,58 +638,18 @@ class EphGps:
             msg += self.trace.msg(0, f' unhealthy({eph.svh:02x})', fg='red')
         return msg
 
-    def convert(self, svid):
-        ''' decode GPS ephemeris '''
-        eph   = self.eph[svid-1]
-        m0    = eph.m0.i   * 2**(-31)*PI  # mean anomaly at reference time
-        e     = eph.e.u    * 2**(-33)     # eccentricity
-        a12   = eph.a12.u  * 2**(-19)     # square root of the semi-major axis
-        t0e   = eph.t0e.u  * 60           # ephemeris reference time
-        omg0  = eph.omg0.i * 2**(-31)*PI  # longitude of ascending node of orbital plane
-        i0    = eph.i0.i   * 2**(-31)*PI  # inclination angle at reference time
-        omg   = eph.omg.i  * 2**(-31)*PI  # argument of perigee
-        idot  = eph.idot.i * 2**(-43)*PI  # rate of change of inclination angle
-        dn    = eph.dn.i   * 2**(-43)*PI  # mean motion difference from computed value
-        omgd  = eph.omgd.i * 2**(-43)*PI  # rate of change of right ascension
-        cuc   = eph.cuc.i  * 2**(-29)     # cos harmonic correction term to the argument of latitude
-        cus   = eph.cus.i  * 2**(-29)     # sin harmonic correction term to the argument of latitude
-        crc   = eph.crc.i  * 2**(-5)      # cos harmonic correction term to the orbit radius
-        crs   = eph.crs.i  * 2**(-5)      # sin harmonic correction term to the orbit radius
-        cic   = eph.cic.i  * 2**(-29)     # cos harmonic correction term to the angle of inclination
-        cis   = eph.cis.i  * 2**(-29)     # sin harmonic correction term to the angle of inclination
-        t0c   = eph.t0c.u  * 60           # clock correction data reference TOW
-        af0   = eph.af0.i  * 2**(-34)     # SV clock bias correction coefficient
-        af1   = eph.af1.i  * 2**(-46)     # SV clock drift correction coefficient
-        af2   = eph.af2.i  * 2**(-59)     # SV clock drift rate correction coefficient
-        be5a  = eph.be5a.i * 2**(-32)     # E1-E5a broadcast group delay
-        be5b  = eph.be5b.i * 2**(-32)     # E1-E5b broadcast group delay
-        ai0   = eph.ai0.u  * 2**(-2)      # effective ionisation level 1st order parameter
-        ai1   = eph.ai1.i  * 2**(-8)      # effective ionisation level 2nd order parameter
-        a0    = eph.a0.i   * 2**(-30)     # constant term of polynomial
-        a1    = eph.a1.i   * 2**(-50)     # 1st order term of polynomial
-        dtls  = eph.dtls.i                # leap Second count before leap second adjustment
-        t0t   = eph.t0t.u                 # UTC data reference TOW
-        wn0t  = eph.wn0t.u                # UTC data reference week number
-        wnlsf = eph.wnlsf.u               # week number of leap second adjustment
-        dn    = eph.dn.u                  # day number at the end of which a leap second adjustment becomes effective
-        dtlsf = eph.dtlsf.i               # leap second count after leap second adjustment
-        a0g   = eph.a0g.i  * 2**(-35)     # constant term of the polynomial describing the offset
-        a1g   = eph.a1g.i  * 2**(-51)     # rate of change of the offset
-        t0g   = eph.t0g.u  * 3600         # reference time for GGTO data
-        wn0g  = eph.wn0g.u                # week number of GGTO reference
-
 class EphGlo:
     ''' GLONASS ephemeris data '''
 
     def __init__(self, trace):
         self.trace = trace
-        self.eph   = [EphNull() for _ in range(N_GLOSAT)]
+        self.table = EphTable(N_GLOSAT, DTYPE_GLO)
         self.alm   = [EphNull() for _ in range(N_GLOSAT)]
 
     def decode_rtcm(self, payload):
         ''' read and decode RTCM GLONASS ephemeris '''
         svid      =       payload.read( 6).u        # satellite id, DF038
-        eph       =       self.eph[svid-1]
+        eph       =       EphNull()
         eph.fcn   =       payload.read( 5).u        # freq ch, DF040
         eph.svh   =       payload.read( 1).u        # alm health DF104
         eph.aha   =       payload.read( 1).u        # alm health avail, DF105
@@ -186,6 +699,17 @@ class EphGlo:
         eph.tgps  *=      payload.read(21).u
         eph.in5   =       payload.read( 1).u         # I_n, DF136
         payload.pos +=  7                             # reserved
+        self.table.add(svid, eph.tb, {
+            'fcn' : eph.fcn - 7,
+            'tb'  : eph.tb * 900,
+            'tk'  : eph.tk[0:5].u * 3600 + eph.tk[5:11].u * 60 + eph.tk[11:12].u * 30,
+            'pos' : (eph.xn   * 2**(-11) * 1e3, eph.yn   * 2**(-11) * 1e3, eph.zn   * 2**(-11) * 1e3),
+            'vel' : (eph.xnd  * 2**(-20) * 1e3, eph.ynd  * 2**(-20) * 1e3, eph.znd  * 2**(-20) * 1e3),
+            'acc' : (eph.xndd * 2**(-30) * 1e3, eph.yndd * 2**(-30) * 1e3, eph.zndd * 2**(-30) * 1e3),
+            'taun': eph.taun * 2**(-30),
+            'gmn' : eph.gmn  * 2**(-40),
+            'svh' : eph.svh,
+        })
         msg = f'R{svid:02d} f={eph.fcn:02d} tk={eph.tk[7:12].u:02d}:{eph.tk[1:7].u:02d}:{eph.tk[0:2].u*15:02d} tb={eph.tb*15}min'
         if eph.svh:
             msg += self.trace.msg(0, ' unhealthy', fg='red')
@@ -194,7 +718,8 @@ class EphGlo:
 class EphGal:
     def __init__(self, trace):
         self.trace = trace
-        self.eph   = [EphNull() for _ in range(N_GALSAT)]
+        self.table = EphTable(N_GALSAT, DTYPE_KEPLER)
+        self.eph   = [EphNull() for _ in range(N_GALSAT)]  # I/NAV words of galinavread
         self.alm   = [EphNull() for _ in range(N_GALSAT)]
         self.svid1 = -1  # Galileo almanac for SV1
         self.svid2 = -1  # Galileo almanac for SV2
@@ -203,7 +728,7 @@ class EphGal:
     def decode_rtcm(self, payload, mtype):
         ''' read and decode RTCM Galileo ephemeris '''
         svid      = payload.read( 6).u     # satellite id, DF252
-        eph       = self.eph[svid-1]
+        eph       = EphNull()
         eph.wn    = payload.read(12).u     # week number, DF289
         eph.iodn  = payload.read(10).u     # IODnav, DF290
         eph.sisa  = payload.read( 8).u     # SIS Accuracy, DF291
@@ -241,6 +766,11 @@ class EphGal:
             payload.pos += 2               # reserved, DF001
         else:
             raise Exception(f'unknown Galileo nav message: {mtype}')
+        if mtype == 'F/NAV':  # health bits of [1] DF314-DF317 and DF287-DF288
+            eph.svh = (eph.osh << 4) | (eph.osv << 3)
+        else:
+            eph.svh = (eph.e5h << 7) | (eph.e5v << 6) | (eph.e1h << 1) | eph.e1v
+        self.table.add(svid, eph.iodn, scaled(eph, SCALE_GAL))
         msg = f'E{svid:02d} WN={eph.wn} IODnav={eph.iodn}'
         if   mtype == 'F/NAV':
             if eph.osh:
@@ -263,13 +793,13 @@ class EphGal:
 class EphQzs:
     def __init__(self, trace):
         self.trace = trace
-        self.eph   = [EphNull() for _ in range(N_QZSSAT)]
+        self.table = EphTable(N_QZSSAT, DTYPE_KEPLER)
         self.alm   = [EphNull() for _ in range(N_QZSSAT)]
 
     def decode_rtcm(self, payload):
         ''' read and decode RTCM QZSS ephemeris '''
         svid     = payload.read( 4).u  # satellite id, DF429
-        eph      = self.eph[svid-1]
+        eph      = EphNull()
         eph.toc  = payload.read(16).u  # t_oc, DF430
         eph.af2  = payload.read( 8).i  # a_f2, DF431
         eph.af1  = payload.read(16).i  # a_f1, DF432
@@ -298,6 +828,8 @@ class EphQzs:
         eph.tgd  = payload.read( 8).i  # T_GD, DF455
         eph.iodc = payload.read(10).u  # IODC, DF456
         eph.fi   = payload.read( 1).u  # fit interval, DF457
+        eph.svhu = eph.svh.u
+        self.table.add(svid, eph.iode, scaled(eph, SCALE_QZS))
         msg = f'J{svid:02d} WN={eph.wn} IODE={eph.iode:{FMT_IODE}} IODC={eph.iodc:{FMT_IODC}}'
         if (eph.svh[0:1]+eph.svh[2:5]).u:  # determination of QZSS health including L1C/B is complex, self.f.[2], p.47, 4.1.2.3(4)
             unhealthy = ''
@@ -315,13 +847,13 @@ class EphQzs:
 class EphBds:
     def __init__(self, trace):
         self.trace = trace
-        self.eph   = [EphNull() for _ in range(N_BDSAT)]
+        self.table = EphTable(N_BDSAT, DTYPE_KEPLER)
         self.alm   = [EphNull() for _ in range(N_BDSAT)]
 
     def decode_rtcm(self, payload):
         ''' read and decode RTCM BeiDou ephemeris '''
         svid     = payload.read( 6).u  # satellite id, DF488
-        eph      = self.eph[svid-1]
+        eph      = EphNull()
         eph.wn   = payload.read(13).u  # week number, DF489
         eph.urai = payload.read( 4).u  # URA, DF490
         eph.idot = payload.read(14).i  # IDOT, DF491
@@ -339,7 +871,7 @@ class EphBds:
         eph.cus  = payload.read(18).i  # C_us, DF503
         eph.a12  = payload.read(32).u  # sqrt_a, DF504
         eph.toe  = payload.read(17).u  # t_oe, DF505
-        eph.cic  = payload.read(18).u  # C_ic, DF506
+        eph.cic  = payload.read(18).i  # C_ic, DF506
         eph.omg0 = payload.read(32).i  # Omg_0, DF507
         eph.cis  = payload.read(18).i  # C_is, DF508
         eph.i0   = payload.read(32).i  # i_0, DF509
@@ -349,6 +881,7 @@ class EphBds:
         eph.tgd1 = payload.read(10).i  # T_GD1, DF513
         eph.tgd2 = payload.read(10).i  # T_GD2, DF514
         eph.svh  = payload.read( 1).u  # SVH, DF515
+        self.table.add(svid, eph.aode, scaled(eph, SCALE_BDS))
         msg =f'C{svid:02d} WN={eph.wn} AODE={eph.aode}'
         if eph.svh:
             msg += self.trace.msg(0, ' unhealthy', fg='red')
@@ -357,13 +890,13 @@ class EphBds:
 class EphIrn:
     def __init__(self, trace):
         self.trace = trace
-        self.eph = [EphNull() for _ in range(N_IRNSAT)]
-        self.alm = [EphNull() for _ in range(N_IRNSAT)]
+        self.table = EphTable(N_IRNSAT, DTYPE_KEPLER)
+        self.alm   = [EphNull() for _ in range(N_IRNSAT)]
 
     def decode_rtcm(self, payload):
         ''' read and decode RTCM IRNSS ephemeris '''
         svid      = payload.read( 6).u  # satellite id, DF516
-        eph       = self.eph[svid-1]
+        eph       = EphNull()
         eph.wn    = payload.read(10).u  # week number, DF517
         eph.af0   = payload.read(22).i  # a_f0, DF518
         eph.af1   = payload.read(16).i  # a_f1, DF519
@@ -393,6 +926,8 @@ class EphIrn:
         eph.i0    = payload.read(32).i  # i0, DF543
         payload.pos += 2                # spare, DF544
         payload.pos += 2                # spare, DF545
+        eph.svhu  = (eph.hl5 << 1) | eph.hs
+        self.table.add(svid, eph.iodec, scaled(eph, SCALE_IRN))
         msg = f'I{svid:02d} WN={eph.wn} IODEC={eph.iodec:{FMT_IODE}}'
         if eph.hl5 or eph.hs:
             msg += self.trace.msg(0, f" unhealthy{' L5' if eph.hl5 else ''}{' S' if eph.hs else ''}", fg='red')
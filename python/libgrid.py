@@ -0,0 +1,226 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# libgrid.py: library for CLAS grid index and network corrections at user positions
+# A part of QZS L6 Tool, https://github.com/yoronneko/qzsl6tool
+#
+# Copyright (c) 2024 Satoshi Takahashi
+#
+# Released under BSD 2-clause license.
+#
+# References:
+# [1] Cabinet Office, Government of Japan, Quasi-Zenith Satellite System
+#     Interface Specification Centimeter Level Augmentation Service,
+#     IS-QZSS-L6-005, Sept. 21, 2022.
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+import libssr
+import libtrace
+
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    libtrace.err('''\
+    This code needs numpy module.
+    Please install this module such as \"pip install numpy\".
+    ''')
+    sys.exit(1)
+
+KM_DEG     = 111.195  # length of a degree of latitude [km]
+GRID_RANGE = 100.     # range of grid points used for interpolation [km]
+GRID_BIN   = 0.5      # size of a bucket of the spatial index [deg]
+GRID_K     = 4        # maximum number of grid points interpolated
+GRID_CHUNK = 65536    # user positions looked up at once
+
+# CLAS grid of all networks in arrays, ref.[1]; a grid point of index i is
+# grid number GRID_NO[i] of compact network ID GRID_NID[i],
+# and grid number g of network ID n is index GRID_START[n-1] + g
+GRID_LAT   = np.array([lat for _, _, grids in libssr.CLASGRID for lat, _ in grids])
+GRID_LON   = np.array([lon for _, _, grids in libssr.CLASGRID for _, lon in grids])
+GRID_NID   = np.repeat(np.arange(1, libssr.N_NID + 1),
+                       [ngrid for _, ngrid, _ in libssr.CLASGRID])
+GRID_START = np.concatenate(([0], np.cumsum([ngrid for _, ngrid, _ in libssr.CLASGRID])))
+GRID_NO    = np.arange(len(GRID_NID)) - GRID_START[GRID_NID - 1]
+
+class GridIndex:
+    "spatial index of grid points in uniform buckets of latitude and longitude"
+
+    def __init__(self, lat, lon, nid, drange=GRID_RANGE, dbin=GRID_BIN):
+        self.drange = drange
+        self.dbin   = dbin
+        # a sentinel grid point of network ID 0 at the end pads the candidates
+        self.lat    = np.append(lat, np.nan)
+        self.lon    = np.append(lon, np.nan)
+        self.nid    = np.append(nid, 0)
+        npoint      = len(lat)
+        dlat        = drange / KM_DEG
+        dlon        = dlat / np.cos(np.radians(np.abs(lat).max() + dlat))
+        self.lat0   = lat.min() - dlat
+        self.lon0   = lon.min() - dlon
+        self.nlat   = int(np.ceil((lat.max() + dlat - self.lat0) / dbin))
+        self.nlon   = int(np.ceil((lon.max() + dlon - self.lon0) / dbin))
+        # grid points within drange of each bucket are the candidates,
+        # where the distance is underestimated at the pole side of the bucket
+        blat = self.lat0 + dbin * np.arange(self.nlat)
+        blon = self.lon0 + dbin * np.arange(self.nlon)
+        clat = np.clip(lat, blat[:, None, None], blat[:, None, None] + dbin)
+        clon = np.clip(lon, blon[None, :, None], blon[None, :, None] + dbin)
+        coslat = np.cos(np.radians(np.maximum(np.abs(clat), np.abs(lat))))
+        dist = np.hypot(clat - lat, (clon - lon) * coslat) * KM_DEG
+        near = (dist <= drange).reshape(self.nlat * self.nlon, npoint)
+        ncand = near.sum(axis=1)
+        # bucket nlat*nlon is for positions outside the index
+        self.cand = np.full((len(near) + 1, max(ncand.max(), 1)), npoint)
+        for bucket in np.flatnonzero(ncand):
+            self.cand[bucket, :ncand[bucket]] = np.flatnonzero(near[bucket])
+
+    def lookup(self, lat, lon, k=GRID_K):
+        ''' returns compact network ID covering the user positions, grid
+            points in the network nearest to the positions, and inverse
+            distance weights of the grid points for interpolation
+            lat, lon: latitude and longitude of users [deg] in any shape
+            k: maximum number of grid points interpolated
+            returns (nid, index, weight) of the shapes of (...), (..., k),
+                and (..., k), where nid is 0 and index is -1 for positions
+                or points not covered within drange, weights are 0 for
+                index of -1, and the sum of weights is 1 otherwise
+        '''
+        lat, lon = np.broadcast_arrays(np.asarray(lat, dtype=float),
+                                       np.asarray(lon, dtype=float))
+        shape = lat.shape
+        lat, lon = lat.ravel(), lon.ravel()
+        nid    = np.zeros(len(lat), dtype=int)
+        index  = np.full((len(lat), k), -1)
+        weight = np.zeros((len(lat), k))
+        for pos in range(0, len(lat), GRID_CHUNK):
+            part = slice(pos, pos + GRID_CHUNK)
+            nid[part], index[part], weight[part] = self.lookup_chunk(
+                lat[part], lon[part], k)
+        return nid.reshape(shape), index.reshape(shape + (k,)), \
+            weight.reshape(shape + (k,))
+
+    def lookup_chunk(self, lat, lon, k):
+        ''' looks up positions of 1D arrays '''
+        ilat = np.floor((lat - self.lat0) / self.dbin)
+        ilon = np.floor((lon - self.lon0) / self.dbin)
+        inside = (0 <= ilat) & (ilat < self.nlat) & (0 <= ilon) & (ilon < self.nlon)
+        bucket = np.where(inside, ilat * self.nlon + ilon, self.nlat * self.nlon)
+        cand = self.cand[bucket.astype(int)]
+        dy = self.lat[cand] - lat[:, None]
+        dx = (self.lon[cand] - lon[:, None]) * np.cos(np.radians(lat))[:, None]
+        dist = np.hypot(dx, dy) * KM_DEG
+        dist[~(dist <= self.drange)] = np.inf  # also for the sentinel
+        rows = np.arange(len(lat))
+        near = dist.argmin(axis=1)
+        nid = np.where(np.isfinite(dist[rows, near]), self.nid[cand[rows, near]], 0)
+        dist[self.nid[cand] != nid[:, None]] = np.inf  # grid of other networks
+        order = np.argsort(dist, axis=1)[:, :k]
+        dist = np.take_along_axis(dist, order, axis=1)
+        index = np.take_along_axis(cand, order, axis=1)
+        if dist.shape[1] < k:  # fewer candidates than k
+            pad = k - dist.shape[1]
+            dist = np.pad(dist, ((0, 0), (0, pad)), constant_values=np.inf)
+            index = np.pad(index, ((0, 0), (0, pad)))
+        valid = np.isfinite(dist)
+        with np.errstate(divide='ignore'):
+            weight = np.where(valid, 1 / dist, 0.)
+        hit = dist[:, 0] == 0  # on a grid point
+        weight[hit] = 0.
+        weight[hit, 0] = 1.
+        total = weight.sum(axis=1, keepdims=True)
+        weight = np.divide(weight, total, out=weight, where=0 < total)
+        index = np.where(valid, index, -1)
+        return nid, index, weight
+
+CLAS_INDEX = GridIndex(GRID_LAT, GRID_LON, GRID_NID)
+
+def lookup(lat, lon, k=GRID_K):
+    ''' returns compact network ID, CLAS grid point index, and
+        interpolation weight at the user positions, see GridIndex.lookup
+    '''
+    return CLAS_INDEX.lookup(lat, lon, k)
+
+def interpolate(values, interp):
+    ''' returns values of the grid points in the shape of (..., ngrid),
+        nan for not available, interpolated at the users by interp of the
+        shape of (ngrid, nuser), where the weights are normalized over
+        the available grid points, or nan for no available grid point
+    '''
+    valid = ~np.isnan(values)
+    value = np.where(valid, values, 0.) @ interp
+    if valid.all():
+        return value
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return value / (valid @ interp)
+
+class Atmosphere:
+    "slant STEC and troposphere delay at user positions from CSSR network corrections"
+
+    def __init__(self, lat, lon, k=GRID_K):
+        lat, lon = np.broadcast_arrays(np.asarray(lat, dtype=float),
+                                       np.asarray(lon, dtype=float))
+        self.lat, self.lon = lat, lon
+        self.shape = lat.shape
+        self.nid, index, weight = lookup(lat, lon, k)
+        nid, index, weight = self.nid.ravel(), index.reshape(-1, k), weight.reshape(-1, k)
+        lat, lon = lat.ravel(), lon.ravel()
+        # polynomial basis and interpolation matrix of the users of each
+        # network, computed once and reused at every epoch of corrections
+        self.net = {}  # {cnid: (rows, basis, interp)}
+        for cnid in np.unique(nid[0 < nid]).tolist():
+            rows = np.flatnonzero(nid == cnid)
+            ref  = GRID_START[cnid-1]  # polynomials refer to the first grid point
+            dlat = lat[rows] - GRID_LAT[ref]
+            dlon = lon[rows] - GRID_LON[ref]
+            basis = np.array([np.ones(len(rows)), dlat, dlon, dlat * dlon,
+                              dlat * dlat, dlon * dlon])
+            interp = np.zeros((GRID_START[cnid] - ref, len(rows)))
+            grid = np.where(index[rows] < 0, ref, index[rows]) - ref
+            np.add.at(interp, (grid, np.arange(len(rows))[:, None]), weight[rows])
+            self.net[cnid] = (rows, basis, interp)
+
+    def stec(self, ssr):
+        ''' returns satellite names and slant STEC [TECU] in the shape of
+            (nsat, ...) at the users, that is, polynomial plus interpolated
+            residual of the last ST8 and ST9, or ST12, corrections of ssr,
+            or nan for the users outside the networks of the corrections
+        '''
+        names = sorted({sat for cnid, sat in ssr.stec_poly
+                        if cnid in self.net and (cnid, sat) in ssr.stec_res})
+        row  = {sat: i for i, sat in enumerate(names)}
+        stec = np.full((len(names), self.nid.size), np.nan)
+        for cnid, (rows, basis, interp) in self.net.items():
+            sats = [sat for sat in names
+                    if (cnid, sat) in ssr.stec_poly and (cnid, sat) in ssr.stec_res]
+            if not sats:
+                continue
+            poly = np.array([ssr.stec_poly[(cnid, sat)] for sat in sats])
+            res  = np.array([ssr.stec_res [(cnid, sat)] for sat in sats], dtype=float)
+            stec[np.ix_([row[sat] for sat in sats], rows)] = \
+                poly @ basis + interpolate(res, interp)
+        return names, stec.reshape((len(names),) + self.shape)
+
+    def trop(self, ssr):
+        ''' returns hydrostatic and wet vertical delays [m] at the users,
+            interpolated from the grids of the last ST9 corrections, or wet
+            delay of polynomial plus interpolated residual of the last ST12
+            corrections with hydrostatic delay of nan, or nan for the users
+            outside the networks of the corrections
+        '''
+        hydro = np.full(self.nid.size, np.nan)
+        wet   = np.full(self.nid.size, np.nan)
+        for cnid, (rows, basis, interp) in self.net.items():
+            if cnid in ssr.trop_poly and cnid in ssr.trop_res:
+                res = np.array(ssr.trop_res[cnid], dtype=float)
+                wet[rows] = np.array(ssr.trop_poly[cnid]) @ basis[:4] + \
+                    interpolate(res, interp)
+            elif cnid in ssr.trop_grid:
+                grid = np.array([(np.nan, np.nan) if delay is None else delay
+                                 for delay in ssr.trop_grid[cnid]])
+                hydro[rows], wet[rows] = interpolate(grid.T, interp)
+        return hydro.reshape(self.shape), wet.reshape(self.shape)
+
+# EOF
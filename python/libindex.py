@@ -0,0 +1,238 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# libindex.py: library for byte-offset and GNSS time index of raw files
+# A part of QZS L6 Tool, https://github.com/yoronneko/qzsl6tool
+#
+# Copyright (c) 2024 Satoshi Takahashi, all rights reserved.
+#
+# Released under BSD 2-clause license.
+#
+# References:
+# [1] Septentrio, mosaic-X5 Reference Guide, Applicable to version 4.14.0
+#     of the Firmware, 2023.
+# [2] NovAtel, OEM7 Commands and Logs Reference Manual, v24, May 2023.
+# [3] u-blox, F9 HPG 1.32 Interface Description, UBX-22008968, 2022.
+# [4] Cabinet Office, Government of Japan, Quasi-Zenith Satellite System
+#     Interface Specification Centimeter Level Augmentation Service,
+#     IS-QZSS-L6-005, Sept. 21, 2022.
+
+import binascii
+import itertools
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+import libio
+import libtrace
+
+# index file is a text file with a header line, and each line has
+# GPS week (0 if unknown), GPS time of week in millisecond, PRN
+# (0 if not applicable), message type, and byte offset of the message.
+INDEX_HEAD = '# qzsl6tool index'
+INDEX_FMT  = ('l6', 'nov', 'sbf', 'ubx')  # supported formats
+
+def scan_l6(buf):  # ref.[4]
+    ''' yields (week, tow, prn, type, offset) of QZS L6 messages
+        time is derived from the CSSR ST1 epoch of each PRN,
+        and increases by a second for each following message
+    '''
+    epoch = {}  # {prn: [ST1 epoch in millisecond, number of messages]}
+    pos = buf.find(b'\x1a\xcf\xfc\x1d')
+    while 0 <= pos and pos + 250 <= len(buf):
+        prn, mtid = buf[pos+4], buf[pos+5]
+        head = int.from_bytes(buf[pos+6:pos+11], 'big')  # 40 bits
+        # alert(1) msgnum(12) subtype(4) epoch(20) of the first data part
+        if mtid & 1 and mtid >> 5 in {0b010, 0b101} and \
+           (head >> 27) & 0xfff == 4073 and (head >> 23) & 0xf == 1:
+            epoch[prn] = [((head >> 3) & 0xfffff) * 1000, 0]
+        elif prn in epoch:
+            epoch[prn][1] += 1
+        if prn in epoch:
+            yield 0, epoch[prn][0] + epoch[prn][1] * 1000, prn, mtid, pos
+        pos = buf.find(b'\x1a\xcf\xfc\x1d', pos + 250)
+
+def scan_sbf(buf):  # ref.[1]
+    ''' yields (week, tow, prn, type, offset) of SBF blocks '''
+    pos = buf.find(b'\x24\x40')
+    while 0 <= pos and pos + 16 <= len(buf):
+        crc, msg_id, msg_len = struct.unpack_from('<HHH', buf, pos + 2)
+        if msg_len < 16 or msg_len % 4 != 0 or len(buf) < pos + msg_len or \
+           binascii.crc_hqx(buf[pos+4:pos+msg_len], 0) != crc:
+            pos = buf.find(b'\x24\x40', pos + 1)
+            continue
+        msg_id &= 0x1fff
+        tow, wnc = struct.unpack_from('<IH', buf, pos + 8)
+        svid = buf[pos+14]
+        if   msg_id == 4024: prn = svid - 70   # GALRawCNAV, E01-E36
+        elif msg_id == 4069: prn = svid + 12   # QZSRawL6, L6 PRN 193-
+        elif msg_id == 4242: prn = svid - 140 if svid <= 180 else svid - 182
+        else               : prn = 0
+        yield wnc, tow, prn, msg_id, pos
+        pos = buf.find(b'\x24\x40', pos + msg_len)
+
+def scan_nov(buf):  # ref.[2]
+    ''' yields (week, tow, prn, type, offset) of NovAtel binary messages '''
+    pos = buf.find(b'\xaa\x44\x12')
+    while 0 <= pos and pos + 28 <= len(buf):
+        head_len = buf[pos+3]
+        msg_id, = struct.unpack_from('<H', buf, pos + 4)
+        msg_len, = struct.unpack_from('<H', buf, pos + 8)
+        end = pos + head_len + msg_len + 4
+        if head_len < 28 or len(buf) < end or \
+           zlib.crc32(buf[pos:end-4], 0xffffffff) ^ 0xffffffff != \
+           int.from_bytes(buf[end-4:end], 'little'):
+            pos = buf.find(b'\xaa\x44\x12', pos + 1)
+            continue
+        gpsw, gpst = struct.unpack_from('<HI', buf, pos + 14)
+        payload = pos + head_len
+        if   msg_id == 1330: prn, = struct.unpack_from('<I', buf, payload)      # QZSSRAWSUBFRAME
+        elif msg_id == 2239: prn, = struct.unpack_from('<I', buf, payload + 4)  # GALCNAVRAWPAGE
+        else               : prn  = 0
+        yield gpsw, gpst, prn, msg_id, pos
+        pos = buf.find(b'\xaa\x44\x12', end)
+
+def scan_ubx(buf):  # ref.[3]
+    ''' yields (week, tow, prn, type, offset) of UBX messages
+        time is derived from the latest UBX-RXM-RAWX, UBX-NAV-TIMEGPS,
+        or iTOW of UBX-NAV messages
+    '''
+    week, tow = 0, None
+    pos = buf.find(b'\xb5\x62')
+    while 0 <= pos and pos + 8 <= len(buf):
+        cls, mid, msg_len = struct.unpack_from('<BBH', buf, pos + 2)
+        end = pos + 6 + msg_len + 2
+        if len(buf) < end:
+            break
+        body = buf[pos+2:end-2]
+        if sum(body) & 0xff != buf[end-2] or \
+           sum(itertools.accumulate(body)) & 0xff != buf[end-1]:
+            pos = buf.find(b'\xb5\x62', pos + 1)
+            continue
+        payload = pos + 6
+        if cls == 0x02 and mid == 0x15 and 10 <= msg_len:  # UBX-RXM-RAWX
+            rcv_tow, week = struct.unpack_from('<dH', buf, payload)
+            tow = round(rcv_tow * 1000)
+        elif cls == 0x01 and 4 <= msg_len:                  # UBX-NAV
+            tow, = struct.unpack_from('<I', buf, payload)
+            if mid == 0x20 and 10 <= msg_len:               # UBX-NAV-TIMEGPS
+                week, = struct.unpack_from('<h', buf, payload + 8)
+        prn = buf[payload+1] if cls == 0x02 and mid == 0x13 else 0  # UBX-RXM-SFRBX
+        if tow is not None:
+            yield week, tow, prn, cls << 8 | mid, pos
+        pos = buf.find(b'\xb5\x62', end)
+
+SCAN = {'l6': scan_l6, 'nov': scan_nov, 'sbf': scan_sbf, 'ubx': scan_ubx}
+
+def build(fname, fmt, fp):
+    ''' writes the index of the raw file to fp, and returns the number of entries '''
+    n = 0
+    with open(fname, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            buf = b''
+        else:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        print(f'{INDEX_HEAD} format={fmt}', file=fp)
+        for week, tow, prn, mtype, offset in SCAN[fmt](buf):
+            print(f'{week},{tow},{prn},{mtype},{offset}', file=fp)
+            n += 1
+    return n
+
+def load(fname):
+    ''' returns list of index entries (week, tow, prn, type, offset) '''
+    entries = []
+    with open(fname, 'r') as f:
+        if not f.readline().startswith(INDEX_HEAD):
+            raise ValueError(f'{fname} is not an index file')
+        for line in f:
+            entries.append(tuple(int(x) for x in line.split(',')))
+    return entries
+
+def parse_time(s):
+    ''' returns (week or None, time of week in millisecond) of [WEEK:]TOW '''
+    if s is None:
+        return None
+    week, _, tow = s.rpartition(':')
+    return (int(week) if week else None), round(float(tow) * 1000)
+
+def later(entry, t):
+    ''' returns True if the entry time is later than or equal to t '''
+    week, tow = t
+    if week is None or entry[0] == 0:  # compares time of week only
+        return tow <= entry[1]
+    return (week, tow) <= (entry[0], entry[1])
+
+def lookup(entries, t_from, t_to):
+    ''' returns byte offsets (start, end) of the messages from t_from to t_to,
+        where end is None when t_to is not specified or is not reached
+    '''
+    start, end = 0, None
+    i = 0
+    if t_from is not None:
+        for i, entry in enumerate(entries):
+            if later(entry, t_from):
+                start = entry[4]
+                break
+        else:
+            return None, None
+    if t_to is not None:
+        t_to = (t_to[0], t_to[1] + 1)  # end time is inclusive
+        for entry in entries[i:]:
+            if later(entry, t_to):
+                end = entry[4]
+                break
+    return start, end
+
+def seek(fp, fidx, s_from, s_to):
+    ''' seeks file fp to the message of the start time, and returns
+        end byte offset or None
+        fp:     seekable binary file
+        fidx:   index file name
+        s_from: start time string [WEEK:]TOW
+        s_to:   end   time string [WEEK:]TOW
+    '''
+    start, end = lookup(load(fidx), parse_time(s_from), parse_time(s_to))
+    if start is None:  # no message after the start time
+        fp.seek(0, os.SEEK_END)
+        return None
+    fp.seek(start)
+    return end
+
+def reached(fp, end):
+    ''' returns True if the file position reaches the end byte offset '''
+    return end is not None and end <= fp.tell()
+
+def check_args(args):
+    ''' checks --index, --from, and --to options, and seeks the input '''
+    if (args.t_from or args.t_to) and not args.index and args.input and \
+        os.path.exists(args.input + '.idx'):
+        args.index = args.input + '.idx'  # index of --input file
+    if (args.t_from or args.t_to) and not args.index:
+        libtrace.err('index file (--index) is needed for --from and --to options.')
+        sys.exit(1)
+    if not args.index:
+        return None
+    if not libio.fp_in.seekable():
+        libtrace.err('input should be a seekable file, not a pipe or compressed file, for --index option.')
+        sys.exit(1)
+    try:
+        return seek(libio.fp_in, args.index, args.t_from, args.t_to)
+    except (OSError, ValueError) as e:
+        libtrace.err(f'index error: {e}')
+        sys.exit(1)
+
+def add_arguments(parser):
+    ''' adds --index, --from, and --to options to argument parser '''
+    parser.add_argument(
+        '--index', metavar='FILE',
+        help='index file made by rawindex.py, used with --from and --to options.')
+    parser.add_argument(
+        '--from', dest='t_from', metavar='TIME',
+        help='start GPS time [WEEK:]TOW in second, using the index file.')
+    parser.add_argument(
+        '--to', dest='t_to', metavar='TIME',
+        help='end GPS time [WEEK:]TOW in second, using the index file.')
+
+# EOF
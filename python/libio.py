@@ -0,0 +1,502 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# libio.py: library for input and output of the readers
+# A part of QZS L6 Tool, https://github.com/yoronneko/qzsl6tool
+#
+# Copyright (c) 2024 Satoshi Takahashi, all rights reserved.
+#
+# Released under BSD 2-clause license.
+
+import asyncio
+import atexit
+import base64
+import bz2
+import datetime
+import gzip
+import lzma
+import mmap
+import os
+import queue
+import sys
+import threading
+import urllib.parse
+
+import libgnsstime
+import libmetrics
+import libtrace
+
+BUFSIZE   = 1 << 20  # read size of compressed input
+QUEUE_LEN = 8        # number of chunks buffered by decompression thread
+DECOMP    = (        # magic number and open function of compressed file
+    (b'\x1f\x8b'    , gzip.open),
+    (b'\xfd7zXZ\x00', lzma.open),
+    (b'BZh'         , bz2.open ),
+)
+
+RECV_SIZE     = 1 << 16  # read size of network input
+RECV_TIMEOUT  = 30       # time in second without data before reconnection
+RECONNECT_MAX = 64       # maximum interval of reconnection in second
+NTRIP_PORT    = 2101     # default port number of NTRIP caster
+
+COMP      = {        # open function of compressed output
+    'gz' : lambda f: gzip.GzipFile(fileobj=f, mode='ab'),
+    'xz' : lambda f: lzma.LZMAFile(f, 'ab'),
+    'bz2': lambda f: bz2.BZ2File(f, 'ab'),
+}
+
+fp_in = sys.stdin.buffer  # binary input of the readers
+
+class MmapInput:
+    "Binary input from memory-mapped file"
+
+    def __init__(self, fname):
+        self.name = fname
+        with open(fname, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                self.buf = b''  # empty file cannot be mapped
+            else:
+                self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.buf)
+        self.size = len(self.buf)
+        self.pos  = 0
+
+    def read(self, n=-1):
+        ''' returns n bytes as a slice of the mapping without copying '''
+        start = self.pos
+        self.pos = self.size if n < 0 else min(start + n, self.size)
+        return self.view[start:self.pos]
+
+    def readline(self):
+        ''' returns a line including line feed '''
+        end = self.buf.find(b'\n', self.pos)
+        return self.read(-1 if end < 0 else end + 1 - self.pos)
+
+    def find_sync(self, sync):
+        ''' moves to the next of sync pattern, and returns the number of
+            skipped bytes, or -1 when the pattern is not found
+        '''
+        pos = self.buf.find(sync, self.pos)
+        if pos < 0:
+            self.pos = self.size
+            return -1
+        nskip = pos - self.pos
+        self.pos = pos + len(sync)
+        return nskip
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if   whence == os.SEEK_SET: self.pos = offset
+        elif whence == os.SEEK_CUR: self.pos += offset
+        elif whence == os.SEEK_END: self.pos = self.size + offset
+        self.pos = max(0, min(self.pos, self.size))
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def seekable(self):
+        return True
+
+class StreamInput:
+    "Binary input from compressed file, optionally decompressed in background thread"
+
+    def __init__(self, fp, thread=False):
+        self.fp    = fp     # decompressing file object
+        self.buf   = b''    # decompressed data
+        self.pos   = 0      # read position of buf
+        self.eof   = False
+        self.queue = None   # decompressed chunks from the thread
+        if thread:
+            self.queue = queue.Queue(QUEUE_LEN)
+            threading.Thread(target=self.decompress, daemon=True).start()
+
+    def decompress(self):
+        ''' puts decompressed chunks to the queue, and empty bytes at end '''
+        try:
+            while True:
+                chunk = self.fp.read(BUFSIZE)
+                self.queue.put(chunk)
+                if not chunk:
+                    return
+        except (OSError, EOFError, lzma.LZMAError) as e:
+            self.queue.put(e)  # raised again in the reader
+
+    def fill(self):
+        ''' appends a decompressed chunk to the buffer,
+            and returns False at end of file '''
+        if self.eof:
+            return False
+        chunk = self.queue.get() if self.queue else self.fp.read(BUFSIZE)
+        if isinstance(chunk, Exception):
+            raise chunk
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def read(self, n=-1):
+        while (n < 0 or len(self.buf) - self.pos < n) and self.fill():
+            pass
+        start = self.pos
+        self.pos = len(self.buf) if n < 0 else min(start + n, len(self.buf))
+        return self.buf[start:self.pos]
+
+    def readline(self):
+        ''' returns a line including line feed '''
+        while (end := self.buf.find(b'\n', self.pos)) < 0 and self.fill():
+            pass
+        return self.read(-1 if end < 0 else end + 1 - self.pos)
+
+    def find_sync(self, sync):
+        ''' moves to the next of sync pattern, and returns the number of
+            skipped bytes, or -1 when the pattern is not found
+        '''
+        nskip = 0
+        while (pos := self.buf.find(sync, self.pos)) < 0:
+            # keeps the tail that may be the beginning of sync pattern
+            keep = max(self.pos, len(self.buf) - len(sync) + 1)
+            nskip += keep - self.pos
+            self.pos = keep
+            if not self.fill():
+                self.pos = len(self.buf)
+                return -1
+        nskip += pos - self.pos
+        self.pos = pos + len(sync)
+        return nskip
+
+    def seekable(self):
+        return False
+
+class Incomplete(Exception):
+    "Raised by FeedInput when a frame is not received entirely"
+
+class FeedInput(StreamInput):
+    "Binary input fed by multiplexer, rolled back when a frame is incomplete"
+
+    def __init__(self):
+        super().__init__(None)
+        self.start = 0  # beginning of the frame being read
+
+    def feed(self, data):
+        ''' appends received data, discarding the frames already read '''
+        self.buf = self.buf[self.start:] + data
+        self.pos -= self.start
+        self.start = 0
+
+    def fill(self):
+        if self.eof:
+            return False
+        raise Incomplete
+
+    def begin(self):
+        ''' marks the beginning of a frame '''
+        self.start = self.pos
+
+    def rollback(self):
+        ''' returns to the beginning of the frame to read it again '''
+        self.pos = self.start
+
+    def find_sync(self, sync):
+        ''' moves to the next of sync pattern, and marks the pattern as the
+            beginning of the frame, so that skipped bytes are not read again
+        '''
+        try:
+            nskip = super().find_sync(sync)
+        except Incomplete:
+            libmetrics.bytes_skipped.inc(n=self.pos - self.start)
+            self.start = self.pos  # the tail that may be sync pattern
+            raise
+        self.start = self.pos - len(sync)
+        return nskip
+
+class NetSource:
+    "Data source of TCP server or NTRIP caster with reconnection"
+
+    def __init__(self, url, retry=0):
+        u = urllib.parse.urlsplit(url)
+        self.ntrip  = u.scheme in {'ntrip', 'ntrip1'}
+        self.v1     = u.scheme == 'ntrip1'  # NTRIP version 1 request
+        self.host   = u.hostname
+        self.port   = u.port or (NTRIP_PORT if self.ntrip else None)
+        self.mount  = u.path.lstrip('/')
+        self.user   = urllib.parse.unquote(u.username or '')
+        self.passwd = urllib.parse.unquote(u.password or '')
+        self.retry  = retry  # number of retries before end of input, 0: unlimited
+        if u.scheme not in {'tcp', 'ntrip', 'ntrip1'} or not self.host or \
+            not self.port or (self.ntrip and not self.mount):
+            raise ValueError(f'invalid URL {url}, should be tcp://HOST:PORT or ntrip://[USER[:PASSWD]@]HOST[:PORT]/MOUNTPOINT')
+        self.name   = f'{u.scheme}://{self.host}:{self.port}' + (f'/{self.mount}' if self.mount else '')
+
+    async def request(self, reader, writer):
+        ''' requests the mountpoint to NTRIP caster, and returns True
+            if the response is in chunked transfer encoding
+        '''
+        req = [f'GET /{self.mount} HTTP/1.{0 if self.v1 else 1}']
+        if not self.v1:
+            req += [f'Host: {self.host}:{self.port}', 'Ntrip-Version: Ntrip/2.0']
+        req += ['User-Agent: NTRIP qzsl6tool']
+        if self.user:
+            auth = base64.b64encode(f'{self.user}:{self.passwd}'.encode()).decode()
+            req += [f'Authorization: Basic {auth}']
+        if not self.v1:
+            req += ['Connection: close']
+        writer.write(('\r\n'.join(req) + '\r\n\r\n').encode())
+        await writer.drain()
+        status = await asyncio.wait_for(reader.readline(), RECV_TIMEOUT)
+        if status.startswith(b'ICY 200'):  # NTRIP version 1
+            return False
+        if not status.startswith(b'HTTP/1.') or status.split()[1:2] != [b'200']:
+            raise ValueError(f'caster response {status.decode(errors="replace").strip()}')
+        chunked = False
+        while (line := await asyncio.wait_for(reader.readline(), RECV_TIMEOUT)).strip():
+            name, _, value = line.decode(errors='replace').partition(':')
+            if name.strip().lower() == 'transfer-encoding' and 'chunked' in value.lower():
+                chunked = True
+        return chunked
+
+    async def receive(self, reader, chunked):
+        ''' yields received data until the connection is closed '''
+        while True:
+            if chunked:
+                line = await asyncio.wait_for(reader.readline(), RECV_TIMEOUT)
+                size = int(line.split(b';')[0], 16)  # chunk size
+                if size == 0:
+                    return
+                data = await asyncio.wait_for(reader.readexactly(size + 2), RECV_TIMEOUT)
+                data = data[:-2]  # CRLF after chunk data
+            else:
+                data = await asyncio.wait_for(reader.read(RECV_SIZE), RECV_TIMEOUT)
+                if not data:
+                    return
+            yield data
+
+    async def receive_loop(self, put):
+        ''' calls coroutine put with received data, reconnecting with
+            exponential backoff, and with empty bytes when the retries
+            are exhausted
+        '''
+        wait  = 1  # interval of reconnection in second
+        nfail = 0  # number of consecutive connections without data
+        while True:
+            nfail += 1
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), RECV_TIMEOUT)
+                try:
+                    chunked = await self.request(reader, writer) if self.ntrip else False
+                    async for data in self.receive(reader, chunked):
+                        await put(data)
+                        wait, nfail = 1, 0
+                finally:
+                    writer.close()
+                libtrace.warn(f'input disconnected: {self.name}')
+            except (OSError, EOFError, ValueError, asyncio.TimeoutError) as e:
+                libtrace.warn(f'input error: {self.name}: {e or type(e).__name__}')
+            if self.retry and self.retry < nfail:
+                await put(b'')  # end of input
+                return
+            libmetrics.input_reconnects.inc()
+            await asyncio.sleep(wait)
+            wait = min(wait * 2, RECONNECT_MAX)
+
+class NetInput(StreamInput):
+    "Binary input from TCP server or NTRIP caster, received in background thread"
+
+    def __init__(self, url, retry=0):
+        super().__init__(None)
+        self.source = NetSource(url, retry)
+        self.name   = self.source.name
+        self.queue  = queue.Queue(QUEUE_LEN)
+        threading.Thread(target=asyncio.run,
+            args=(self.source.receive_loop(self.put),), daemon=True).start()
+
+    async def put(self, data):
+        ''' puts data to the queue, waiting in another thread when it is full '''
+        try:
+            self.queue.put_nowait(data)
+        except queue.Full:
+            await asyncio.to_thread(self.queue.put, data)
+
+def find_sync(fp, sync):
+    ''' reads fp until the sync pattern, and returns the number of
+        skipped bytes, or -1 when end of file is encountered
+    '''
+    if isinstance(fp, (MmapInput, StreamInput)):
+        return fp.find_sync(sync)
+    len_sync = len(sync)
+    buf = bytes(len_sync)
+    nskip = -len_sync
+    while buf != sync:
+        b = fp.read(1)
+        if not b:
+            return -1
+        buf = buf[1:] + b
+        nskip += 1
+    return nskip
+
+def open_file(fname, thread=False, retry=0):
+    ''' returns binary input of fname, which is memory-mapped,
+        or decompressed if it is gzip, xz, or bzip2 file, or received
+        if it is tcp:// or ntrip:// URL
+        thread: decompresses in a background thread
+        retry:  number of reconnection retries for URL, 0: unlimited
+    '''
+    if '://' in fname:
+        return NetInput(fname, retry)
+    with open(fname, 'rb') as f:
+        magic = f.read(6)
+    for head, open_func in DECOMP:
+        if magic.startswith(head):
+            return StreamInput(open_func(fname, 'rb'), thread)
+    return MmapInput(fname)
+
+def open_input(fname, thread=False, retry=0):
+    ''' replaces the reader input with fname by open_file() '''
+    global fp_in
+    if not fname:
+        return
+    try:
+        fp_in = open_file(fname, thread, retry)
+    except (OSError, ValueError) as e:
+        libtrace.err(f'input error: {e}')
+        sys.exit(1)
+
+def rotate_name(gpsw, gpst, period):
+    ''' returns file name body YYYYDDDX of GPS time, where X is hour
+        letter A-X for hourly rotation, or 0 for daily rotation
+        gpsw: GPS week, or None for the current time
+        gpst: GPS time of week in millisecond
+    '''
+    epoch, leapsec, _ = libgnsstime.epoch_info('GPS')
+    if gpsw is None:
+        t = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) + \
+            datetime.timedelta(seconds=leapsec)
+    else:
+        t = epoch + datetime.timedelta(weeks=gpsw, milliseconds=gpst)
+    x = chr(ord('A') + t.hour) if period == 'hour' else '0'
+    return f'{t.year:04d}{t.timetuple().tm_yday:03d}{x}'
+
+class RotatingOutput:
+    "Binary output into files rotated hourly or daily by GPS time"
+
+    def __init__(self, dirname, ext, period, comp=None, thread=False):
+        self.dirname = dirname
+        self.ext     = ext + ('.' + comp if comp else '')
+        self.period  = period  # hour or day
+        self.comp    = comp    # gz, xz, bz2, or None
+        self.name    = ''      # current file name
+        self.f       = None    # current file
+        self.fp      = None    # current file, or its compressing file object
+        self.queue   = None    # file names and data to the thread
+        self.error   = None    # error in the thread, raised again in the writer
+        os.makedirs(dirname, exist_ok=True)
+        if thread:
+            self.queue = queue.Queue(QUEUE_LEN * 256)
+            self.thread = threading.Thread(target=self.write_loop, daemon=True)
+            self.thread.start()
+        atexit.register(self.close)
+
+    def rotate(self, name):
+        ''' closes current file with fsync, and opens file of name '''
+        self.close_file()
+        self.name = name
+        self.f  = open(name, 'ab')
+        self.fp = COMP[self.comp](self.f) if self.comp else self.f
+
+    def close_file(self):
+        if not self.f:
+            return
+        if self.fp is not self.f:
+            self.fp.close()  # writes trailer of compressed stream
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.f.close()
+        self.f = self.fp = None
+
+    def write_file(self, name, data):
+        if name != self.name:
+            self.rotate(name)
+        self.fp.write(data)
+
+    def write_loop(self):
+        ''' writes data from the queue until None is received,
+            and keeps the first error for the writer
+        '''
+        while (item := self.queue.get()) is not None:
+            if self.error:
+                continue  # drains the queue not to block the writer
+            try:
+                self.write_file(*item)
+            except OSError as e:
+                self.error = e
+        try:
+            self.close_file()
+        except OSError as e:
+            self.error = self.error or e
+
+    def raise_error(self):
+        ''' raises the error in the thread once '''
+        if self.error:
+            error, self.error = self.error, None
+            raise error
+
+    def write(self, data, gpsw=None, gpst=0):
+        ''' writes data into the file of GPS time
+            gpsw: GPS week, or None for the current time
+            gpst: GPS time of week in millisecond
+        '''
+        name = os.path.join(self.dirname,
+            f'{rotate_name(gpsw, gpst, self.period)}.{self.ext}')
+        if self.queue:
+            self.raise_error()
+            self.queue.put((name, bytes(data)))
+        else:
+            self.write_file(name, data)
+
+    def flush(self):
+        ''' flushes uncompressed file, while compressed stream is
+            flushed only on rotation to keep compression ratio
+        '''
+        if not self.queue and self.fp is self.f and self.f:
+            self.f.flush()
+
+    def close(self):
+        if self.queue:
+            self.queue.put(None)
+            self.thread.join()
+            self.queue = None
+            self.raise_error()
+        else:
+            self.close_file()
+
+def add_output_arguments(parser):
+    ''' adds raw output rotation options to argument parser '''
+    parser.add_argument(
+        '--rotate', choices=['hour', 'day'],
+        help='write raw messages to files rotated hourly or daily, named YYYYDDDX by GPS time, instead of stdout.')
+    parser.add_argument(
+        '--output-dir', metavar='DIR', default='.',
+        help='directory of rotated files, default current directory.')
+    parser.add_argument(
+        '--compress', choices=list(COMP),
+        help='compress rotated files.')
+    parser.add_argument(
+        '--output-thread', action='store_true',
+        help='write and compress rotated files in a background thread.')
+
+def open_output(args, ext):
+    ''' returns rotating output of raw messages with extension ext,
+        or None when --rotate option is not given
+    '''
+    if not args.rotate:
+        return None
+    try:
+        return RotatingOutput(args.output_dir, ext, args.rotate,
+            args.compress, args.output_thread)
+    except OSError as e:
+        libtrace.err(f'output error: {e}')
+        sys.exit(1)
+
+# EOF
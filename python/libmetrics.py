@@ -0,0 +1,205 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# libmetrics.py: library for metrics export in Prometheus text format
+# A part of QZS L6 Tool, https://github.com/yoronneko/qzsl6tool
+#
+# Copyright (c) 2024 Satoshi Takahashi, all rights reserved.
+#
+# Released under BSD 2-clause license.
+#
+# References:
+# [1] Prometheus, Exposition formats, text-based format,
+#     https://prometheus.io/docs/instrumenting/exposition_formats/
+
+import atexit
+import http.server
+import os
+import threading
+import time
+
+import libperf
+
+INTERVAL = 10  # interval of rewriting metrics file in second
+BUCKETS  = (   # upper bounds of decode latency histogram in second
+    1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 1e-1, 5e-1, 1.0)
+
+registry = []  # registered metrics
+tool     = ''  # tool name, added to all metrics as label
+
+def fmt_labels(labelnames, values, extra=''):
+    ''' returns label string such as {tool="qzsl6read",subtype="1"} '''
+    labels = [f'tool="{tool}"'] if tool else []
+    labels += [f'{n}="{v}"' for n, v in zip(labelnames, values)]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+class Counter:
+    "Monotonically increasing counter"
+    mtype = 'counter'
+
+    def __init__(self, name, doc, labelnames=()):
+        self.name       = name
+        self.doc        = doc
+        self.labelnames = labelnames
+        self.values     = {}  # {label values: value}
+        registry.append(self)
+
+    def inc(self, *labels, n=1):
+        ''' increases the value of labels by n '''
+        self.values[labels] = self.values.get(labels, 0) + n
+
+    def get(self, *labels):
+        return self.values.get(labels, 0)
+
+    def render(self):
+        ''' returns metrics in text format [1] '''
+        text = f'# HELP {self.name} {self.doc}\n# TYPE {self.name} {self.mtype}\n'
+        for labels, value in sorted(self.values.items()):
+            value = value if isinstance(value, int) else f'{value:.9f}'
+            text += f'{self.name}{fmt_labels(self.labelnames, labels)} {value}\n'
+        return text
+
+class Gauge(Counter):
+    "Value that can go up and down"
+    mtype = 'gauge'
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+class Histogram:
+    "Distribution of observed values in cumulative buckets"
+    mtype = 'histogram'
+
+    def __init__(self, name, doc, labelnames=(), buckets=BUCKETS):
+        self.name       = name
+        self.doc        = doc
+        self.labelnames = labelnames
+        self.buckets    = buckets
+        self.values     = {}  # {label values: [bucket counts..., sum, count]}
+        registry.append(self)
+
+    def observe(self, value, *labels):
+        ''' counts the value in the bucket, and accumulates sum and count '''
+        v = self.values.get(labels)
+        if v is None:
+            v = self.values[labels] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                v[i] += 1
+                break
+        v[-2] += value
+        v[-1] += 1
+
+    def render(self):
+        ''' returns metrics in text format [1] '''
+        text = f'# HELP {self.name} {self.doc}\n# TYPE {self.name} {self.mtype}\n'
+        for labels, v in sorted(self.values.items()):
+            cum = 0
+            for bound, n in zip(self.buckets, v):
+                cum += n
+                le = fmt_labels(self.labelnames, labels, f'le="{bound:g}"')
+                text += f'{self.name}_bucket{le} {cum}\n'
+            le = fmt_labels(self.labelnames, labels, 'le="+Inf"')
+            text += f'{self.name}_bucket{le} {v[-1]}\n'
+            text += f'{self.name}_sum{fmt_labels(self.labelnames, labels)} {v[-2]:.9f}\n'
+            text += f'{self.name}_count{fmt_labels(self.labelnames, labels)} {v[-1]}\n'
+        return text
+
+# metrics of the tools
+frames_read   = Counter('qzsl6tool_frames_read_total',
+    'Number of frames or messages read.')
+bytes_skipped = Counter('qzsl6tool_bytes_skipped_total',
+    'Number of bytes skipped in synchronization search.')
+check_failed  = Counter('qzsl6tool_check_failures_total',
+    'Number of CRC, checksum, or parity check failures.', ('check',))
+cssr_decoded  = Counter('qzsl6tool_cssr_messages_total',
+    'Number of decoded CSSR messages of the selected subtypes.', ('subtype',))
+cssr_bits     = Counter('qzsl6tool_cssr_bits_total',
+    'Number of CSSR bits for satellites, signals, other information, and null.', ('part',))
+cssr_nsat     = Gauge('qzsl6tool_cssr_satellites',
+    'Number of satellites in the latest CSSR mask.')
+cssr_nsig     = Gauge('qzsl6tool_cssr_signals',
+    'Number of signals in the latest CSSR mask.')
+has_pages     = Counter('qzsl6tool_has_pages_total',
+    'Number of received HAS pages.')
+has_decoded   = Counter('qzsl6tool_has_messages_total',
+    'Number of decoded HAS messages.', ('mid',))
+stage_seconds = Counter('qzsl6tool_stage_seconds_total',
+    'Processing time of each stage.', ('stage',))
+input_reconnects = Counter('qzsl6tool_input_reconnects_total',
+    'Number of reconnections of network input.')
+server_clients = Gauge('qzsl6tool_server_clients',
+    'Number of TCP clients connected to the fan-out server.')
+server_disconnected = Counter('qzsl6tool_server_disconnected_total',
+    'Number of TCP clients disconnected by the fan-out server.', ('reason',))
+decode_seconds = Histogram('qzsl6tool_decode_seconds',
+    'Decode latency of each message type.', ('message',))
+
+def render():
+    ''' returns all metrics in text format [1] '''
+    return ''.join(metric.render() for metric in registry)
+
+def observe(stage, key, elapsed):
+    ''' sink of libperf that records the stage time and decode latency '''
+    stage_seconds.inc(stage, n=elapsed * 1e-9)
+    if key:
+        decode_seconds.observe(elapsed * 1e-9, key)
+
+def write_file(fname):
+    ''' rewrites metrics file atomically '''
+    ftmp = fname + '.tmp'
+    with open(ftmp, 'w') as f:
+        f.write(render())
+    os.replace(ftmp, fname)
+
+def write_file_loop(fname):
+    while True:
+        time.sleep(INTERVAL)
+        write_file(fname)
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    "HTTP handler that responds metrics in text format"
+
+    def do_GET(self):
+        if self.path not in {'/', '/metrics'}:
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # suppresses access log to stderr
+        pass
+
+def start(prog, target):
+    ''' starts metrics export
+        prog:   program name, used as tool label
+        target: file name rewritten periodically, or port number of
+                HTTP server on loopback address
+    '''
+    global tool
+    tool = os.path.splitext(os.path.basename(prog))[0]
+    libperf.sinks.append(observe)
+    libperf.enable(report_at_exit=False)
+    if target.isdecimal():
+        server = http.server.ThreadingHTTPServer(
+            ('127.0.0.1', int(target)), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    else:
+        write_file(target)
+        atexit.register(write_file, target)
+        threading.Thread(target=write_file_loop, args=(target,), daemon=True).start()
+
+if __name__ == '__main__':
+    frames_read.inc()
+    check_failed.inc('crc', n=2)
+    cssr_decoded.inc('1')
+    decode_seconds.observe(3e-4, 'CSSR ST1')
+    print(render(), end='')
+
+# EOF
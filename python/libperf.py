@@ -0,0 +1,176 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# libperf.py: library for performance measurement of processing stages
+# A part of QZS L6 Tool, https://github.com/yoronneko/qzsl6tool
+#
+# Copyright (c) 2024 Satoshi Takahashi, all rights reserved.
+#
+# Released under BSD 2-clause license.
+
+import atexit
+import functools
+import math
+import random
+import sys
+import time
+
+# processing stages:
+#   read:   input and synchronization search
+#   crc:    CRC, checksum, and parity check
+#   fec:    forward error correction (Reed-Solomon or LDPC)
+#   decode: message decode
+#   output: display messages and raw message output
+# the measured time of each stage excludes that of the nested stages.
+
+N_SAMPLE = 4096   # maximum number of latency samples kept for each key
+
+enabled  = False  # measurement is enabled
+recorded = False  # latency samples are recorded for the report
+t_enable = 0      # time at enabling measurement in nanosecond
+stage_n  = {}     # number of calls for each stage
+stage_ns = {}     # elapsed time for each stage in nanosecond (self time)
+key_ns   = {}     # elapsed time samples for each key such as subtype
+sinks    = []     # functions called with (stage, key, elapsed) at each stop
+_level   = []     # [start time, elapsed time of nested stages] for each level
+
+class Reservoir:
+    "Uniform random samples of bounded size, with exact count, sum, and max"
+
+    def __init__(self, size=N_SAMPLE, seed=0):
+        self.size    = size
+        self.n       = 0   # number of added values
+        self.total   = 0   # sum of added values
+        self.max     = 0   # maximum of added values
+        self.samples = []  # random samples of the added values
+        self.rng     = random.Random(seed)
+
+    def add(self, value):
+        ''' adds the value, which replaces a random sample when full '''
+        self.max    = max(self.max, value) if self.n else value
+        self.n     += 1
+        self.total += value
+        if len(self.samples) < self.size:
+            self.samples.append(value)
+        else:  # each value is kept with probability size/n
+            pos = self.rng.randrange(self.n)
+            if pos < self.size:
+                self.samples[pos] = value
+
+    def mean(self):
+        ''' returns mean of the added values '''
+        return self.total / self.n if self.n else 0
+
+    def percentile(self, p):
+        ''' returns p-th percentile estimated from the samples '''
+        return percentile(sorted(self.samples), p) if self.samples else 0
+
+def enable(report_at_exit=True):
+    ''' enables measurement, and registers the report at exit '''
+    global enabled, recorded, t_enable
+    if not enabled:
+        enabled  = True
+        t_enable = time.perf_counter_ns()
+    if report_at_exit and not recorded:
+        recorded = True
+        atexit.register(report)
+
+def start():
+    ''' returns start time in nanosecond, or 0 when disabled '''
+    if not enabled:
+        return 0
+    t_start = time.perf_counter_ns()
+    _level.append([t_start, 0])
+    return t_start
+
+def stop(stage, t_start, key=None):
+    ''' accumulates the elapsed time from t_start to the stage,
+        and records the sample to the key if specified
+        the levels of nested stages that were not stopped, such as by an
+        exception, are discarded
+    '''
+    if not t_start:
+        return
+    elapsed = time.perf_counter_ns() - t_start
+    depth = len(_level) - 1
+    while 0 <= depth and _level[depth][0] != t_start:
+        depth -= 1
+    nested = 0
+    if 0 <= depth:
+        nested = _level[depth][1]
+        del _level[depth:]
+    if _level:
+        _level[-1][1] += elapsed
+    stage_n [stage] = stage_n .get(stage, 0) + 1
+    stage_ns[stage] = stage_ns.get(stage, 0) + elapsed - nested
+    if key and recorded:
+        if key not in key_ns:
+            key_ns[key] = Reservoir()
+        key_ns[key].add(elapsed)
+    for sink in sinks:
+        sink(stage, key, elapsed)
+
+class Measure:
+    "Context manager that measures the block as the stage"
+
+    def __init__(self, stage, key=None):
+        self.stage = stage
+        self.key   = key
+
+    def __enter__(self):
+        self.t_start = start()
+        return self
+
+    def __exit__(self, *exc):
+        stop(self.stage, self.t_start, self.key)
+
+def timed(stage, key=None):
+    ''' decorator that measures the function as the stage '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            t_start = start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stop(stage, t_start, key)
+        return wrapper
+    return decorator
+
+def percentile(samples, p):
+    ''' returns p-th percentile of sorted samples by nearest rank '''
+    return samples[max(math.ceil(len(samples) * p / 100) - 1, 0)]
+
+def report(fp=sys.stderr):
+    ''' prints per-stage totals and per-key latencies '''
+    if not recorded:
+        return
+    wall = time.perf_counter_ns() - t_enable
+    print(f'performance report: wall time {wall*1e-6:.3f} ms', file=fp)
+    print(f"{'stage':16s} {'calls':>8s} {'total [ms]':>11s} {'ratio':>7s}", file=fp)
+    for stage in sorted(stage_ns, key=stage_ns.get, reverse=True):
+        print(f"{stage:16s} {stage_n[stage]:8d} {stage_ns[stage]*1e-6:11.3f} "
+              f"{stage_ns[stage]/wall*100 if wall else 0:6.1f}%", file=fp)
+    other = wall - sum(stage_ns.values())
+    print(f"{'(other)':16s} {'':8s} {other*1e-6:11.3f} "
+          f"{other/wall*100 if wall else 0:6.1f}%", file=fp)
+    if not key_ns:
+        return
+    print(f"{'message':16s} {'count':>8s} {'mean [us]':>11s} {'p99 [us]':>11s}", file=fp)
+    for key in sorted(key_ns):
+        samples = key_ns[key]
+        print(f"{key:16s} {samples.n:8d} {samples.mean()*1e-3:11.1f} "
+              f"{samples.percentile(99)*1e-3:11.1f}", file=fp)
+
+if __name__ == '__main__':
+    @timed('decode', 'test')
+    def test(n):
+        with Measure('crc'):
+            sum(range(n))
+    enable()
+    for n in range(1000):
+        test(n)
+
+# EOF
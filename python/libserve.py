@@ -0,0 +1,171 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# libserve.py: library for TCP fan-out server of the readers
+# A part of QZS L6 Tool, https://github.com/yoronneko/qzsl6tool
+#
+# Copyright (c) 2024 Satoshi Takahashi, all rights reserved.
+#
+# Released under BSD 2-clause license.
+
+import asyncio
+import atexit
+import sys
+import threading
+
+import libmetrics
+import libtrace
+
+QUEUE_LEN = 256  # messages queued for a client before it is disconnected
+TIMEOUT   = 5    # time in second to send queued messages at exit
+
+class FanoutServer:
+    "TCP server that sends the same output to all connected clients"
+
+    def __init__(self, host, port, nwait=0, qlen=QUEUE_LEN):
+        self.qlen    = qlen
+        self.nwait   = nwait      # number of clients waited for before output
+        self.clients = {}         # {writer: (queue, task)}
+        self.buf     = bytearray()  # output until flush
+        self.error   = None
+        self.loop    = asyncio.new_event_loop()
+        self.ready   = threading.Event()  # set when listening or failed
+        self.waited  = threading.Event()  # set when nwait clients connected
+        if nwait == 0:
+            self.waited.set()
+        self.thread  = threading.Thread(target=self.run, args=(host, port), daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        if self.error:
+            raise self.error
+        atexit.register(self.close)
+
+    def run(self, host, port):
+        ''' runs event loop of the server in the thread '''
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self.handle, host, port))
+        except OSError as e:
+            self.error = e
+            self.ready.set()
+            return
+        self.ready.set()
+        self.loop.run_forever()
+
+    async def handle(self, reader, writer):
+        ''' sends queued messages to a client until None is received '''
+        queue = asyncio.Queue(self.qlen)
+        self.clients[writer] = (queue, asyncio.current_task())
+        libmetrics.server_clients.set(len(self.clients))
+        if self.nwait <= len(self.clients):
+            self.waited.set()
+        try:
+            while (data := await queue.get()) is not None:
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass  # disconnected by client, or as slow client
+        finally:
+            self.clients.pop(writer, None)
+            libmetrics.server_clients.set(len(self.clients))
+            writer.close()
+
+    def broadcast(self, data):
+        ''' sends data to all clients in the event loop, where data is
+            shared by the clients without copy; data is written to the
+            socket at once when nothing is pending for the client, or is
+            queued otherwise, and clients whose queue is full are
+            disconnected
+        '''
+        for writer, (queue, task) in list(self.clients.items()):
+            try:
+                if queue.empty() and writer.transport.get_write_buffer_size() == 0:
+                    writer.write(data)
+                else:
+                    queue.put_nowait(data)
+            except asyncio.QueueFull:
+                libtrace.warn(f'slow client disconnected: {writer.get_extra_info("peername")}')
+                libmetrics.server_disconnected.inc('slow')
+                self.clients.pop(writer)
+                task.cancel()
+                writer.transport.abort()
+
+    @property
+    def buffer(self):  # binary output, like sys.stdout.buffer
+        return self
+
+    def write(self, data):
+        ''' stores data until flush, so that a message is sent at once '''
+        if isinstance(data, str):
+            data = data.encode()
+        self.buf += data
+        return len(data)
+
+    def flush(self):
+        ''' sends stored data to all clients '''
+        if not self.buf or self.loop.is_closed():
+            return
+        data = bytes(self.buf)
+        self.buf.clear()
+        self.loop.call_soon_threadsafe(self.broadcast, data)
+
+    def isatty(self):
+        return False
+
+    async def shutdown(self):
+        ''' sends queued messages and closes all clients '''
+        self.server.close()
+        tasks = []
+        for writer, (queue, task) in list(self.clients.items()):
+            tasks.append(task)
+            try:
+                queue.put_nowait(None)
+            except asyncio.QueueFull:  # slow client
+                task.cancel()
+                writer.transport.abort()
+        if tasks:
+            await asyncio.wait(tasks, timeout=TIMEOUT)
+        for task in tasks:  # clients that did not receive all in time
+            task.cancel()
+
+    def close(self):
+        if self.loop.is_closed():
+            return
+        self.flush()
+        asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+def add_arguments(parser):
+    ''' adds TCP server options to argument parser '''
+    parser.add_argument(
+        '--serve', metavar='[HOST:]PORT',
+        help='send the standard output, such as RTCM messages, to all TCP clients connected to PORT instead of stdout.')
+    parser.add_argument(
+        '--serve-wait', metavar='N', type=int, default=0,
+        help='wait for N clients before reading input, default 0.')
+    parser.add_argument(
+        '--serve-queue', metavar='N', type=int, default=QUEUE_LEN,
+        help=f'disconnect a client when N messages are queued for it, default {QUEUE_LEN}.')
+
+def open_server(args):
+    ''' returns fan-out server after N clients are connected,
+        or None when --serve option is not given
+    '''
+    if not args.serve:
+        return None
+    host, _, port = args.serve.rpartition(':')
+    if not port.isdecimal() or args.serve_wait < 0 or args.serve_queue < 1:
+        libtrace.err(f'invalid server option ({args.serve}, {args.serve_wait}, {args.serve_queue}).')
+        sys.exit(1)
+    try:
+        server = FanoutServer(host or None, int(port), args.serve_wait, args.serve_queue)
+    except OSError as e:
+        libtrace.err(f'server error: {e}')
+        sys.exit(1)
+    server.waited.wait()
+    return server
+
+# EOF
@@ -28,6 +28,8 @@
 
 import sys
 
+import libmetrics
+import libperf
 import libtrace
 
 try:
@@ -46,6 +48,27 @@ CSSR_UI = [        # CSSR update interval in second, ref.[3], Table 4.2.2-6
 HAS_VI = [         # HAS validity interval in second
     5, 10, 15, 20, 30, 60, 90, 120, 180, 240, 300, 600, 900, 1800, 3600, 0
 ]
+SSR_MSGNUM = {      # RTCM SSR message number from message type and satellite system, ref.[4]
+    'SSR orbit'    : {'G': 1057, 'R': 1063, 'E': 1240, 'J': 1246, 'S': 1252, 'C': 1258},
+    'SSR clock'    : {'G': 1058, 'R': 1064, 'E': 1241, 'J': 1247, 'S': 1253, 'C': 1259},
+    'SSR code bias': {'G': 1059, 'R': 1065, 'E': 1242, 'J': 1248, 'S': 1254, 'C': 1260},
+}
+SSR_SIGNAL = {      # RTCM SSR signal and tracking mode identifier (DF380) from signal name, ref.[4]
+    'G': {"L1 C/A": 0, "L1 P": 1, "L1 Z-tracking": 2, "L2 CM": 7, "L2 CL": 8,
+          "L2 CM+CL": 9, "L2 P": 10, "L2 Z-tracking": 11, "L5 I": 14,
+          "L5 Q": 15, "L5 I+Q": 16, "L1C(D)": 17, "L1C(P)": 18, "L1C(D+P)": 19},
+    'R': {"G1 C/A": 0, "G1 P": 1, "G2 C/A": 2, "G2 P": 3},
+    'E': {"E1 B": 1, "E1 C": 2, "E1 B+C": 3, "E5a I": 5, "E5a Q": 6,
+          "E5a I+Q": 7, "E5b I": 8, "E5b Q": 9, "E5b I+Q": 10, "E5 I": 11,
+          "E5 Q": 12, "E5 I+Q": 13, "E6 B": 15, "E6 C": 16, "E6 B+C": 17},
+    'C': {"B1 I": 0, "B1 Q": 1, "B1 I+Q": 2, "B3 I": 3, "B3 Q": 4,
+          "B3 I+Q": 5, "B2 I": 6, "B2 Q": 7, "B2 I+Q": 8, "B1C(D)": 9,
+          "B1C(P)": 10, "B1C(D+P)": 11, "B2a(D)": 12, "B2a(P)": 13,
+          "B2a(D+P)": 14},
+    'J': {"L1 C/A": 0, "L1 L1C(D)": 1, "L1 L1C(P)": 2, "L1 L1C(D+P)": 12,
+          "L2 L2C(M)": 3, "L2 L2C(L)": 4, "L2 L2C(M+L)": 5, "L5 I": 6,
+          "L5 Q": 7, "L5 I+Q": 8},
+}
 FMT_ORB    = '7.4f'  # format string for orbit
 FMT_CLK    = '7.3f'  # format string for clock
 FMT_CB     = '7.3f'  # format string for code bias
@@ -117,6 +140,26 @@ def gnssid2satsys(gnssid):
     else: raise Exception(f'undefined gnssid {gnssid}')
     return satsys
 
+def satsys2gnssid(satsys):
+    ''' convert satellite system to gnss id '''
+    for gnssid in range(6):
+        if gnssid2satsys(gnssid) == satsys:
+            return gnssid
+    raise Exception(f'undefined satsys {satsys}')
+
+def signame2sigmask(satsys, signame):
+    ''' convert satellite system and signal name to signal mask '''
+    for sigmask in range(16):
+        if sigmask2signame(satsys, sigmask) == signame:
+            return sigmask
+    raise Exception(f'undefined signal name {signame} for satsys={satsys}')
+
+def quantize(val, lsb, invalid):
+    ''' returns integer representation of value with LSB,
+        or invalid value if the value is None
+    '''
+    return invalid if val is None else round(val / lsb)
+
 def sigmask2signame(satsys, sigmask):
     ''' convert satellite system and signal mask to signal name '''
     signame = f'satsys={satsys} sigmask={sigmask}'
@@ -148,6 +191,101 @@ def sigmask2signame(satsys, sigmask):
             f'unassigned signal name for satsys={satsys} and sigmask={sigmask}')
     return signame
 
+def ssr_satid_bw(satsys):
+    ''' returns bit width of RTCM SSR satellite ID '''
+    if   satsys == 'J': bw = 4  # ref. [2]
+    elif satsys == 'R': bw = 5  # ref. [4]
+    else:               bw = 6  # ref. [4]
+    return bw
+
+def ssr_satid_offset(satsys):
+    ''' returns offset from RTCM SSR satellite ID to PRN,
+        BeiDou satellite ID starts from zero, same as RTKLIB
+    '''
+    return 1 if satsys == 'C' else 0
+
+def ssr_iode_bw(satsys):
+    ''' returns bit width of RTCM SSR IODE, and that of IOD CRC for BeiDou '''
+    if   satsys == 'E': bw = (10,  0)  # IODnav, DF459
+    elif satsys == 'C': bw = (10, 24)  # toe modulo and IOD CRC, same as RTKLIB
+    else:               bw = ( 8,  0)  # IODE, DF071
+    return bw
+
+def ssr_encode_head(satsys, mtype, epoch, ui, iod, nsat, mmi=0):
+    ''' returns RTCM SSR header in bitstring
+        epoch: GNSS epoch time in second, ui: update interval index,
+        iod: IOD SSR, nsat: number of satellites
+    '''
+    bw_epoch = 20 if satsys != 'R' else 17
+    bw_nsat  =  6 if satsys != 'J' else  4
+    payload = bitstring.BitStream()
+    payload.append(bitstring.pack('u12', SSR_MSGNUM[mtype][satsys]))
+    payload.append(bitstring.pack(f'u{bw_epoch}, u4, u1',
+        epoch, ui, mmi))  # epoch time, update interval, multiple message ind.
+    if mtype == 'SSR orbit':
+        payload.append(bitstring.pack('u1', 0))  # sat ref datum: ITRF
+    payload.append(bitstring.pack(f'u4, u16, u4, u{bw_nsat}',
+        iod, 0, 0, nsat))  # IOD SSR, provider ID, solution ID, num of sats
+    return payload
+
+def ssr_encode_orbit(satsys, epoch, ui, iod, orbit):
+    ''' returns RTCM SSR orbit correction message in bitstring
+        orbit: list of (prn, iode, radial[m], along[m], cross[m])
+        velocity terms are not available in the source, and are set to zero
+    '''
+    bw_satid = ssr_satid_bw(satsys)
+    bw_iode, bw_iodcrc = ssr_iode_bw(satsys)
+    payload = ssr_encode_head(satsys, 'SSR orbit', epoch, ui, iod, len(orbit))
+    for prn, iode, radial, along, cross in orbit:
+        satid = prn - ssr_satid_offset(satsys)
+        payload.append(bitstring.pack(f'u{bw_satid}, u{bw_iode}', satid, iode))
+        if bw_iodcrc:
+            payload.append(bitstring.pack(f'u{bw_iodcrc}', 0))  # not available
+        payload.append(bitstring.pack('i22, i20, i20, i21, i19, i19',
+            round(radial/1e-4), round(along/4e-4), round(cross/4e-4), 0, 0, 0))
+    return payload
+
+def ssr_encode_clock(satsys, epoch, ui, iod, clock):
+    ''' returns RTCM SSR clock correction message in bitstring
+        clock: list of (prn, c0[m])
+    '''
+    bw_satid = ssr_satid_bw(satsys)
+    payload = ssr_encode_head(satsys, 'SSR clock', epoch, ui, iod, len(clock))
+    for prn, c0 in clock:
+        satid = prn - ssr_satid_offset(satsys)
+        payload.append(bitstring.pack(f'u{bw_satid}, i22, i21, i27',
+            satid, round(c0/1e-4), 0, 0))
+    return payload
+
+def ssr_encode_code_bias(satsys, epoch, ui, iod, cbias):
+    ''' returns RTCM SSR code bias message in bitstring
+        cbias: list of (prn, [(signal and tracking mode ID, code bias[m]), ...])
+    '''
+    bw_satid = ssr_satid_bw(satsys)
+    payload = ssr_encode_head(satsys, 'SSR code bias', epoch, ui, iod, len(cbias))
+    for prn, cb in cbias:
+        satid = prn - ssr_satid_offset(satsys)
+        payload.append(bitstring.pack(f'u{bw_satid}, u5', satid, len(cb)))
+        for stmi, bias in cb:
+            payload.append(bitstring.pack('u5, i14', stmi, round(bias/1e-2)))
+    return payload
+
+def ui2index(interval):
+    ''' returns index of CSSR update interval not exceeding interval in second '''
+    ui = 0
+    for i, val in enumerate(CSSR_UI):
+        if val <= interval:
+            ui = i
+    return ui
+
+def stmi2signame(satsys, stmi):
+    ''' convert satellite system and RTCM SSR signal and tracking mode
+        identifier (DF380) to signal name '''
+    for signame, val in SSR_SIGNAL.get(satsys, {}).items():
+        if val == stmi:
+            return signame
+    return f'stmi={stmi}'
+
 def ura2dist(ura):
     ''' converts user range accuracy (URA) code to accuracy in distance [mm] '''
     dist = 0.0
@@ -185,9 +323,30 @@ class Ssr:
     stat_bsig  = 0      # stat: bit number of signals
     stat_both  = 0      # stat: bit number of other information
     stat_bnull = 0      # stat: bit number of null
+    vi         = 0      # validity interval of the last HAS correction in second
+    orbit      = {}     # last orbit correction, {sat: (iode, radial, along, cross)} in meter
+    clock      = {}     # last clock correction, {sat: c0} in meter
+    orbit_rate = {}     # last RTCM SSR orbit rate, {sat: (epoch, radial, along, cross)} in meter per second
+    clock_rate = {}     # last RTCM SSR clock rate, {sat: (epoch, c1, c2)} in meter per second (squared)
+    cbias      = {}     # last code  bias, {(sat, signal): code bias} in meter
+    stec_poly  = {}     # last STEC polynomial, {(cnid, sat): (c00, c01, c10, c11, c02, c20)} in TECU and degree
+    stec_res   = {}     # last STEC residual, {(cnid, sat): [residual or None of each grid]} in TECU
+    trop_poly  = {}     # last ST12 troposphere polynomial, {cnid: (t00, t01, t10, t11)} in meter and degree
+    trop_res   = {}     # last ST12 troposphere residual plus offset, {cnid: [residual or None of each grid]} in meter
+    trop_grid  = {}     # last ST9 vertical delay, {cnid: [(hydrostatic, wet) or None of each grid]} in meter
+    cnid       = 0      # compact network ID of the last ST8, ST9, or ST12 message
+    cmavail    = {}     # cell mask availability for CSSR encoding, {satsys: bool}
+    cellcount  = None   # number of signals of each satellite for CSSR skip
+    skipsize   = {}     # bit size of CSSR subtype body fixed by the mask, {subtype: size}
+    delta      = None   # tolerance of change-only output, or None for full output
+    keyframe   = 10     # full output at every keyframe-th mask in change-only output
+    nmask      = 0      # number of masks decoded
+    full       = True   # output all corrections regardless of change
+    published  = None   # last shown correction, {(subtype, sat[, signal]): values}
 
     def __init__(self, trace):
-        self.trace = trace
+        self.trace     = trace
+        self.published = {}  # per instance, since changed() updates it in place
 
     def ssr_decode_head(self, payload, satsys, mtype):
         ''' stores ssr_epoch, ssr_interval, ssr_mmi, ssr_iod, ssr_nsat'''
@@ -205,17 +364,21 @@ class Ssr:
         bw = 6 if satsys != 'J' else 4
         self.ssr_nsat      = payload.read(bw).u
 
+    @libperf.timed('decode', 'SSR orbit')
     def ssr_decode_orbit(self, payload, satsys):
         ''' decodes SSR orbit correction and returns string '''
         # bit format of satid changes according to satellite system
         if   satsys == 'J': bw = 4  # ref. [2]
         elif satsys == 'R': bw = 5  # ref. [1]
         else:               bw = 6  # ref. [1]
+        bw_iode, bw_iodcrc = ssr_iode_bw(satsys)
         msg1 = self.trace.msg(1, '\nSAT radial[m] along[m] cross[m] d_radial[m/s] d_along[m/s] d_cross[m/s]')
         strsat = ''
+        orbit, rate = {}, {}
         for _ in range(self.ssr_nsat):
-            satid   = payload.read(bw).u  # satellite ID, DF068
-            iode    = payload.read( 8).u  # IODE, DF071
+            satid   = payload.read(bw).u + ssr_satid_offset(satsys)  # satellite ID, DF068
+            iode    = payload.read(bw_iode).u  # IODE, DF071
+            payload.pos += bw_iodcrc      # IOD CRC for BeiDou
             radial  = payload.read(22).i  # radial, DF365
             along   = payload.read(20).i  # along track, DF366
             cross   = payload.read(20).i  # cross track, DF367
@@ -223,10 +386,15 @@ class Ssr:
             dalong  = payload.read(19).i  # dot_along track, DF369
             dcross  = payload.read(19).i  # dot_cross track, DF370
             strsat += f"{satsys}{satid:02} "
+            orbit[f'{satsys}{satid:02d}'] = (iode, radial*1e-4, along*4e-4, cross*4e-4)
+            rate [f'{satsys}{satid:02d}'] = (self.ssr_epoch, dradial*1e-6, dalong*4e-6, dcross*4e-6)
             msg1 += self.trace.msg(1, f'\n{satsys}{satid:02d}   {radial*1e-4:{FMT_ORB}}  {along*4e-4:{FMT_ORB}}  {cross*4e-5:{FMT_ORB}}       {dradial*1e-6:{FMT_ORB}}      {dalong*4e-6:{FMT_ORB}}      {dcross*4e-6:{FMT_ORB}}')
+        self.orbit      = {**self.orbit     , **orbit}
+        self.orbit_rate = {**self.orbit_rate, **rate }
         msg = self.trace.msg(0, f"{strsat}(IOD={self.ssr_iod} IODE={iode} nsat={self.ssr_nsat}{' cont.' if self.ssr_mmi else ''})") + msg1
         return msg
 
+    @libperf.timed('decode', 'SSR clock')
     def ssr_decode_clock(self, payload, satsys):
         ''' decodes SSR clock correction and returns string '''
         # bit format of satid changes according to satellite system
@@ -235,16 +403,22 @@ class Ssr:
         else              : bw = 6  # ref. [1]
         msg1 = self.trace.msg(1, '\nSAT   c0[m] c1[m/s] c2[m/s^2]')
         strsat = ''
+        clock, rate = {}, {}
         for _ in range(self.ssr_nsat):
-            satid = payload.read(bw).u  # satellite ID
+            satid = payload.read(bw).u + ssr_satid_offset(satsys)  # satellite ID
             c0    = payload.read(22).i  # delta clock c0, DF376
             c1    = payload.read(21).i  # delta clock c1, DF377
             c2    = payload.read(27).i  # delta clock c2, DF378
             strsat += f"{satsys}{satid:02d} "
+            clock[f'{satsys}{satid:02d}'] = c0*1e-4
+            rate [f'{satsys}{satid:02d}'] = (self.ssr_epoch, c1*1e-6, c2*2e-8)
             msg1 += self.trace.msg(1, f'\n{satsys}{satid:02d} {c0*1e-4:{FMT_CLK}} {c1*1e-6:{FMT_CLK}}   {c2*2e-8:{FMT_CLK}}')
+        self.clock      = {**self.clock     , **clock}
+        self.clock_rate = {**self.clock_rate, **rate }
         msg = self.trace.msg(0, f"{strsat}(nsat={self.ssr_nsat} iod={self.ssr_iod}{' cont.' if self.ssr_mmi else ''})") + msg1
         return msg
 
+    @libperf.timed('decode', 'SSR code_bias')
     def ssr_decode_code_bias(self, payload, satsys):
         ''' decodes SSR code bias and returns string '''
         # bit format of satid changes according to satellite system
@@ -254,17 +428,18 @@ class Ssr:
         msg1 = self.trace.msg(1, '\nSAT signal_name code_bias[m]')
         strsat = ''
         for _ in range(self.ssr_nsat):
-            satid = payload.read(bw).u  # satellite ID, DF068, ...
+            satid = payload.read(bw).u + ssr_satid_offset(satsys)  # satellite ID, DF068, ...
             ncb   = payload.read( 5).u  # code bias number, DF383
             strsat += f"{satsys}{satid:02d} "
             for j in range(ncb):
                 stmi  = payload.read( 5).u  # sig&trk mode ind, DF380
                 cb    = payload.read(14).i  # code bias, DF383
-                sstmi = sigmask2signame(satsys, stmi)
+                sstmi = stmi2signame(satsys, stmi)
                 msg1 += self.trace.msg(1, f'\n{satsys}{satid:02d} {sstmi:{FMT_GSIG}}    {cb*1e-2:{FMT_CB}}')
         msg = self.trace.msg(0, f"{strsat}(IOD={self.ssr_iod} nsat={self.ssr_nsat}{' cont.' if self.ssr_mmi else ''})") + msg1
         return msg
 
+    @libperf.timed('decode', 'SSR ura')
     def ssr_decode_ura(self, payload, satsys):
         ''' decodes SSR user range accuracy and returns string '''
         # bit format of satid changes according to satellite system
@@ -274,7 +449,7 @@ class Ssr:
         msg1 = self.trace.msg(1, '\nSAT URA[mm]')
         strsat = ''
         for i in range(self.ssr_nsat):
-            satid = payload.read(bw).u  # satellite ID, DF068
+            satid = payload.read(bw).u + ssr_satid_offset(satsys)  # satellite ID, DF068
             ura   = payload.read( 6)  # user range accuracy, DF389
             accuracy = ura2dist(ura)
             if accuracy != URA_INVALID:
@@ -283,6 +458,7 @@ class Ssr:
         msg = self.trace.msg(0, f"{strsat}(IOD={self.ssr_iod} nsat={self.ssr_nsat}{' cont.' if self.ssr_mmi else ''})") + msg1
         return msg
 
+    @libperf.timed('decode', 'SSR hr_clock')
     def ssr_decode_hr_clock(self, payload, satsys):
         '''decodes SSR high rate clock and returns string'''
         # bit format of satid changes according to satellite system
@@ -292,7 +468,7 @@ class Ssr:
         msg1 = self.trace.msg(1, '\nSAT high_rate_clock[m]')
         strsat = ''
         for _ in range(self.ssr_nsat):
-            satid = payload.read(bw).u  # satellite ID
+            satid = payload.read(bw).u + ssr_satid_offset(satsys)  # satellite ID
             hrc   = payload.read(22).i  # high rate clock, DF390
             strsat += f"{satsys}{satid:02} "
             msg1 += self.trace.msg(1, f'\n{satsys}{satid:02}            {hrc*1e-4:{FMT_CLK}}')
@@ -317,6 +493,7 @@ class Ssr:
         elif self.subtype == 12: self.decode_cssr_st12(payload)
         else:
             raise Exception(f"unknown CSSR subtype: {self.subtype}")
+        libmetrics.cssr_decoded.inc(str(self.subtype))
         msg = f'ST{self.subtype:<2d}'
         if self.subtype == 1:
             msg += f' Epoch={epoch2timedate(self.epoch)} ({self.epoch}) UI={CSSR_UI[self.ui]:2d}s ({self.ui}) IODSSR={self.iodssr} {"cont." if self.mmi else ""}'
@@ -334,6 +511,14 @@ class Ssr:
               f'bit_total {bit_total}'
         self.trace.show(0, msg)
 
+    def export_cssr_stat(self):
+        libmetrics.cssr_nsat.set(self.stat_nsat)
+        libmetrics.cssr_nsig.set(self.stat_nsig)
+        libmetrics.cssr_bits.inc('sat'  , n=self.stat_bsat )
+        libmetrics.cssr_bits.inc('sig'  , n=self.stat_bsig )
+        libmetrics.cssr_bits.inc('other', n=self.stat_both )
+        libmetrics.cssr_bits.inc('null' , n=self.stat_bnull)
+
     def decode_cssr_head(self, payload):
         ''' decode CSSR header and returns True if success '''
         self.msgnum  = 0
@@ -428,6 +613,12 @@ class Ssr:
         self.cellmask  = cellmask  # cell mask
         self.gsys      = gsys      # dict of sat    name from system name
         self.gsig      = gsig      # dict of signal name from system name
+        if self.delta is not None:  # change-only output
+            self.full   = self.keyframe > 0 and self.nmask % self.keyframe == 0
+            self.nmask += 1
+        if ssr_type == 'cssr':
+            self._set_cellcount([[cellmask[i][j*nsigmask[i]:(j+1)*nsigmask[i]].count(1)
+                for j in range(nsatmask[i])] for i in range(ngnss)])
         self.stat_nsat = 0
         self.stat_nsig = 0
         msg1 = ''
@@ -451,25 +642,30 @@ class Ssr:
         self.trace.show(1, msg1, end='')
         if self.stat:
             self.show_cssr_stat()
+        self.export_cssr_stat()
         self.stat_bsat  = 0
         self.stat_bsig  = 0
         self.stat_both  = payload.pos
         self.stat_bnull = 0
         return True
 
+    @libperf.timed('decode', 'CSSR ST1')
     def decode_cssr_st1(self, payload):
         ''' decode CSSR ST1 mask message and returns True if success '''
         return self._decode_mask(payload, 'cssr')
 
+    @libperf.timed('decode', 'HAS mask')
     def decode_has_mask(self, has_msg):
         ''' decode HAS mask message and returns True if success '''
         return self._decode_mask(has_msg, 'has')
 
+    @libperf.timed('decode', 'CSSR ST2')
     def decode_cssr_st2(self, payload):
         ''' decode CSSR ST2 orbit message and returns True if success '''
         len_payload = len(payload)
         stat_pos    = payload.pos
         msg1  = 'ST2 SAT IODE radial[m] along[m] cross[m]'
+        orbit = {}
         for satsys in self.satsys:
             bw = 10 if satsys == 'E' else 8  # IODE bit width
             for gsys in self.gsys[satsys]:
@@ -480,12 +676,16 @@ class Ssr:
                 along  = payload.read(13).i
                 cross  = payload.read(13).i
                 if radial != -16384 and along != -4096 and cross != -4096:
-                    msg1 += f'\nST2 {gsys} {iode:{FMT_IODE}}   {radial*0.0016:{FMT_ORB}}  {along*0.0064:{FMT_ORB}}  {cross*0.0064:{FMT_ORB}}'
+                    orbit[gsys] = (iode, radial*0.0016, along*0.0064, cross*0.0064)
+                    if self.changed(('ST2', gsys), orbit[gsys]):
+                        msg1 += f'\nST2 {gsys} {iode:{FMT_IODE}}   {radial*0.0016:{FMT_ORB}}  {along*0.0064:{FMT_ORB}}  {cross*0.0064:{FMT_ORB}}'
         self.trace.show(1, msg1)
+        self.orbit = orbit
         self.stat_both += stat_pos
         self.stat_bsat += payload.pos - stat_pos
         return True
 
+    @libperf.timed('decode', 'HAS orbit')
     def decode_has_orbit(self, payload):
         ''' decode HAS orbit message and returns True if success '''
         len_payload = len(payload)
@@ -494,6 +694,7 @@ class Ssr:
             return False
         vi = payload.read('u4')
         msg1 = f'ORBIT SAT IODE radial[m] along[m] cross[m] validity_interval={HAS_VI[vi]}s ({vi})'
+        orbit = {}
         for satsys in self.satsys:
             bw = 10 if satsys == 'E' else 8
             for gsys in self.gsys[satsys]:
@@ -504,29 +705,39 @@ class Ssr:
                 along  = payload.read(12)
                 cross  = payload.read(12)
                 if radial.b != '1000000000000' and along.b != '100000000000' and cross.b != '100000000000':
-                    msg1 += f'\nORBIT {gsys} {iode:{FMT_IODE}}   {radial.i*0.0025:{FMT_ORB}}  {along.i*0.0080:{FMT_ORB}}  {cross.i*0.0080:{FMT_ORB}}'
+                    orbit[gsys] = (iode, radial.i*0.0025, along.i*0.0080, cross.i*0.0080)
+                    if self.changed(('ORBIT', gsys), orbit[gsys]):
+                        msg1 += f'\nORBIT {gsys} {iode:{FMT_IODE}}   {radial.i*0.0025:{FMT_ORB}}  {along.i*0.0080:{FMT_ORB}}  {cross.i*0.0080:{FMT_ORB}}'
         self.trace.show(1, msg1)
+        self.vi    = HAS_VI[vi]
+        self.orbit = orbit
         self.stat_both += stat_pos
         self.stat_bsat += payload.pos - stat_pos
         return True
 
+    @libperf.timed('decode', 'CSSR ST3')
     def decode_cssr_st3(self, payload):
         ''' decode CSSR ST3 clock message and returns True if success '''
         len_payload = len(payload)
         stat_pos    = payload.pos
         msg1 = 'ST3 SAT   c0[m]'
+        clock = {}
         for satsys in self.satsys:
             for gsys in self.gsys[satsys]:
                 if len_payload < payload.pos + 15:
                     return False
                 c0 = payload.read(15).i
                 if c0 != -16384:
-                    msg1 += f"\nST3 {gsys} {c0*1.6e-3:{FMT_CLK}}"
+                    clock[gsys] = c0*1.6e-3
+                    if self.changed(('ST3', gsys), (clock[gsys],)):
+                        msg1 += f"\nST3 {gsys} {c0*1.6e-3:{FMT_CLK}}"
         self.trace.show(1, msg1)
+        self.clock = clock
         self.stat_both += stat_pos
         self.stat_bsat += payload.pos - stat_pos
         return True
 
+    @libperf.timed('decode', 'HAS ckful')
     def decode_has_ckful(self, payload):
         ''' decode HAS clock full message and returns True if success '''
         len_payload = len(payload)
@@ -540,18 +751,24 @@ class Ssr:
         multiplier = [1 for i in range(len(self.satsys))]
         for i, satsys in enumerate(self.satsys):
             multiplier[i] = payload.read(2).u + 1
+        clock = {}
         for i, satsys in enumerate(self.satsys):
             for gsys in self.gsys[satsys]:
                 if len_payload < payload.pos + 13:
                     return False
                 c0 = payload.read(13)
                 if c0.b != '1000000000000' and c0.b != '0111111111111':
-                    msg1 += f"\nCKFUL {gsys} {c0.i*2.5e-3*multiplier[i]:{FMT_CLK}}"
+                    clock[gsys] = c0.i*2.5e-3*multiplier[i]
+                    if self.changed(('CLOCK', gsys), (clock[gsys],)):
+                        msg1 += f"\nCKFUL {gsys} {c0.i*2.5e-3*multiplier[i]:{FMT_CLK}}"
         self.trace.show(1, msg1)
+        self.vi    = HAS_VI[vi]
+        self.clock = clock
         self.stat_both += stat_pos
         self.stat_bsat += payload.pos - stat_pos
         return True
 
+    @libperf.timed('decode', 'HAS cksub')
     def decode_has_cksub(self, payload):
         ''' decode HAS clock subset message and returns True if success '''
         len_payload = len(payload)
@@ -561,20 +778,30 @@ class Ssr:
         vi = payload.read(4).u
         ns = payload.read(2).u  # GNSS subset number
         msg1 = f'CKSUB SAT   c0[m] validity_interval={HAS_VI[vi]}[s] ({vi}), gnss_subset_number={ns}'
-        multiplier = [1 for i in range(len(self.satsys))]
+        clock = {}
         for i in range(ns):
             if len_payload < payload.pos + 4 + 2:
                 return False
-            satsys     = payload.read(4).u
+            satsys     = gnssid2satsys(payload.read(4).u)
             multiplier = payload.read(2).u + 1
-            for gsys in self.gsys[satsys]:
-                for gsig in self.gsig[satsys]:
-                    if len_payload < payload.pos + 13:
-                        return False
-                    c0 = payload.read(13)
-                    if c0.b != '1000000000000' and c0.b == '0111111111111':
+            if satsys not in self.gsys:
+                return False
+            if len_payload < payload.pos + len(self.gsys[satsys]):
+                return False
+            submask = payload.read(len(self.gsys[satsys]))  # satellite submask
+            for j, gsys in enumerate(self.gsys[satsys]):
+                if not submask[j]:
+                    continue
+                if len_payload < payload.pos + 13:
+                    return False
+                c0 = payload.read(13)
+                if c0.b != '1000000000000' and c0.b != '0111111111111':
+                    clock[gsys] = c0.i*2.5e-3*multiplier
+                    if self.changed(('CLOCK', gsys), (clock[gsys],)):
                         msg1 += f"\nCKSUB {gsys} {c0.i*2.5e-3*multiplier:{FMT_CLK}}"
         self.trace.show(1, msg1)
+        self.vi    = HAS_VI[vi]
+        self.clock = clock
         self.stat_both += stat_pos
         self.stat_bsat += payload.pos - stat_pos
         return True
@@ -593,6 +820,7 @@ class Ssr:
                 return False
             vi = payload.read(4).u
             msg1 = f'CBIAS SAT signal_name     code_bias[m] validity_interval={HAS_VI[vi]}s ({vi})'
+        cbias = {}
         for i, satsys in enumerate(self.satsys):
             pos_mask = 0  # mask position
             for gsys in self.gsys[satsys]:
@@ -604,22 +832,31 @@ class Ssr:
                         return False
                     cb = payload.read(11).i
                     if cb != -1024:
+                        cbias[(gsys, gsig)] = cb*0.02
+                        if not self.changed((ssr_type, gsys, gsig), (cb*0.02,)):
+                            continue
                         if ssr_type == "cssr": msg1 += "\nST4"
                         else                 : msg1 += "\nCBIAS"
                         msg1 += f" {gsys} {gsig:{FMT_GSIG}}        {cb*0.02:{FMT_CB}}"
         self.trace.show(1, msg1)
+        if ssr_type == 'has':
+            self.vi = HAS_VI[vi]
+        self.cbias = cbias
         self.stat_both += stat_pos
         self.stat_bsig += payload.pos - stat_pos
         return True
 
+    @libperf.timed('decode', 'CSSR ST4')
     def decode_cssr_st4(self, payload):
         ''' decode CSSR ST4 code bias message and returns True if success '''
         return self._decode_code_bias(payload, 'cssr')
 
+    @libperf.timed('decode', 'HAS cbias')
     def decode_has_cbias(self, payload):
         ''' decode HAS code bias message and returns True if success '''
         return self._decode_code_bias(payload, 'has')
 
+    @libperf.timed('decode', 'CSSR ST5')
     def decode_cssr_st5(self, payload):
         ''' decode CSSR ST5 phase bias message and returns True if success '''
         len_payload = len(payload)
@@ -636,13 +873,14 @@ class Ssr:
                         return False
                     pb  = payload.read(15).i
                     di  = payload.read( 2).u
-                    if pb != -16384:
+                    if pb != -16384 and self.changed(('ST5', gsys, gsig), (pb*0.001, di)):
                         msg1 += f'\nST5 {gsys} {gsig:{FMT_GSIG}}     {pb*0.001:{FMT_PB}}       {di}'
         self.trace.show(1, msg1)
         self.stat_both += stat_pos
         self.stat_bsig += payload.pos - stat_pos
         return True
 
+    @libperf.timed('decode', 'HAS pbias')
     def decode_has_pbias(self, payload):
         ''' decode HAS phase bias message and returns True if success '''
         len_payload = len(payload)
@@ -662,13 +900,14 @@ class Ssr:
                         return False
                     pb  = payload.read(11).i
                     di  = payload.read( 2).u
-                    if pb != -1024:
+                    if pb != -1024 and self.changed(('PBIAS', gsys, gsig), (pb*0.01, di)):
                         msg1 += f'\nPBIAS {gsys} {gsig:{FMT_GSIG}}     {pb*0.01:{FMT_PB}}       {di}'
         self.trace.show(1, msg1)
         self.stat_both += stat_pos
         self.stat_bsig += payload.pos - stat_pos
         return True
 
+    @libperf.timed('decode', 'CSSR ST6')
     def decode_cssr_st6(self, payload):
         ''' decode CSSR ST6 network bias message and returns True if success '''
         len_payload = len(payload)
@@ -678,6 +917,7 @@ class Ssr:
         f_cb = payload.read(1).u  # code    bias existing flag
         f_pb = payload.read(1).u  # phase   bias existing flag
         f_nb = payload.read(1).u  # network bias existing flag
+        cnid = 0  # compact network ID
         svmask = {}
         for satsys in self.satsys:
             ngsys = len(self.gsys[satsys])
@@ -707,25 +947,31 @@ class Ssr:
                     mask = self.cellmask[i][pos_mask]; pos_mask += 1
                     if not mask or not svmask[satsys][j]:
                         continue
-                    msg1 += f"\nST6 {gsys} {gsig:{FMT_GSIG}}"
+                    line = f"\nST6 {gsys} {gsig:{FMT_GSIG}}"
+                    values = []
                     if f_cb:
                         if len_payload < payload.pos + 11:
                             return False
                         cb  = payload.read(11).i  # code bias
                         if cb != -1024:
-                            msg1 += f" {cb*0.02:{FMT_CB}}"
+                            line += f" {cb*0.02:{FMT_CB}}"
+                            values += [cb*0.02]
                     if f_pb:
                         if len_payload < payload.pos + 15 + 2:
                             return False
                         pb = payload.read(15).i  # phase bias
                         di = payload.read( 2).u  # disc ind
                         if pb != -16384:
-                            msg1 += f"         {pb*0.001:{FMT_PB}}     {di}"
+                            line += f"         {pb*0.001:{FMT_PB}}     {di}"
+                            values += [pb*0.001, di]
+                    if self.changed(('ST6', cnid, gsys, gsig), tuple(values)):
+                        msg1 += line
         self.trace.show(1, msg1)
         self.stat_both += stat_pos + 3
         self.stat_bsig += payload.pos - stat_pos - 3
         return True
 
+    @libperf.timed('decode', 'CSSR ST7')
     def decode_cssr_st7(self, payload):
         ''' decode CSSR ST7 user range accuracy message and returns True if success '''
         len_payload = len(payload)
@@ -737,13 +983,14 @@ class Ssr:
                     return False
                 ura = payload.read(6)  # [3], Sect.4.2.2.7
                 accuracy = ura2dist(ura)
-                if accuracy != URA_INVALID:
+                if accuracy != URA_INVALID and self.changed(('ST7', gsys), (accuracy,)):
                     msg1 += f"\nST7 {gsys} {accuracy:{FMT_URA}}"
         self.trace.show(1, msg1)
         self.stat_both += stat_pos
         self.stat_bsat += payload.pos - stat_pos
         return True
 
+    @libperf.timed('decode', 'CSSR ST8')
     def decode_cssr_st8(self, payload):
         ''' decode CSSR ST8 STEC message and returns True if success '''
         len_payload = len(payload)
@@ -768,6 +1015,7 @@ class Ssr:
         if 3 <= stec_type:
             msg1 += " c02[TECU/deg^2] c20[TECU/deg^2]"
         msg1 += f" NID={cnid} ({CLASGRID[cnid-1][0]})"
+        stec_poly = {}
         for satsys in self.satsys:
             for maskpos, gsys in enumerate(self.gsys[satsys]):
                 if not svmask[satsys][maskpos]:
@@ -776,33 +1024,49 @@ class Ssr:
                     return False
                 qi  = payload.read( 6)  # quality indicator
                 c00 = payload.read(14).i
+                line, values = '', [ura2dist(qi)]
+                poly = [c00*0.05, 0., 0., 0., 0., 0.]
                 if c00 != -8192:
-                    msg1 += f"\nST8 {gsys}     {ura2dist(qi):{FMT_TECU}}    {c00*0.05:{FMT_TECU}}"
+                    line += f"\nST8 {gsys}     {ura2dist(qi):{FMT_TECU}}    {c00*0.05:{FMT_TECU}}"
+                    values += [c00*0.05]
                 if 1 <= stec_type:
                     if len_payload < payload.pos + 12 + 12:
                         return False
                     c01 = payload.read(12).i
                     c10 = payload.read(12).i
                     if c01 != -2048 and c10 != -2048:
-                        msg1 += f"        {c01*0.02:{FMT_TECU}}        {c10*0.02:{FMT_TECU}}"
+                        line += f"        {c01*0.02:{FMT_TECU}}        {c10*0.02:{FMT_TECU}}"
+                        values += [c01*0.02, c10*0.02]
+                        poly[1:3] = c01*0.02, c10*0.02
                 if 2 <= stec_type:
                     if len_payload < payload.pos + 10:
                         return False
                     c11  = payload.read(10).i
                     if c11 != -512:
-                        msg1 += f"          {c11*0.02:{FMT_TECU}}"
+                        line += f"          {c11*0.02:{FMT_TECU}}"
+                        values += [c11*0.02]
+                        poly[3] = c11*0.02
                 if 3 <= stec_type:
                     if len_payload < payload.pos + 8 + 8:
                         return False
                     c02  = payload.read(8).i
                     c20  = payload.read(8).i
                     if c02 != -128 and c20 != -128:
-                        msg1 += f"          {c02*0.005:{FMT_TECU}}          {c20*0.005:{FMT_TECU}}"
+                        line += f"          {c02*0.005:{FMT_TECU}}          {c20*0.005:{FMT_TECU}}"
+                        values += [c02*0.005, c20*0.005]
+                        poly[4:6] = c02*0.005, c20*0.005
+                if c00 != -8192:
+                    stec_poly[(cnid, gsys)] = tuple(poly)
+                if self.changed(('ST8', cnid, gsys), tuple(values)):
+                    msg1 += line
+        self.stec_poly = {**self.stec_poly, **stec_poly}
+        self.cnid = cnid
         self.trace.show(1, msg1)
         self.stat_both += stat_pos + 7
         self.stat_bsat += payload.pos - stat_pos - 7
         return True
 
+    @libperf.timed('decode', 'CSSR ST9')
     def decode_cssr_st9(self, payload):
         ''' decode CSSR ST9 trop correction message and returns True if success '''
         len_payload = len(payload)
@@ -831,14 +1095,20 @@ class Ssr:
         if tctype != 1:
             self.trace.show(1, msg1)
             raise Exception(f"tctype={tctype}: we implicitly assume the tropospheric correction type (tctype) is 1. if tctype=0 (no topospheric correction), we don't know whether we read the following tropospheric correction data or not. Others are reserved.")
+        trop_grid, stec_res = [None] * ngrid, {}
         for grid in range(ngrid):
             if len_payload < payload.pos + 9 + 8:
                 return False
-            msg1 += '\nST9 SAT  Lat.   Lon. residual[TECU]'
+            head = '\nST9 SAT  Lat.   Lon. residual[TECU]'
+            show = self.delta is None  # grid shown in full output, or when changed
             vd_h = payload.read(9).i  # hydrostatic vertical delay
             vd_w = payload.read(8).i  # wet         vertical delay
             if vd_h != -256 and vd_w != -128:
-                msg1 += f' hydro_delay={2.3+vd_h*0.004:6.3f}[m] wet_delay={0.252+vd_w*0.004:6.3f}[m]'
+                trop_grid[grid] = (2.3+vd_h*0.004, 0.252+vd_w*0.004)
+                if self.changed(('ST9', cnid, grid), trop_grid[grid]):
+                    show  = True
+                    head += f' hydro_delay={2.3+vd_h*0.004:6.3f}[m] wet_delay={0.252+vd_w*0.004:6.3f}[m]'
+            lines = ''
             for satsys in self.satsys:
                 for maskpos, gsys in enumerate(self.gsys[satsys]):
                     if not svmask[satsys][maskpos]:
@@ -846,14 +1116,23 @@ class Ssr:
                     if len_payload < payload.pos + bw:
                         return False
                     res  = payload.read(f'i{bw}')  # residual
+                    stec_res.setdefault((cnid, gsys), [None] * ngrid)
                     if (srange == 1 and res != -32768) or \
                        (srange == 0 and res != -64):
-                        lat, lon = CLASGRID[cnid-1][2][grid]
-                        msg1 += f'\nST9 {gsys} {lat:5.2f} {lon:6.2f}         {res*0.04:{FMT_TECU}}'
+                        stec_res[(cnid, gsys)][grid] = res*0.04
+                        if self.changed(('ST9', cnid, grid, gsys), (res*0.04,)):
+                            lat, lon = CLASGRID[cnid-1][2][grid]
+                            lines += f'\nST9 {gsys} {lat:5.2f} {lon:6.2f}         {res*0.04:{FMT_TECU}}'
+            if show or lines:
+                msg1 += head + lines
+        self.trop_grid = {**self.trop_grid, cnid: trop_grid}
+        self.stec_res  = {**self.stec_res , **stec_res}
+        self.cnid = cnid
         self.trace.show(1, msg1)
         self.stat_both += payload.pos
         return True
 
+    @libperf.timed('decode', 'CSSR ST10')
     def decode_cssr_st10(self, payload):
         ''' decode CSSR ST10 auxiliary message and returns True if success '''
         len_payload = len(payload)
@@ -869,6 +1148,7 @@ class Ssr:
         self.stat_both += payload.pos
         return True
 
+    @libperf.timed('decode', 'CSSR ST11')
     def decode_cssr_st11(self, payload):
         ''' decode CSSR ST11 network correction message and returns True if success '''
         len_payload = len(payload)
@@ -878,6 +1158,7 @@ class Ssr:
         f_o = payload.read(1).u  # orbit existing flag
         f_c = payload.read(1).u  # clock existing flag
         f_n = payload.read(1).u  # network correction
+        cnid = 0  # compact network ID
         msg1 = f"ST11 orbit_correction={'on' if f_o else 'off'} clock_correction={'on' if f_c else 'off'} network_correction={'on' if f_n else 'off'}"
         svmask = {}
         for satsys in self.satsys:
@@ -918,8 +1199,14 @@ class Ssr:
                     c0  = payload.read(15).i
                 f_o_ok = f_o and (radial != -16384 and along != -4096 and cross != -4096)
                 f_c_ok = f_c and c0 != -16384
-                if f_o_ok or f_c_ok:
-                    msg1 += f"\nST11 {gsys}"
+                values = ()
+                if f_o_ok:
+                    values += (iode, radial*0.0016, along*0.0064, cross*0.0064)
+                if f_c_ok:
+                    values += (c0*1.6e-3,)
+                if not values or not self.changed(('ST11', cnid, gsys), values):
+                    continue
+                msg1 += f"\nST11 {gsys}"
                 if f_o_ok:
                     msg1 += f' {iode:{FMT_IODE}}   {radial*0.0016:{FMT_ORB}}  {along*0.0064:{FMT_ORB}}  {cross*0.0064:{FMT_ORB}}'
                 if f_c_ok:
@@ -932,6 +1219,7 @@ class Ssr:
             self.stat_bsat -= 5
         return True
 
+    @libperf.timed('decode', 'CSSR ST12')
     def decode_cssr_st12(self, payload):
         ''' decode CSSR ST12 network and troposphere corrections message and returns True if success '''
         len_payload = len(payload)
@@ -946,6 +1234,8 @@ class Ssr:
         if CLASGRID[cnid-1][1] != ngrid:
             raise Exception(f"cnid={cnid}, ngrid={ngrid} != {CLASGRID[cnid-1][1]}")
         msg1 = f"ST12 Trop NID={cnid} ({CLASGRID[cnid-1][0]})"
+        trop_poly, trop_res, stec_poly, stec_res = {}, {}, {}, {}
+        line, values = '', []  # troposphere polynomial and offset
         if tavail[0]:  # bool object
             # 0 <= ttype (forward reference)
             if len_payload < payload.pos + 6 + 2 + 9:
@@ -953,37 +1243,55 @@ class Ssr:
             tqi   = payload.read(6)    # tropo quality indication
             ttype = payload.read(2).u  # tropo correction type
             t00   = payload.read(9).i  # tropo poly coeff
-            msg1 += f" qual={ura2dist(tqi)}[mm]"
+            line += f" qual={ura2dist(tqi)}[mm]"
+            values += [ura2dist(tqi)]
             if t00 != -256:
-                msg1 += f" t00={t00*0.004:.3f}[m]"
+                line += f" t00={t00*0.004:.3f}[m]"
+                values += [t00*0.004]
+            poly = [t00*0.004, 0., 0., 0.]
             if 1 <= ttype:
                 if len_payload < payload.pos + 7 + 7:
                     return False
                 t01  = payload.read(7).i
                 t10  = payload.read(7).i
                 if t01 != -64 and t10 != -64:
-                    msg1 += f" t01={t01*0.002:.3f}[m/deg] t10={t10*0.002:.3f}[m/deg]"
+                    line += f" t01={t01*0.002:.3f}[m/deg] t10={t10*0.002:.3f}[m/deg]"
+                    values += [t01*0.002, t10*0.002]
+                    poly[1:3] = t01*0.002, t10*0.002
             if 2 <= ttype:
                 if len_payload < payload.pos + 7:
                     return False
                 t11  = payload.read(7).i
                 if t11 != -64:
-                    msg1 += f" t11={t11*0.001:.3f}[m/deg^2]"
+                    line += f" t11={t11*0.001:.3f}[m/deg^2]"
+                    values += [t11*0.001]
+                    poly[3] = t11*0.001
+            if t00 != -256:
+                trop_poly[cnid] = tuple(poly)
         if tavail[1]:  # bool object
             if len_payload < payload.pos + 1 + 4:
                 return False
             trs  = payload.read(1).u  # tropo residual size
             tro  = payload.read(4).u  # tropo residual offset
             bw   = 8 if trs else 6
-            msg1 += f" offset={tro*0.02:.3f}[m]"
+            line += f" offset={tro*0.02:.3f}[m]"
+            values += [tro*0.02]
             if len_payload < payload.pos + bw * ngrid:
                 return False
-            msg1 += "\nST12 Trop  Lat.   Lon. residual[m]"
+        if values and self.changed(('ST12', cnid), tuple(values)):
+            msg1 += line
+        if tavail[1]:  # bool object
+            lines = ''
+            trop_res[cnid] = [None] * ngrid
             for grid in range(ngrid):
                 tr = payload.read(bw).i  # tropo residual
                 if (bw == 6 and tr != -32) or (bw == 8 and tr != -128):
-                    lat, lon = CLASGRID[cnid-1][2][grid]
-                    msg1 += f"\nST12 Trop {lat:5.2f} {lon:6.2f}     {tr*0.004:{FMT_TROP}}"
+                    trop_res[cnid][grid] = tr*0.004 + tro*0.02
+                    if self.changed(('ST12', cnid, grid), (tr*0.004,)):
+                        lat, lon = CLASGRID[cnid-1][2][grid]
+                        lines += f"\nST12 Trop {lat:5.2f} {lon:6.2f}     {tr*0.004:{FMT_TROP}}"
+            if self.delta is None or lines:
+                msg1 += "\nST12 Trop  Lat.   Lon. residual[m]" + lines
         stat_pos = payload.pos
         if savail[0]:  # bool object
             svmask = {}
@@ -1001,29 +1309,40 @@ class Ssr:
                     sqi = payload.read( 6)    # STEC quality indication
                     sct = payload.read( 2).u  # STEC correct type
                     c00 = payload.read(14).i
-                    msg1 += f"\nST12 STEC {gsys}  Lat.   Lon. residual[TECU] qual={ura2dist(sqi):.3f}[TECU]"
+                    head = f"\nST12 STEC {gsys}  Lat.   Lon. residual[TECU]"
+                    line, values = f" qual={ura2dist(sqi):.3f}[TECU]", [ura2dist(sqi)]
                     if c00 != -8192:
-                        msg1 += f" c00={c00*0.05:.3f}[TECU]"
+                        line += f" c00={c00*0.05:.3f}[TECU]"
+                        values += [c00*0.05]
+                    poly = [c00*0.05, 0., 0., 0., 0., 0.]
                     if 1 <= sct:
                         if len_payload < payload.pos + 12 + 12:
                             return False
                         c01 = payload.read(12).i
                         c10 = payload.read(12).i
                         if c01 != -2048 and c10 != -2048:
-                            msg1 += f" c01={c01*0.02:.3f}[TECU/deg] c10={c10*0.02:.3f}[TECU/deg]"
+                            line += f" c01={c01*0.02:.3f}[TECU/deg] c10={c10*0.02:.3f}[TECU/deg]"
+                            values += [c01*0.02, c10*0.02]
+                            poly[1:3] = c01*0.02, c10*0.02
                     if 2 <= sct:
                         if len_payload < payload.pos + 10:
                             return False
                         c11 = payload.read(10).i
                         if c11 != -512:
-                            msg1 += f" c11={c11* 0.02:.3f}[TECU/deg^2]"
+                            line += f" c11={c11* 0.02:.3f}[TECU/deg^2]"
+                            values += [c11*0.02]
+                            poly[3] = c11*0.02
                     if 3 <= sct:
                         if len_payload < payload.pos + 8 + 8:
                             return False
                         c02 = payload.read(8).i
                         c20 = payload.read(8).i
                         if c02 != -128 and c20 != -128:
-                            msg1 += f" c02={c02*0.005:.3f}[TECU/deg^2] c20={c20*0.005:.3f}[TECU/deg^2]"
+                            line += f" c02={c02*0.005:.3f}[TECU/deg^2] c20={c20*0.005:.3f}[TECU/deg^2]"
+                            values += [c02*0.005, c20*0.005]
+                            poly[4:6] = c02*0.005, c20*0.005
+                    if c00 != -8192:
+                        stec_poly[(cnid, gsys)] = tuple(poly)
                     if len_payload < payload.pos + 2:
                         return False
                     srs = payload.read(2).u  # STEC residual size
@@ -1031,20 +1350,490 @@ class Ssr:
                     lsb = [0.04, 0.12, 0.16, 0.24][srs]
                     if len_payload < payload.pos + bw * ngrid:
                         return False
+                    lines = ''
+                    stec_res[(cnid, gsys)] = [None] * ngrid
                     for grid in range(ngrid):
                         sr  = payload.read(bw).i  # STEC residual
                         lat, lon = CLASGRID[cnid-1][2][grid]
                         if (bw == 4 and sr !=  -8) or \
                            (bw == 5 and sr != -16) or \
                            (bw == 7 and sr != -64):
-                            msg1 += f"\nST12 STEC {gsys} {lat:5.2f} {lon:6.2f}         {sr*lsb:{FMT_TECU}}"
+                            stec_res[(cnid, gsys)][grid] = sr*lsb
+                            if self.changed(('ST12', cnid, grid, gsys), (sr*lsb,)):
+                                lines += f"\nST12 STEC {gsys} {lat:5.2f} {lon:6.2f}         {sr*lsb:{FMT_TECU}}"
+                    if self.changed(('ST12', cnid, gsys), tuple(values)):
+                        msg1 += head + line + lines
+                    elif lines:
+                        msg1 += head + lines
         if savail[1]:  # bool object
             pass  # the use of this bit is not defined in ref.[1]
+        self.trop_poly = {**self.trop_poly, **trop_poly}
+        self.trop_res  = {**self.trop_res , **trop_res }
+        self.stec_poly = {**self.stec_poly, **stec_poly}
+        self.stec_res  = {**self.stec_res , **stec_res }
+        self.cnid = cnid
         self.trace.show(1, msg1)
         self.stat_both += stat_pos
         self.stat_bsat += payload.pos - stat_pos
         return True
 
+    def _set_cellcount(self, cellcount):
+        ''' stores number of signals of each satellite in the mask, and
+            precomputes bit sizes of the subtypes that depend only on it
+        '''
+        nsat  = sum(len(count) for count in cellcount)
+        ncell = sum(sum(count) for count in cellcount)
+        self.cellcount = cellcount
+        self.skipsize  = {
+            2: sum(len(count) * ((10 if satsys == 'E' else 8) + 41)
+                for satsys, count in zip(self.satsys, cellcount)),
+            3: nsat  * 15,
+            4: ncell * 11,
+            5: ncell * 17,
+            7: nsat  *  6,
+        }
+
+    def changed(self, key, values):
+        ''' returns True if the correction of key should be shown, that is,
+            in full output, or when any value differs from the last shown
+            one by more than the tolerance (integers such as IODE by any)
+        '''
+        if self.delta is None:
+            return True
+        last = self.published.get(key)
+        if not self.full and last is not None and not any(
+                abs(v - u) > self.delta if isinstance(v, float) else v != u
+                for v, u in zip(values, last)):
+            return False
+        self.published[key] = values
+        return True
+
+    def _skip_svmask(self, payload, pos):
+        ''' returns bit position after satellite masks, and flags of
+            masked satellites for each satellite system
+        '''
+        svmask = []
+        for cellcount in self.cellcount:
+            nsat = len(cellcount)
+            if len(payload) < pos + nsat:
+                return None, None
+            svmask.append(payload[pos:pos+nsat]); pos += nsat
+        return pos, svmask
+
+    @libperf.timed('decode', 'CSSR skip')
+    def skip_cssr_body(self, payload):
+        ''' skips CSSR message body after the header by its length, which
+            is computed from the mask without decoding fields, and
+            returns True if success
+        '''
+        len_payload = len(payload)
+        pos = payload.pos
+        st  = self.subtype
+        if st == 1:
+            if len_payload < pos + 4:
+                return False
+            ngnss = payload[pos:pos+4].u; pos += 4
+            satsys, cellcount = [], []
+            for _ in range(ngnss):
+                if len_payload < pos + 61:
+                    return False
+                gnssid  = payload[pos   :pos+ 4].u
+                nsat    = payload[pos+ 4:pos+44].count(1)
+                nsig    = payload[pos+44:pos+60].count(1)
+                cmavail = payload[pos+60]; pos += 61
+                if cmavail:
+                    if len_payload < pos + nsat * nsig:
+                        return False
+                    cell = payload[pos:pos+nsat*nsig]; pos += nsat * nsig
+                    count = [cell[i*nsig:(i+1)*nsig].count(1) for i in range(nsat)]
+                else:
+                    count = [nsig] * nsat
+                satsys.append(gnssid2satsys(gnssid))
+                cellcount.append(count)
+            self.satsys = satsys
+            self._set_cellcount(cellcount)
+            payload.pos = pos
+            return True
+        if self.cellcount is None:  # ST1 has not been decoded or skipped
+            return False
+        size = self.skipsize.get(st, 0)  # bit size of the rest
+        if st in {6, 11}:
+            if len_payload < pos + 3:
+                return False
+            f_1, f_2, f_n = payload[pos:pos+3]; pos += 3
+            svmask = [[True] * len(count) for count in self.cellcount]
+            if f_n:
+                pos, svmask = self._skip_svmask(payload, pos + 5)
+                if pos is None:
+                    return False
+            for satsys, count, mask in zip(self.satsys, self.cellcount, svmask):
+                for ncell_sat, masked in zip(count, mask):
+                    if not masked:
+                        continue
+                    if st == 6:  # code bias and phase bias of each signal
+                        size += ncell_sat * (11 * f_1 + 17 * f_2)
+                    else:        # orbit and clock of each satellite
+                        size += ((10 if satsys == 'E' else 8) + 41) * f_1 + 15 * f_2
+        elif st in {8, 9}:
+            if len_payload < pos + 7 + (st == 9):
+                return False
+            stec_type = payload[pos:pos+2].u  # or trop correction type
+            srange    = payload[pos+2] if st == 9 else 0
+            pos, svmask = self._skip_svmask(payload, pos + 7 + (st == 9))
+            if pos is None:
+                return False
+            nmasked = sum(mask.count(1) for mask in svmask)
+            if st == 8:
+                size = nmasked * (20 + (0, 24, 34, 50)[stec_type])
+            else:
+                if len_payload < pos + 12:
+                    return False
+                ngrid = payload[pos+6:pos+12].u; pos += 12
+                size = ngrid * (17 + nmasked * (16 if srange else 7))
+        elif st == 10:
+            if len_payload < pos + 5:
+                return False
+            size = 5 + (payload[pos+3:pos+5].u + 1) * 40
+        elif st == 12:
+            if len_payload < pos + 15:
+                return False
+            tavail = payload[pos  :pos+ 2]
+            savail = payload[pos+2:pos+ 4]
+            ngrid  = payload[pos+9:pos+15].u; pos += 15
+            if tavail[0]:
+                if len_payload < pos + 17:
+                    return False
+                pos += 17 + (0, 14, 21, 21)[payload[pos+6:pos+8].u]
+            if tavail[1]:
+                if len_payload < pos + 5:
+                    return False
+                pos += 5 + (8 if payload[pos] else 6) * ngrid
+            if savail[0]:
+                pos, svmask = self._skip_svmask(payload, pos)
+                if pos is None:
+                    return False
+                for _ in range(sum(mask.count(1) for mask in svmask)):
+                    if len_payload < pos + 22:
+                        return False
+                    pos += 22 + (0, 24, 34, 50)[payload[pos+6:pos+8].u]
+                    if len_payload < pos + 2:
+                        return False
+                    pos += 2 + (4, 4, 5, 7)[payload[pos:pos+2].u] * ngrid
+        elif st not in self.skipsize:
+            return False
+        if len_payload < pos + size:
+            return False
+        payload.pos = pos + size
+        return True
+
+    def encode_cssr_head(self, subtype, epoch, ui, iodssr, mmi=0):
+        ''' returns CSSR header in bitstring, ref. [1]
+            epoch: GPS time of week in second, ui: update interval index
+        '''
+        payload = bitstring.BitStream(bitstring.pack('u12, u4', 4073, subtype))
+        if subtype == 10:  # service information does not have epoch
+            return payload
+        if subtype == 1:
+            payload.append(bitstring.pack('u20', epoch))  # GPS epoch time 1s
+        else:
+            payload.append(bitstring.pack('u12', epoch % 3600))  # GNSS hourly epoch
+        payload.append(bitstring.pack('u4, u1, u4', ui, mmi, iodssr))
+        return payload
+
+    def _encode_svmask(self, payload, sats):
+        ''' appends satellite mask of the satellites in sats to payload '''
+        for satsys in self.satsys:
+            for gsys in self.gsys[satsys]:
+                payload.append(bitstring.pack('bool', gsys in sats))
+
+    def encode_cssr_st1(self, epoch, ui, iodssr, gsys, gsig, cellmask=None):
+        ''' encode CSSR ST1 mask message and returns bitstring
+            gsys: dict of satellite names from system name
+            gsig: dict of signal names from system name
+            cellmask: dict of cell mask (list of bool, satellite-major order)
+                from system name, or None for all cells available
+        '''
+        if cellmask is None:
+            cellmask = {}
+        payload = self.encode_cssr_head(1, epoch, ui, iodssr)
+        payload.append(bitstring.pack('u4', len(gsys)))  # number of GNSS
+        self.satsys   = []
+        self.nsatmask = []
+        self.nsigmask = []
+        self.cellmask = []
+        self.gsys     = {}
+        self.gsig     = {}
+        self.cmavail  = {}
+        for satsys in gsys:
+            prns     = sorted(int(sat[1:]) for sat in gsys[satsys])
+            sigmasks = sorted(signame2sigmask(satsys, sig) for sig in gsig[satsys])
+            bsatmask = bitstring.BitArray(40)
+            bsigmask = bitstring.BitArray(16)
+            for prn in prns:
+                bsatmask[prn - 1] = 1
+            for sigmask in sigmasks:
+                bsigmask[sigmask] = 1
+            ncell = len(prns) * len(sigmasks)
+            if satsys in cellmask:
+                bcellmask = bitstring.Bits(cellmask[satsys])
+            else:
+                bcellmask = bitstring.Bits('0b1') * ncell
+            if len(bcellmask) != ncell:
+                raise Exception(f'cell mask size should be {ncell} ({len(bcellmask)})')
+            payload.append(bitstring.pack('u4', satsys2gnssid(satsys)))
+            payload.append(bsatmask + bsigmask)
+            payload.append(bitstring.pack('bool', satsys in cellmask))
+            if satsys in cellmask:
+                payload.append(bcellmask)
+            self.satsys.append(satsys)
+            self.nsatmask.append(len(prns))
+            self.nsigmask.append(len(sigmasks))
+            self.cellmask.append(bcellmask)
+            self.gsys[satsys]    = [f'{satsys}{prn:02d}' for prn in prns]
+            self.gsig[satsys]    = [sigmask2signame(satsys, sigmask) for sigmask in sigmasks]
+            self.cmavail[satsys] = satsys in cellmask
+        return payload
+
+    def encode_cssr_st2(self, epoch, ui, iodssr, orbit):
+        ''' encode CSSR ST2 orbit message and returns bitstring
+            orbit: dict of (iode, radial[m], along[m], cross[m]) from satellite name
+        '''
+        payload = self.encode_cssr_head(2, epoch, ui, iodssr)
+        for satsys in self.satsys:
+            bw = 10 if satsys == 'E' else 8  # IODE bit width
+            for gsys in self.gsys[satsys]:
+                iode, radial, along, cross = orbit.get(gsys, (0, None, None, None))
+                payload.append(bitstring.pack(f'u{bw}, i15, i13, i13', iode,
+                    quantize(radial, 0.0016, -16384),
+                    quantize(along , 0.0064, -4096),
+                    quantize(cross , 0.0064, -4096)))
+        return payload
+
+    def encode_cssr_st3(self, epoch, ui, iodssr, clock):
+        ''' encode CSSR ST3 clock message and returns bitstring
+            clock: dict of c0[m] from satellite name
+        '''
+        payload = self.encode_cssr_head(3, epoch, ui, iodssr)
+        for satsys in self.satsys:
+            for gsys in self.gsys[satsys]:
+                payload.append(bitstring.pack('i15',
+                    quantize(clock.get(gsys), 0.0016, -16384)))
+        return payload
+
+    def _encode_bias(self, payload, cbias, pbias, sats=None):
+        ''' appends code bias and phase bias of the masked cells to payload
+            cbias: dict of code bias[m] from (satellite name, signal name),
+                or None for no code bias
+            pbias: dict of (phase bias[m], discontinuity) from
+                (satellite name, signal name), or None for no phase bias
+            sats: satellite names to be encoded, or None for all
+        '''
+        for i, satsys in enumerate(self.satsys):
+            pos_mask = 0  # mask position
+            for gsys in self.gsys[satsys]:
+                for gsig in self.gsig[satsys]:
+                    mask = self.cellmask[i][pos_mask]; pos_mask += 1
+                    if not mask or (sats is not None and gsys not in sats):
+                        continue
+                    if cbias is not None:
+                        payload.append(bitstring.pack('i11',
+                            quantize(cbias.get((gsys, gsig)), 0.02, -1024)))
+                    if pbias is not None:
+                        pb, di = pbias.get((gsys, gsig), (None, 0))
+                        payload.append(bitstring.pack('i15, u2',
+                            quantize(pb, 0.001, -16384), di))
+
+    def encode_cssr_st4(self, epoch, ui, iodssr, cbias):
+        ''' encode CSSR ST4 code bias message and returns bitstring
+            cbias: dict of code bias[m] from (satellite name, signal name)
+        '''
+        payload = self.encode_cssr_head(4, epoch, ui, iodssr)
+        self._encode_bias(payload, cbias, None)
+        return payload
+
+    def encode_cssr_st5(self, epoch, ui, iodssr, pbias):
+        ''' encode CSSR ST5 phase bias message and returns bitstring
+            pbias: dict of (phase bias[m], discontinuity) from
+                (satellite name, signal name)
+        '''
+        payload = self.encode_cssr_head(5, epoch, ui, iodssr)
+        self._encode_bias(payload, None, pbias)
+        return payload
+
+    def encode_cssr_st6(self, epoch, ui, iodssr, cbias=None, pbias=None, cnid=0, sats=None):
+        ''' encode CSSR ST6 network bias message and returns bitstring
+            cbias, pbias: same as ST4 and ST5, or None if not included
+            cnid: compact network ID, or 0 if network bias is not included
+            sats: satellite names for the network bias
+        '''
+        payload = self.encode_cssr_head(6, epoch, ui, iodssr)
+        payload.append(bitstring.pack('bool, bool, bool',
+            cbias is not None, pbias is not None, cnid != 0))
+        if cnid:
+            payload.append(bitstring.pack('u5', cnid))
+            self._encode_svmask(payload, sats)
+        self._encode_bias(payload, cbias, pbias, sats if cnid else None)
+        return payload
+
+    def encode_cssr_st7(self, epoch, ui, iodssr, ura):
+        ''' encode CSSR ST7 user range accuracy message and returns bitstring
+            ura: dict of URA code (class and value in 6 bit) from satellite name
+        '''
+        payload = self.encode_cssr_head(7, epoch, ui, iodssr)
+        for satsys in self.satsys:
+            for gsys in self.gsys[satsys]:
+                payload.append(bitstring.pack('u6', ura.get(gsys, 0)))
+        return payload
+
+    def _encode_stec(self, payload, stec_type, coeff):
+        ''' appends STEC polynomial coefficients to payload
+            coeff: (c00, c01, c10, c11, c02, c20) in TECU and TECU/deg^n
+        '''
+        c00, c01, c10, c11, c02, c20 = coeff
+        payload.append(bitstring.pack('i14', quantize(c00, 0.05, -8192)))
+        if 1 <= stec_type:
+            payload.append(bitstring.pack('i12, i12',
+                quantize(c01, 0.02, -2048), quantize(c10, 0.02, -2048)))
+        if 2 <= stec_type:
+            payload.append(bitstring.pack('i10', quantize(c11, 0.02, -512)))
+        if 3 <= stec_type:
+            payload.append(bitstring.pack('i8, i8',
+                quantize(c02, 0.005, -128), quantize(c20, 0.005, -128)))
+
+    def encode_cssr_st8(self, epoch, ui, iodssr, stec_type, cnid, stec):
+        ''' encode CSSR ST8 STEC message and returns bitstring
+            stec: dict of (quality code, (c00, c01, c10, c11, c02, c20))
+                from satellite name
+        '''
+        payload = self.encode_cssr_head(8, epoch, ui, iodssr)
+        payload.append(bitstring.pack('u2, u5', stec_type, cnid))
+        self._encode_svmask(payload, stec)
+        for satsys in self.satsys:
+            for gsys in self.gsys[satsys]:
+                if gsys not in stec:
+                    continue
+                qi, coeff = stec[gsys]
+                payload.append(bitstring.pack('u6', qi))
+                self._encode_stec(payload, stec_type, coeff)
+        return payload
+
+    def encode_cssr_st9(self, epoch, ui, iodssr, cnid, tqi, srange, trop, residual):
+        ''' encode CSSR ST9 trop correction message and returns bitstring
+            tqi: trop quality code, srange: residual range (0: 7 bit, 1: 16 bit)
+            trop: list of (hydrostatic delay[m], wet delay[m]) of the grids
+            residual: list of dict of STEC residual[TECU] from satellite name
+                of the grids
+        '''
+        ngrid = CLASGRID[cnid-1][1]
+        if len(trop) != ngrid or len(residual) != ngrid:
+            raise Exception(f"cnid={cnid} needs {ngrid} grids")
+        sats = residual[0] if ngrid else {}
+        bw   = 16 if srange else 7  # bit width of residual correction
+        payload = self.encode_cssr_head(9, epoch, ui, iodssr)
+        payload.append(bitstring.pack('u2, u1, u5', 1, srange, cnid))  # Neill mapping function
+        self._encode_svmask(payload, sats)
+        payload.append(bitstring.pack('u6, u6', tqi, ngrid))
+        for grid in range(ngrid):
+            vd_h, vd_w = trop[grid]
+            payload.append(bitstring.pack('i9, i8',
+                -256 if vd_h is None else round((vd_h - 2.3  ) / 0.004),
+                -128 if vd_w is None else round((vd_w - 0.252) / 0.004)))
+            for satsys in self.satsys:
+                for gsys in self.gsys[satsys]:
+                    if gsys not in sats:
+                        continue
+                    payload.append(bitstring.pack(f'i{bw}', quantize(
+                        residual[grid].get(gsys), 0.04, -(1 << (bw - 1)))))
+        return payload
+
+    def encode_cssr_st10(self, counter, data):
+        ''' encode CSSR ST10 auxiliary message and returns bitstring
+            data: auxiliary frame data in bytes (5, 10, 15, or 20 bytes)
+        '''
+        if len(data) not in {5, 10, 15, 20}:
+            raise Exception(f'auxiliary data size should be 5, 10, 15, or 20 ({len(data)})')
+        payload = self.encode_cssr_head(10, 0, 0, 0)
+        payload.append(bitstring.pack('u3, u2', counter, len(data) // 5 - 1))
+        payload.append(bitstring.Bits(data))
+        return payload
+
+    def encode_cssr_st11(self, epoch, ui, iodssr, orbit=None, clock=None, cnid=0, sats=None):
+        ''' encode CSSR ST11 network correction message and returns bitstring
+            orbit, clock: same as ST2 and ST3, or None if not included
+            cnid: compact network ID, or 0 if network correction is not included
+            sats: satellite names for the network correction
+        '''
+        payload = self.encode_cssr_head(11, epoch, ui, iodssr)
+        payload.append(bitstring.pack('bool, bool, bool',
+            orbit is not None, clock is not None, cnid != 0))
+        if cnid:
+            payload.append(bitstring.pack('u5', cnid))
+            self._encode_svmask(payload, sats)
+        for satsys in self.satsys:
+            for gsys in self.gsys[satsys]:
+                if cnid and gsys not in sats:
+                    continue
+                if orbit is not None:
+                    bw = 10 if satsys == 'E' else 8  # IODE bit width
+                    iode, radial, along, cross = orbit.get(gsys, (0, None, None, None))
+                    payload.append(bitstring.pack(f'u{bw}, i15, i13, i13', iode,
+                        quantize(radial, 0.0016, -16384),
+                        quantize(along , 0.0064, -4096),
+                        quantize(cross , 0.0064, -4096)))
+                if clock is not None:
+                    payload.append(bitstring.pack('i15',
+                        quantize(clock.get(gsys), 0.0016, -16384)))
+        return payload
+
+    def encode_cssr_st12(self, epoch, ui, iodssr, cnid, trop=None, trop_res=None, stec=None):
+        ''' encode CSSR ST12 network and troposphere corrections message
+            and returns bitstring
+            trop: (quality code, type, t00[m], t01[m/deg], t10[m/deg],
+                t11[m/deg^2]), or None if not included
+            trop_res: (residual size, offset code, list of residual[m] of
+                the grids), or None if not included
+            stec: dict of (quality code, type, (c00, c01, c10, c11, c02, c20),
+                residual size, list of residual[TECU] of the grids) from
+                satellite name, or None if not included
+        '''
+        ngrid = CLASGRID[cnid-1][1]
+        payload = self.encode_cssr_head(12, epoch, ui, iodssr)
+        payload.append(bitstring.pack('bool, bool, bool, bool, u5, u6',
+            trop is not None, trop_res is not None, stec is not None, False,
+            cnid, ngrid))
+        if trop is not None:
+            tqi, ttype, t00, t01, t10, t11 = trop
+            payload.append(bitstring.pack('u6, u2, i9', tqi, ttype,
+                quantize(t00, 0.004, -256)))
+            if 1 <= ttype:
+                payload.append(bitstring.pack('i7, i7',
+                    quantize(t01, 0.002, -64), quantize(t10, 0.002, -64)))
+            if 2 <= ttype:
+                payload.append(bitstring.pack('i7', quantize(t11, 0.001, -64)))
+        if trop_res is not None:
+            trs, tro, res = trop_res
+            bw = 8 if trs else 6
+            payload.append(bitstring.pack('u1, u4', trs, tro))
+            for grid in range(ngrid):
+                payload.append(bitstring.pack(f'i{bw}',
+                    quantize(res[grid], 0.004, -(1 << (bw - 1)))))
+        if stec is not None:
+            self._encode_svmask(payload, stec)
+            for satsys in self.satsys:
+                for gsys in self.gsys[satsys]:
+                    if gsys not in stec:
+                        continue
+                    sqi, sct, coeff, srs, res = stec[gsys]
+                    payload.append(bitstring.pack('u6, u2', sqi, sct))
+                    self._encode_stec(payload, sct, coeff)
+                    bw  = [   4,    4,    5,    7][srs]
+                    lsb = [0.04, 0.12, 0.16, 0.24][srs]
+                    payload.append(bitstring.pack('u2', srs))
+                    for grid in range(ngrid):
+                        payload.append(bitstring.pack(f'i{bw}',
+                            quantize(res[grid], lsb, -(1 << (bw - 1)))))
+        return payload
+
     def decode_mdcppp_iono_head(self, payload):
         ''' decode MADOCA-PPP ionosphere correction header and returns True if success '''
         self.msgnum  = 0
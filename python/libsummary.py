@@ -0,0 +1,50 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# libsummary.py: library for message count summary
+# A part of QZS L6 Tool, https://github.com/yoronneko/qzsl6tool
+#
+# Copyright (c) 2024 Satoshi Takahashi, all rights reserved.
+#
+# Released under BSD 2-clause license.
+
+import re
+import sys
+
+def item_key(item):
+    ''' returns sort key that orders ST2 before ST10 '''
+    return [int(x) if x.isdigit() else x for x in re.split(r'(\d+)', str(item))]
+
+def tod2minute(tod):
+    ''' returns hh:mm of time of day (or week) in second '''
+    return f'{tod // 3600 % 24:02d}:{tod % 3600 // 60:02d}'
+
+class Summary:
+    "Message counts per source and per minute for --summary option"
+
+    def __init__(self, title):
+        self.title  = title  # heading of the source column, such as PRN
+        self.count  = {}     # {source: {item: count}}
+        self.minute = {}     # {hh:mm: {item: count}}
+
+    def add(self, source, item, minute=None):
+        ''' counts the item of the source, and of the minute if given '''
+        count = self.count.setdefault(source, {})
+        count[item] = count.get(item, 0) + 1
+        if minute is not None:
+            count = self.minute.setdefault(minute, {})
+            count[item] = count.get(item, 0) + 1
+
+    def show(self, fp=sys.stdout):
+        ''' prints the counts as a compact table '''
+        for title, table in ((self.title, self.count), ('minute', self.minute)):
+            if not table:
+                continue
+            width = max(len(title), *(len(str(s)) for s in table))
+            print(f'{title:<{width}} items', file=fp)
+            for source in sorted(table, key=item_key):
+                items = ' '.join(f'{item}:{n}' for item, n in
+                    sorted(table[source].items(), key=lambda x: item_key(x[0])))
+                print(f'{source:<{width}} {items}', file=fp)
+
+# EOF
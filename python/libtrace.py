@@ -10,6 +10,8 @@
 
 import sys
 
+import libperf
+
 def fg_color(color='default'):  # foreground color
     '''
     color:
@@ -116,6 +118,7 @@ class Trace:
             if fg : message += fg_color()
         return message
 
+    @libperf.timed('output')
     def show(self, level, arg, fg='', bg='', dec='', end='\n'):
         '''
         prints colorize argument when level is lower than t_level
@@ -17,6 +17,10 @@ import sys
 
 sys.path.append(os.path.dirname(__file__))
 import libgnsstime
+import libindex
+import libio
+import libmetrics
+import libperf
 import libtrace
 
 LEN_CNAV_PAGE = 62  # C/NAV page size is 492 bit (61.5 byte)
@@ -39,6 +43,7 @@ NOV_MSG_NAME = {    # dictionary for obtaining message name from ID
     2239: 'GALCNAVRAWPAGE' ,
 }
 
+@libperf.timed('crc')
 def crc32(data):
     polynomial = 0xedb88320
     crc = 0
@@ -53,32 +58,54 @@ def crc32(data):
         crc = tmp1 ^ tmp2
     return crc.to_bytes(4,'little')
 
+def encode_nov(msg_id, gpsw, gpst, payload):
+    ''' returns NovAtel binary message with CRC, [1]
+        gpst: GPS time of week in millisecond
+    '''
+    head = msg_id.to_bytes(2, 'little') + bytes(2) + \
+        len(payload).to_bytes(2, 'little') + bytes(2) + bytes([0, 180]) + \
+        gpsw.to_bytes(2, 'little') + gpst.to_bytes(4, 'little') + bytes(8)
+    msg = b'\xaa\x44\x12' + (len(head) + 4).to_bytes(1, 'little') + head + payload
+    return msg + crc32(msg)
+
+def encode_galcnavrawpage(gpsw, gpst, satid, cnav):
+    ''' returns GALCNAVRAWPAGE (2239) message, ref.[1], p.591
+        cnav: C/NAV page of 62 bytes, only the first 58 bytes are sent
+            because NovAtel C/NAV data excludes CRC and tail bits
+    '''
+    mid = ((cnav[2] & 0x0f) << 1) | (cnav[3] >> 7)  # message ID
+    pid = ((cnav[3] & 0x03) << 6) | (cnav[4] >> 2)  # page ID
+    payload = bytes(4) + satid.to_bytes(4, 'little') + \
+        mid.to_bytes(2, 'little') + pid.to_bytes(2, 'little') + cnav[:58]
+    return encode_nov(2239, gpsw, gpst, payload)
+
 class NovReceiver:
-    def __init__(self, trace):
+    def __init__(self, trace, fp=None):
         self.trace = trace
+        self.fp    = fp or libio.fp_in  # own input for multiplexer
 
+    @libperf.timed('read')
     def read(self):
         ''' reads standard input as NovAtel raw, [1]
             and returns true if successful '''
         while True:
-            sync = bytes(3)
-            while sync != b'\xaa\x44\x12':
-                b = sys.stdin.buffer.read(1)
-                if not b:
-                    return False
-                sync = sync[1:3] + b
-            head_len = sys.stdin.buffer.read(1)
+            sync = b'\xaa\x44\x12'
+            nskip = libio.find_sync(self.fp, sync)  # number of skipped bytes
+            if nskip < 0:
+                return False
+            libmetrics.bytes_skipped.inc(n=nskip)
+            head_len = self.fp.read(1)
             if not head_len:
                 return False
             u_head_len = int.from_bytes(head_len, 'little')
-            head = sys.stdin.buffer.read(u_head_len - 4)
+            head = self.fp.read(u_head_len - 4)
             if not head:
                 return False
             self.parse_head(head)
-            payload = sys.stdin.buffer.read(self.msg_len)
+            payload = self.fp.read(self.msg_len)
             if not payload:
                 return False
-            crc = sys.stdin.buffer.read(4)
+            crc = self.fp.read(4)
             if not crc:
                 return False
             crc_cal = crc32(sync + head_len + head + payload)
@@ -86,7 +113,9 @@ class NovReceiver:
                 break
             else:
                 libtrace.err(f'CRC error: {crc.hex()} != {crc_cal.hex()}')
+                libmetrics.check_failed.inc('crc')
                 continue
+        libmetrics.frames_read.inc()
         self.payload = payload
         return True
 
@@ -168,7 +197,30 @@ if __name__ == '__main__':
     parser.add_argument(
         '-q', '--qlnav', action='store_true',
         help='send QZSS LNAV messages to stdout, and also turns off display message.')
+    parser.add_argument(
+        '--input', metavar='FILE',
+        help='read FILE by memory mapping, or by decompression if FILE is gzip, xz, or bzip2 file, or receive from tcp://HOST:PORT or ntrip://[USER[:PASSWD]@]HOST[:PORT]/MOUNTPOINT with reconnection, instead of stdin.')
+    parser.add_argument(
+        '--input-thread', action='store_true',
+        help='decompress --input FILE in a background thread.')
+    parser.add_argument(
+        '--input-retry', metavar='N', type=int, default=0,
+        help='stop after N consecutive reconnection failures of --input URL (0: unlimited), default 0.')
+    libindex.add_arguments(parser)
+    libio.add_output_arguments(parser)
+    parser.add_argument(
+        '--perf-report', action='store_true',
+        help='show performance report of processing stages to stderr at exit.')
+    parser.add_argument(
+        '--metrics', metavar='TARGET',
+        help='export metrics in Prometheus text format to TARGET file rewritten periodically, or to http://127.0.0.1:TARGET/metrics when TARGET is a port number.')
     args = parser.parse_args()
+    libio.open_input(args.input, args.input_thread, args.input_retry)
+    if args.perf_report:
+        libperf.enable()
+    if args.metrics:
+        libmetrics.start(parser.prog, args.metrics)
+    end = libindex.check_args(args)
     fp_disp, fp_raw = sys.stdout, None
     if args.e6b:
         fp_disp, fp_raw = None, sys.stdout
@@ -176,10 +228,12 @@ if __name__ == '__main__':
         fp_disp, fp_raw = None, sys.stdout
     if args.message:  # send display messages to stderr
         fp_disp = sys.stderr
+    fp_rotate = libio.open_output(args,
+        'e6b' if args.e6b else 'lnav') if fp_raw else None
     trace = libtrace.Trace(fp_disp, 0, args.color)
     rcv = NovReceiver(trace)
     try:
-        while rcv.read():
+        while not libindex.reached(libio.fp_in, end) and rcv.read():
             #print(rcv.msg_name, file=fp_disp)
             if rcv.msg_name == 'GALCNAVRAWPAGE':
                 msg = rcv.galcnavrawpage()
@@ -191,8 +245,12 @@ if __name__ == '__main__':
             rcv.trace.show(0, msg)
             if (args.e6b   and rcv.msg_name == 'GALCNAVRAWPAGE' ) or \
                (args.qlnav and rcv.msg_name == 'QZSSRAWSUBFRAME'):
-                fp_raw.buffer.write(rcv.raw)
-                fp_raw.flush()
+                if fp_rotate:
+                    fp_rotate.write(rcv.raw, rcv.gpsw, rcv.gpst)
+                    fp_rotate.flush()
+                else:
+                    fp_raw.buffer.write(rcv.raw)
+                    fp_raw.flush()
     except (BrokenPipeError, IOError):
         devnull = os.open(os.devnull, os.O_WRONLY)
         os.dup2(devnull, sys.stdout.fileno())
@@ -13,16 +13,41 @@ import os
 import sys
 
 sys.path.append(os.path.dirname(__file__))
+import libio
+import libmetrics
+import libperf
 import libtrace
 
 LEN_BCNAV3    = 125  # BDS CNAV3 page size is 1000 sym (125 byte)
 LEN_L6_FRM    = 250  # QZS L6 frame size is 2000 bit (250 byte)
 LEN_CNAV_PAGE =  62  # GAL C/NAV page size is 492 bit (61.5 byte)
+PSDR_SIGNAME = {  # dictionary for obtaining log name and signal name
+    'l6'  : ('$L6FRM' , 'L6D'),
+    'e6b' : ('$CNAV'  , 'E6B'),
+    'inav': ('$INAV'  , 'E1B'),
+    'b2b' : ('$BCNAV3', 'B2B'),
+}
+
+def encode_psdr(signame, time, satid, raw):
+    ''' returns Pocket SDR log line
+        signame: l6, e6b, inav, or b2b
+        raw: L6 frame, C/NAV page, I/NAV page, or B2b frame
+    '''
+    logname, sig = PSDR_SIGNAME[signame]
+    if signame == 'l6':
+        fields = [logname, f'{time:.3f}', sig, str(satid), '0', raw.hex().upper()]
+    else:
+        if signame == 'e6b':
+            raw = raw[:LEN_CNAV_PAGE - 1]
+        fields = [logname, f'{time:.3f}', sig, str(satid), raw.hex().upper()]
+    return (','.join(fields) + '\n').encode()
 
 class PocketSdr:
-    def __init__(self, trace):
+    def __init__(self, trace, fp=None):
         self.trace = trace
+        self.fp    = fp or libio.fp_in  # own input for multiplexer
 
+    @libperf.timed('read')
     def read(self):
         ''' returns True when L6D, L6E, E6B, or B2b signal log is read,
             returns False when EOF is encountered '''
@@ -30,7 +55,7 @@ class PocketSdr:
         self.signame = None
         self.msg     = ''
         while True:
-            line = sys.stdin.readline().strip()
+            line = bytes(self.fp.readline()).decode().strip()
             if not line:  # end of file
                 return False
             if   line[0:6] == "$L6FRM":
@@ -64,6 +89,7 @@ class PocketSdr:
                 self.msg = self.trace.msg(0, f"C{self.satid:02d} B2b: ", fg='green') + \
                     self.trace.msg(0, line.split(',')[4], fg='yellow')
                 break
+        libmetrics.frames_read.inc()
         return True
 
 if __name__ == '__main__':
@@ -84,10 +110,34 @@ if __name__ == '__main__':
     parser.add_argument(
         '-l', '--l6', action='store_true',
         help='send QZS L6 messages to stdout, and also turns off display message.')
+    parser.add_argument(
+        '--input', metavar='FILE',
+        help='read FILE by memory mapping, or by decompression if FILE is gzip, xz, or bzip2 file, or receive from tcp://HOST:PORT or ntrip://[USER[:PASSWD]@]HOST[:PORT]/MOUNTPOINT with reconnection, instead of stdin.')
+    parser.add_argument(
+        '--input-thread', action='store_true',
+        help='decompress --input FILE in a background thread.')
+    parser.add_argument(
+        '--input-retry', metavar='N', type=int, default=0,
+        help='stop after N consecutive reconnection failures of --input URL (0: unlimited), default 0.')
+    libio.add_output_arguments(parser)
+    parser.add_argument(
+        '--perf-report', action='store_true',
+        help='show performance report of processing stages to stderr at exit.')
+    parser.add_argument(
+        '--metrics', metavar='TARGET',
+        help='export metrics in Prometheus text format to TARGET file rewritten periodically, or to http://127.0.0.1:TARGET/metrics when TARGET is a port number.')
     args = parser.parse_args()
+    libio.open_input(args.input, args.input_thread, args.input_retry)
+    if args.perf_report:
+        libperf.enable()
+    if args.metrics:
+        libmetrics.start(parser.prog, args.metrics)
     fp_disp, fp_raw = sys.stdout, None
     if args.b2b or args.e6b or args.inav or args.l6:
         fp_disp, fp_raw = None, sys.stdout
+    fp_rotate = libio.open_output(args,
+        'b2b' if args.b2b else 'e6b' if args.e6b else
+        'inav' if args.inav else 'l6') if fp_raw else None
     trace = libtrace.Trace(fp_disp, 0, args.color)
     rcv = PocketSdr(trace)
     try:
@@ -97,8 +147,12 @@ if __name__ == '__main__':
                (args.e6b  and rcv.signame == 'e6b' ) or \
                (args.inav and rcv.signame == 'inav') or \
                (args.l6   and rcv.signame == 'l6'  ):
-                fp_raw.buffer.write(rcv.raw)
-                fp_raw.flush()
+                if fp_rotate:  # log time is not GPS time
+                    fp_rotate.write(rcv.raw)
+                    fp_rotate.flush()
+                else:
+                    fp_raw.buffer.write(rcv.raw)
+                    fp_raw.flush()
     except (BrokenPipeError, IOError):
         devnull = os.open(os.devnull, os.O_WRONLY)
         os.dup2(devnull, sys.stdout.fileno())
@@ -24,6 +24,9 @@ import sys
 
 sys.path.append(os.path.dirname(__file__))
 import libgnsstime
+import libio
+import libmetrics
+import libperf
 import libtrace
 from   rtcmread import rtk_crc24q
 
@@ -309,6 +312,7 @@ class QzsL1s:
         63: 'Null message',
     }
 
+    @libperf.timed('decode', 'L1S')
     def decode_l1s (self, l1s):
         ''' returns decoded message '''
         pab = l1s.read(L_PAB)  # preamble (8 bit), ref.[3], Fig.4.1.1-1
@@ -317,8 +321,10 @@ class QzsL1s:
         crc = l1s.read(L_CRC)  # crc24, ref.[3] pp., sect.4.1.1.3
         pad = bitstring.Bits('uint6=0')  # padding for byte alignment
         frame = (pad + pab + mt + df).tobytes()
+        libmetrics.frames_read.inc()
         crc_test = rtk_crc24q(frame, len(frame))
         if crc.tobytes() != crc_test:
+            libmetrics.check_failed.inc('crc')
             msg = self.trace.msg(0, f"CRC error {crc_test.hex()} != {crc.hex}", fg='red')
             return msg
         mt_name = self.MT2NAME.get(mt.u, f"MT {mt.u}")
@@ -366,7 +372,8 @@ def read_from_stdin(qzsl1s,  fp_disp):
     ''' reads and interprets stdin data, and displays the contents
         format: [PRN(8)][L1S RAW(250)][padding(6)]...
     '''
-    raw = sys.stdin.buffer.read(33)
+    with libperf.Measure('read'):
+        raw = libio.fp_in.read(33)
     while raw:
         payload = bitstring.ConstBitStream(raw)
         prn = payload.read(8).u
@@ -375,7 +382,8 @@ def read_from_stdin(qzsl1s,  fp_disp):
         msg = qzsl1s.trace.msg(0, f'PRN{prn:3d}', fg='green') + \
             ': ' + qzsl1s.decode_l1s(l1s)
         qzsl1s.trace.show(0, msg)
-        raw = sys.stdin.buffer.read(33)
+        with libperf.Measure('read'):
+            raw = libio.fp_in.read(33)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
@@ -389,7 +397,27 @@ if __name__ == '__main__':
     parser.add_argument(
         'l1s_files', metavar='file', nargs='*', default=None,
         help='L1S file(s) obtained from the QZS archive, https://sys.qzss.go.jp/dod/archives/slas.html')
+    parser.add_argument(
+        '--input', metavar='FILE',
+        help='read FILE by memory mapping, or by decompression if FILE is gzip, xz, or bzip2 file, or receive from tcp://HOST:PORT or ntrip://[USER[:PASSWD]@]HOST[:PORT]/MOUNTPOINT with reconnection, instead of stdin.')
+    parser.add_argument(
+        '--input-thread', action='store_true',
+        help='decompress --input FILE in a background thread.')
+    parser.add_argument(
+        '--input-retry', metavar='N', type=int, default=0,
+        help='stop after N consecutive reconnection failures of --input URL (0: unlimited), default 0.')
+    parser.add_argument(
+        '--perf-report', action='store_true',
+        help='show performance report of processing stages to stderr at exit.')
+    parser.add_argument(
+        '--metrics', metavar='TARGET',
+        help='export metrics in Prometheus text format to TARGET file rewritten periodically, or to http://127.0.0.1:TARGET/metrics when TARGET is a port number.')
     args = parser.parse_args()
+    libio.open_input(args.input, args.input_thread, args.input_retry)
+    if args.perf_report:
+        libperf.enable()
+    if args.metrics:
+        libmetrics.start(parser.prog, args.metrics)
     fp_disp = sys.stdout
     trace = libtrace.Trace(fp_disp, args.trace, args.color)
     qzsl1s = QzsL1s(trace)
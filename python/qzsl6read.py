@@ -29,10 +29,17 @@ import sys
 
 sys.path.append(os.path.dirname(__file__))
 import libgnsstime
+import libgrid
+import libindex
+import libio
+import libmetrics
+import libperf
+import libserve
 import libqznma
 import libssr
+import libsummary
 import libtrace
-from   rtcmread import send_rtcm, msgnum2satsys, msgnum2mtype
+from   rtcmread import int_set, send_rtcm, msgnum2satsys, msgnum2mtype
 
 try:
     import bitstring
@@ -61,6 +68,11 @@ class QzsL6:
     interval = 0                      # update interval
     mmi      = 0                      # multiple message indication
     iod      = 0                      # SSR issue of data
+    summary  = None                   # message counts for summary mode
+    prn_s    = 0                      # PRN to be read, or 0 for all
+    subtypes = None                   # CSSR subtypes to be decoded, or None for all
+    atmos    = None                   # STEC and troposphere delay at user positions, or None
+    fp_atmos = None                   # output of STEC and troposphere delay
 
     def __init__(self, trace, stat):
         self.trace   = trace
@@ -73,17 +85,20 @@ class QzsL6:
         if self.stat:
             self.ssr.show_cssr_stat()
 
+    @libperf.timed('read')
     def read(self):  # ref. [1]
         ''' reads L6 message and returns True if success in read '''
-        sync = bytes(4)
-        while sync != b'\x1a\xcf\xfc\x1d':
-            b = sys.stdin.buffer.read(1)
+        sync = b'\x1a\xcf\xfc\x1d'
+        while True:
+            nskip = libio.find_sync(libio.fp_in, sync)  # number of skipped bytes
+            if nskip < 0:
+                return False
+            libmetrics.bytes_skipped.inc(n=nskip)
+            b = libio.fp_in.read(1+1+212+32)
             if not b:
                 return False
-            sync = sync[1:4] + b
-        b = sys.stdin.buffer.read(1+1+212+32)
-        if not b:
-            return False
+            if self.prn_s == 0 or b[0] == self.prn_s:
+                break  # skips the message of other PRN
         pos = 0
         self.prn = int.from_bytes(b[pos:pos+1], 'big'); pos += 1
         mtid     = int.from_bytes(b[pos:pos+1], 'big'); pos += 1
@@ -103,6 +118,7 @@ class QzsL6:
         bdata         = bitstring.BitStream(data)
         self.alert    = bdata[0]
         self.dpart    = bdata[1:]
+        libmetrics.frames_read.inc()
         return True
 
     def show(self):
@@ -125,6 +141,23 @@ class QzsL6:
             msg += self.show_unknown_msg()
         self.trace.show(0, msg)
 
+    def summarize(self):
+        ''' counts vendors and CSSR subtypes without decoding message fields '''
+        self.summary.add(self.prn, self.vendor)
+        if self.vendor == "CLAS" or \
+           (self.vendor == "MADOCA-PPP" and self.servid != "Iono"):
+            self.show_cssr_msg()  # CSSR messages are skipped by their length
+
+    def cssr_minute(self):
+        ''' returns hh:mm of the CSSR message from ST1 epoch and hourly epoch '''
+        epoch = self.ssr.epoch
+        if self.ssr.subtype == 1:
+            return libsummary.tod2minute(epoch)
+        hour = epoch // 3600
+        if self.ssr.hepoch < epoch % 3600 - 1800:  # next hour of ST1 epoch
+            hour += 1
+        return libsummary.tod2minute(hour * 3600 + self.ssr.hepoch)
+
     def show_madoca_msg(self):
         ''' returns decoded (old) MADOCA messages '''
         self.tow   = self.dpart.read(20).u
@@ -234,7 +267,10 @@ class QzsL6:
             self.trace.show(0, f"Unknown message number: {self.ssr.msgnum}", fg='red')
             return False
         # CLAS (ref.[1]) and MADOCA-PPP orbit & clock augmentation (ref.[3])
-        if   self.ssr.subtype == 1:
+        wanted = not self.subtypes or self.ssr.subtype in self.subtypes
+        if self.summary or (not wanted and self.ssr.subtype != 1):
+            decoded = self.ssr.skip_cssr_body(self.payload)  # skips by length
+        elif self.ssr.subtype == 1:
             decoded = self.ssr.decode_cssr_st1(self.payload)
         elif self.ssr.subtype == 2:
             decoded = self.ssr.decode_cssr_st2(self.payload)
@@ -261,12 +297,33 @@ class QzsL6:
         else:
             raise Exception(f"Unknown CSSR subtype: {self.ssr.subtype}")
         if decoded:
-            if self.fp_rtcm:
+            if wanted:  # not counting subtypes skipped by --subtype
+                libmetrics.cssr_decoded.inc(str(self.ssr.subtype))
+            if self.summary and wanted:
+                self.summary.add(self.prn, f'ST{self.ssr.subtype}', self.cssr_minute())
+            if self.fp_rtcm and (wanted or self.ssr.subtype == 1):
                 send_rtcm(self.fp_rtcm, self.payload[:self.payload.pos])  # RTCM MT 4073
+            if self.atmos and wanted and self.ssr.subtype in {9, 12}:
+                self.show_atmos()
             self.payload = self.payload[self.payload.pos:]  # discard decoded part
             self.payload.pos = 0
         return decoded
 
+    def show_atmos(self):
+        ''' shows troposphere delay and STEC at the user positions in the
+            network of the last ST9 or ST12 message, a line per user
+        '''
+        names, stec = self.atmos.stec(self.ssr)
+        hydro, wet  = self.atmos.trop(self.ssr)
+        cnid  = self.ssr.cnid
+        etime = f'{self.ssr.hepoch//60:02d}:{self.ssr.hepoch%60:02d}'
+        for user in (self.atmos.nid == cnid).nonzero()[0]:
+            msg = f'{etime} {self.atmos.lat[user]:8.4f} {self.atmos.lon[user]:9.4f} {cnid:2d} {hydro[user]:6.3f} {wet[user]:6.3f}'
+            for sat, value in zip(names, stec[:, user]):
+                if value == value:  # not nan
+                    msg += f' {sat}:{value:{libssr.FMT_TECU}}'
+            print(msg, file=self.fp_atmos)
+
     def show_qznma_msg(self):
         ''' returns decoded QZNMA messages '''
         payload = bitstring.BitStream(self.dpart)
@@ -346,6 +403,76 @@ class QzsL6:
         return ''
 
 
+# Reed-Solomon RS(255,223) encoder of L6 message, CCSDS dual-basis representation
+
+def _rs_tables():
+    ''' returns Reed-Solomon tables:
+        exponential and logarithm tables of GF(2^8) with x^8+x^7+x^2+x+1,
+        generator polynomial coefficients in logarithm,
+        conventional-to-dual and dual-to-conventional basis conversion tables
+    '''
+    gf_exp = [0] * 512
+    gf_log = [0] * 256
+    x = 1
+    for i in range(255):
+        gf_exp[i] = x
+        gf_log[x] = i
+        x <<= 1
+        if x & 0x100:
+            x ^= 0x187
+    for i in range(255, 512):
+        gf_exp[i] = gf_exp[i - 255]
+    gen = [1]  # generator polynomial, prod_{j=112}^{143} (x - alpha^{11j})
+    for j in range(112, 144):
+        root = gf_exp[(11 * j) % 255]
+        ngen = gen + [0]
+        for k in range(len(gen)):
+            if gen[k]:
+                ngen[k + 1] ^= gf_exp[gf_log[gen[k]] + gf_log[root]]
+        gen = ngen
+    gen_log = [gf_log[c] for c in gen[1:]]
+    tal = [0x8d, 0xef, 0xec, 0x86, 0xfa, 0x99, 0xaf, 0x7b]
+    taltab  = [0] * 256  # conventional to dual basis
+    tal1tab = [0] * 256  # dual to conventional basis
+    for i in range(256):
+        for j in range(8):
+            for k in range(8):
+                if i & (1 << k):
+                    taltab[i] ^= tal[7 - k] & (1 << j)
+        tal1tab[taltab[i]] = i
+    return gf_exp, gf_log, gen_log, taltab, tal1tab
+
+RS_EXP, RS_LOG, RS_GEN, RS_TALTAB, RS_TAL1TAB = _rs_tables()
+
+def rs_parity(data):
+    ''' returns 32-byte Reed-Solomon parity of L6 message
+        data: 214 bytes of PRN, MTID, and data part (without preamble)
+    '''
+    parity = [0] * 32
+    for b in data:
+        feedback = RS_TAL1TAB[b] ^ parity[0]
+        parity = parity[1:] + [0]
+        if feedback:
+            lf = RS_LOG[feedback]
+            for k in range(32):
+                parity[k] ^= RS_EXP[lf + RS_GEN[k]]
+    return bytes(RS_TALTAB[p] for p in parity)
+
+@libperf.timed('output')
+def send_l6(fp, prn, mtid, dpart, alert=0):
+    ''' sends L6 message with Reed-Solomon parity
+        dpart: data part in bitstring, padded with zero to 1695 bits
+    '''
+    if not fp:
+        return
+    if len(dpart) > 1695:
+        raise Exception(f'L6 data part should be 1695 bits or less ({len(dpart)})')
+    data = bitstring.pack('u8, u8, u1', prn, mtid, alert) + dpart
+    data += bitstring.Bits(1695 - len(dpart))
+    data = data.tobytes()
+    fp.buffer.write(b'\x1a\xcf\xfc\x1d' + data + rs_parity(data))
+    fp.flush()
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         description='Quasi-zenith satellite (QZS) L6 message read')
@@ -355,6 +482,9 @@ if __name__ == '__main__':
     parser.add_argument(
         '-m', '--message', action='store_true',
         help='show display messages to stderr')
+    parser.add_argument(
+        '-p', '--prn', type=int, default=0,
+        help='read L6 message for specified PRN only.')
     parser.add_argument(
         '-r', '--rtcm', action='store_true',
         help='send RTCM messages to stdout (it also turns off display messages unless -m is specified).')
@@ -364,21 +494,95 @@ if __name__ == '__main__':
     parser.add_argument(
         '-t', '--trace', type=int, default=0,
         help='show display verbosely: 1=subtype detail, 2=subtype and bit image.')
+    parser.add_argument(
+        '--delta', metavar='TOL', type=float,
+        help='show only corrections that changed by more than TOL from the last shown values at trace level 1, with full output at keyframes.')
+    parser.add_argument(
+        '--keyframe', metavar='N', type=int, default=10,
+        help='show all corrections at every N-th mask message for --delta option (0: no keyframe), default 10.')
+    parser.add_argument(
+        '--input', metavar='FILE',
+        help='read FILE by memory mapping, or by decompression if FILE is gzip, xz, or bzip2 file, or receive from tcp://HOST:PORT or ntrip://[USER[:PASSWD]@]HOST[:PORT]/MOUNTPOINT with reconnection, instead of stdin.')
+    parser.add_argument(
+        '--input-thread', action='store_true',
+        help='decompress --input FILE in a background thread.')
+    parser.add_argument(
+        '--input-retry', metavar='N', type=int, default=0,
+        help='stop after N consecutive reconnection failures of --input URL (0: unlimited), default 0.')
+    libindex.add_arguments(parser)
+    parser.add_argument(
+        '--subtype', type=int_set,
+        help='decode only the comma separated CSSR subtypes, such as 3,4, skipping the others by their length (ST1 mask is always decoded).')
+    parser.add_argument(
+        '--summary', action='store_true',
+        help='show counts of vendors and CSSR subtypes per PRN and per minute at the end, skipping message fields by their length (it also turns off display and RTCM messages).')
+    parser.add_argument(
+        '--atmos', metavar='FILE',
+        help='show troposphere delay and STEC at the user positions of lines of latitude and longitude in FILE at every CSSR ST9 and ST12 message (it also turns off display).')
+    libserve.add_arguments(parser)
+    parser.add_argument(
+        '--perf-report', action='store_true',
+        help='show performance report of processing stages to stderr at exit.')
+    parser.add_argument(
+        '--metrics', metavar='TARGET',
+        help='export metrics in Prometheus text format to TARGET file rewritten periodically, or to http://127.0.0.1:TARGET/metrics when TARGET is a port number.')
     args = parser.parse_args()
+    libio.open_input(args.input, args.input_thread, args.input_retry)
+    if args.perf_report:
+        libperf.enable()
+    if args.metrics:
+        libmetrics.start(parser.prog, args.metrics)
+    end = libindex.check_args(args)
     fp_disp, fp_rtcm = sys.stdout, None
     if args.trace < 0:
         libtrace.err(f'trace level should be positive ({args.trace}).')
         sys.exit(1)
+    if (args.delta is not None and args.delta < 0) or args.keyframe < 0:
+        libtrace.err(f'delta tolerance and keyframe interval should be positive ({args.delta}, {args.keyframe}).')
+        sys.exit(1)
+    if args.prn < 0:
+        libtrace.err(f'PRN should be positive ({args.prn}).')
+        sys.exit(1)
     if args.rtcm:  # RTCM message output to stdout
         fp_disp, fp_rtcm = None, sys.stdout
     if args.message:  # show QZS message to stderr
         fp_disp = sys.stderr
+    if args.summary:
+        fp_disp, fp_rtcm = None, None
+    if args.atmos:
+        try:
+            with open(args.atmos) as f:
+                pos = [line.split()[:2] for line in f if line.strip()]
+            lat = [float(p[0]) for p in pos]
+            lon = [float(p[1]) for p in pos]
+        except (OSError, ValueError, IndexError) as e:
+            libtrace.err(f'invalid user position file ({args.atmos}): {e}')
+            sys.exit(1)
+        fp_disp = None
+    server = libserve.open_server(args)
+    if server:  # standard output is sent to TCP clients
+        fp_disp = server if fp_disp is sys.stdout else fp_disp
+        fp_rtcm = server if fp_rtcm is sys.stdout else fp_rtcm
     trace = libtrace.Trace(fp_disp, args.trace, args.color)
     qzsl6 = QzsL6(trace, args.statistics)
     qzsl6.fp_rtcm = fp_rtcm
+    qzsl6.ssr.delta    = args.delta
+    qzsl6.ssr.keyframe = args.keyframe
+    qzsl6.prn_s    = args.prn
+    qzsl6.subtypes = args.subtype
+    if args.atmos:
+        qzsl6.atmos    = libgrid.Atmosphere(lat, lon)
+        qzsl6.fp_atmos = server if server else sys.stdout
+    if args.summary:
+        qzsl6.summary = libsummary.Summary('PRN')
     try:
-        while qzsl6.read():
-            qzsl6.show()
+        while not libindex.reached(libio.fp_in, end) and qzsl6.read():
+            if qzsl6.summary:
+                qzsl6.summarize()
+            else:
+                qzsl6.show()
+        if qzsl6.summary:
+            qzsl6.summary.show()
     except (BrokenPipeError, IOError):
         devnull = os.open(os.devnull, os.O_WRONLY)
         os.dup2(devnull, sys.stdout.fileno())
@@ -0,0 +1,56 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# rawindex.py: byte-offset and GNSS time index builder of raw files
+# A part of QZS L6 Tool, https://github.com/yoronneko/qzsl6tool
+#
+# Copyright (c) 2024 Satoshi Takahashi, all rights reserved.
+#
+# Released under BSD 2-clause license.
+
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+import libindex
+import libtrace
+
+FMT_EXT = {  # raw format from file name extension
+    '.l6': 'l6', '.nov': 'nov', '.sbf': 'sbf', '.sept': 'sbf', '.ubx': 'ubx',
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Byte-offset and GNSS time index builder of raw files')
+    parser.add_argument(
+        'files', metavar='file', nargs='+',
+        help='raw files, and index is written to file.idx')
+    parser.add_argument(
+        '-f', '--format', choices=libindex.INDEX_FMT,
+        help='raw format, default is determined from the file name extension.')
+    parser.add_argument(
+        '-o', '--output', action='store_true',
+        help='send index to stdout instead of file.idx.')
+    args = parser.parse_args()
+    try:
+        for fname in args.files:
+            fmt = args.format or FMT_EXT.get(os.path.splitext(fname)[1].lower())
+            if not fmt:
+                libtrace.err(f'could not determine raw format of {fname}, use -f option.')
+                sys.exit(1)
+            if args.output:
+                n = libindex.build(fname, fmt, sys.stdout)
+            else:
+                with open(fname + '.idx', 'w') as fp:
+                    n = libindex.build(fname, fmt, fp)
+            libtrace.info(f'{fname}: {n} entries ({fmt})')
+    except (BrokenPipeError, IOError):
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(1)
+    except KeyboardInterrupt:
+        libtrace.warn("User break - terminated")
+        sys.exit()
+
+# EOF
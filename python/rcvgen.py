@@ -0,0 +1,229 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# rcvgen.py: synthetic GNSS receiver raw message generation
+# A part of QZS L6 Tool, https://github.com/yoronneko/qzsl6tool
+#
+# Copyright (c) 2024 Satoshi Takahashi, all rights reserved.
+#
+# Released under BSD 2-clause license.
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+import libtrace
+import alstread
+import novread
+import psdrread
+import septread
+import ubxread
+
+try:
+    import bitstring
+except ModuleNotFoundError:
+    libtrace.err('''\
+    This code needs bitstring module.
+    Please install this module such as \"pip install bitstring\".
+    ''')
+    sys.exit(1)
+
+GPSW0   = 2277      # GPS week number of the first message
+GPST0   = 86400000  # GPS time of week of the first message in millisecond
+LEN_RAW = {     # input message length in byte
+    'l6'  : 250,  # QZS L6 frame
+    'e6b' :  63,  # [SVID(8)][C/NAV page(492)][padding(4)]
+    'b2b' : 125,  # BDS B2b frame
+    'inav':  30,  # [SVID(8)][I/NAV(228)][padding(4)]
+    'l1s' :  33,  # [PRN(8)][L1S(250)][padding(6)]
+}
+PERIOD  = {     # message period in millisecond
+    'l6': 1000, 'e6b': 1000, 'b2b': 1000, 'inav': 2000, 'l1s': 1000,
+}
+RCV_SIG = {     # signals that each receiver can output
+    'alst': {'l6'},
+    'nov' : {'e6b'},
+    'psdr': {'l6', 'e6b', 'inav', 'b2b'},
+    'sept': {'l6', 'e6b', 'b2b'},
+    'ubx' : {'inav', 'l1s'},
+}
+
+def read_raw(signame):
+    ''' reads a message of signame from standard input and returns it,
+        or returns empty bytes when EOF is encountered
+    '''
+    if signame == 'l6':  # L6 frames may have padding such as Allystar output
+        sync = bytes(4)
+        while sync != b'\x1a\xcf\xfc\x1d':
+            b = sys.stdin.buffer.read(1)
+            if not b:
+                return b''
+            sync = sync[1:4] + b
+        raw = sys.stdin.buffer.read(LEN_RAW[signame] - 4)
+        return sync + raw if len(raw) == LEN_RAW[signame] - 4 else b''
+    raw = sys.stdin.buffer.read(LEN_RAW[signame])
+    return raw if len(raw) == LEN_RAW[signame] else b''
+
+class RcvGen:
+    "Synthetic GNSS receiver raw message generation class"
+    n_err = 0      # number of corrupted messages
+    n_gbg = 0      # number of inserted garbage
+
+    def __init__(self, receiver, signame, err_rate, gbg_rate, seed, offset=0, jitter=0):
+        self.receiver = receiver
+        self.signame  = signame
+        self.err_rate = err_rate
+        self.gbg_rate = gbg_rate
+        self.rng      = random.Random(seed)
+        self.jitter   = jitter  # maximum error of message time in millisecond
+        # GPS week number, and GPS time of week in millisecond
+        self.gpsw, self.gpst = divmod(GPSW0 * 604800000 + GPST0 + offset, 604800000)
+
+    def encode(self, raw):
+        ''' returns receiver raw message that contains the message '''
+        rcv, sig = self.receiver, self.signame
+        gpsw, gpst = self.gpsw, self.gpst
+        if self.jitter:  # message time may be out of order
+            gpsw, gpst = divmod(gpsw * 604800000 + gpst +
+                self.rng.randint(-self.jitter, self.jitter), 604800000)
+        if rcv == 'alst':
+            return alstread.encode_l6(raw[4], gpsw, gpst, 45, raw)
+        elif rcv == 'nov':
+            return novread.encode_galcnavrawpage(gpsw, gpst, raw[0], raw[1:])
+        elif rcv == 'psdr':
+            if   sig == 'l6' : satid, raw = raw[4], raw
+            elif sig == 'b2b': satid, raw = raw[2] >> 2, raw
+            else             : satid, raw = raw[0], raw[1:]
+            return psdrread.encode_psdr(sig, gpst / 1000, satid, raw)
+        elif rcv == 'sept':
+            if   sig == 'l6' : return septread.encode_qzsrawl6(gpst, gpsw, raw)
+            elif sig == 'e6b': return septread.encode_galrawcnav(gpst, gpsw, raw[0], raw[1:])
+            elif sig == 'b2b': return septread.encode_bdsrawb2b(gpst, gpsw, raw)
+        elif rcv == 'ubx':
+            bits = bitstring.Bits(raw)
+            if   sig == 'inav': return ubxread.encode_galinav(raw[0], bits[8:8+228])
+            elif sig == 'l1s' : return ubxread.encode_qzsl1s(raw[0], bits[8:8+250])
+        raise Exception(f'{rcv} does not support {sig}')
+
+    def garbage(self):
+        ''' returns random garbage bytes, or text line for Pocket SDR log '''
+        n = self.rng.randrange(1, 64)
+        if self.receiver == 'psdr':  # an empty line means the end of log
+            return ''.join(self.rng.choice('$,.0123456789ABCDEF')
+                for _ in range(n)).encode() + b'\n'
+        return bytes(self.rng.randrange(256) for _ in range(n))
+
+    def corrupt(self, msg):
+        ''' returns the message of which a byte is replaced '''
+        msg = bytearray(msg)
+        if self.receiver == 'psdr':  # replaces a hexadecimal digit of the data
+            pos = self.rng.randrange(msg.rindex(b',') + 1, len(msg) - 1)
+            msg[pos] = ord(self.rng.choice(
+                [c for c in '0123456789ABCDEF' if ord(c) != msg[pos]]))
+        else:
+            pos = self.rng.randrange(len(msg))
+            msg[pos] ^= self.rng.randrange(1, 256)
+        return bytes(msg)
+
+    def send(self, fp, raw):
+        ''' sends receiver raw message with garbage and corruption '''
+        msg = self.encode(raw)
+        if self.rng.random() < self.err_rate:
+            msg = self.corrupt(msg)
+            self.n_err += 1
+        if self.rng.random() < self.gbg_rate:
+            msg = self.garbage() + msg
+            self.n_gbg += 1
+        fp.buffer.write(msg)
+        self.gpst += PERIOD[self.signame]
+        if 604800000 <= self.gpst:
+            self.gpst -= 604800000
+            self.gpsw += 1
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Synthetic GNSS receiver raw message generation')
+    parser.add_argument(
+        'receiver', choices=sorted(RCV_SIG),
+        help='receiver raw format: Allystar, NovAtel, Pocket SDR, Septentrio, or u-blox.')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument(
+        '-b', '--b2b', action='store_true',
+        help='read BDS B2b messages from stdin.')
+    group.add_argument(
+        '-e', '--e6b', action='store_true',
+        help='read GAL E6B messages from stdin.')
+    group.add_argument(
+        '-i', '--inav', action='store_true',
+        help='read GAL I/NAV messages from stdin.')
+    group.add_argument(
+        '-l', '--l6', action='store_true',
+        help='read QZS L6 messages from stdin.')
+    group.add_argument(
+        '--l1s', action='store_true',
+        help='read QZS L1S messages from stdin.')
+    parser.add_argument(
+        '-n', '--repeat', type=int, default=1,
+        help='number of repetitions of the input messages (0: endless), default 1.')
+    parser.add_argument(
+        '-s', '--seed', type=int, default=0,
+        help='random seed for corruption, garbage, and time error, default 0.')
+    parser.add_argument(
+        '--error', type=float, default=0,
+        help='rate of messages to be corrupted after checksum calculation, default 0.')
+    parser.add_argument(
+        '--garbage', type=float, default=0,
+        help='rate of messages to be preceded by garbage bytes, default 0.')
+    parser.add_argument(
+        '--offset', type=int, default=0,
+        help='time offset of the first message in millisecond, default 0.')
+    parser.add_argument(
+        '--jitter', type=int, default=0,
+        help='maximum random error of message time in millisecond, so that messages may be out of time order, default 0.')
+    args = parser.parse_args()
+    if   args.b2b : signame = 'b2b'
+    elif args.e6b : signame = 'e6b'
+    elif args.inav: signame = 'inav'
+    elif args.l6  : signame = 'l6'
+    else          : signame = 'l1s'
+    if signame not in RCV_SIG[args.receiver]:
+        libtrace.err(f'{args.receiver} raw format does not contain {signame} messages.')
+        sys.exit(1)
+    if args.repeat < 0:
+        libtrace.err(f'number of repetitions should be positive ({args.repeat}).')
+        sys.exit(1)
+    if not 0 <= args.error <= 1 or not 0 <= args.garbage <= 1:
+        libtrace.err(f'error and garbage rates should be in 0-1 ({args.error}, {args.garbage}).')
+        sys.exit(1)
+    if args.offset < 0 or args.jitter < 0:
+        libtrace.err(f'time offset and jitter should be positive ({args.offset}, {args.jitter}).')
+        sys.exit(1)
+    gen = RcvGen(args.receiver, signame, args.error, args.garbage, args.seed,
+        args.offset, args.jitter)
+    try:
+        raws = []  # input messages for repetition
+        raw = read_raw(signame)
+        while raw:
+            gen.send(sys.stdout, raw)
+            if args.repeat != 1:
+                raws.append(raw)
+            raw = read_raw(signame)
+        n = 1
+        while raws and (args.repeat == 0 or n < args.repeat):
+            for raw in raws:
+                gen.send(sys.stdout, raw)
+            n += 1
+        sys.stdout.flush()
+        if gen.n_err or gen.n_gbg:
+            libtrace.info(f'{gen.n_err} corrupted messages, {gen.n_gbg} garbage insertions')
+    except (BrokenPipeError, IOError):
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(1)
+    except KeyboardInterrupt:
+        libtrace.warn("User break - terminated")
+        sys.exit()
+
+# EOF
@@ -0,0 +1,336 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# rcvmux.py: multiple receiver raw message read in a process
+# A part of QZS L6 Tool, https://github.com/yoronneko/qzsl6tool
+#
+# Copyright (c) 2024 Satoshi Takahashi, all rights reserved.
+#
+# Released under BSD 2-clause license.
+
+import argparse
+import asyncio
+import heapq
+import os
+import stat
+import sys
+import time
+import types
+
+sys.path.append(os.path.dirname(__file__))
+import alstread
+import libgnsstime
+import libio
+import libmetrics
+import libperf
+import libtrace
+import novread
+import psdrread
+import septread
+import ubxread
+
+WEEK_MS = 7 * 86400 * 1000  # milliseconds in a GPS week
+SPIN    = 0.002             # time in second waited by busy loop before emission
+
+def decode_alst(rcv, sig):
+    ''' shows Allystar message, and returns L6 frame of the strongest
+        satellite when the epoch changes '''
+    rcv.select_sat(0)
+    return rcv.l6
+
+def decode_nov(rcv, sig):
+    ''' shows NovAtel message, and returns raw message of the signal '''
+    if   rcv.msg_name == 'GALCNAVRAWPAGE':
+        msg = rcv.galcnavrawpage()
+    elif rcv.msg_name == 'QZSSRAWSUBFRAME':
+        msg = rcv.qzssrawsubframe()
+    else:
+        msg = rcv.trace.msg(0, libgnsstime.gps2utc(rcv.gpsw, rcv.gpst // 1000), fg='green') + ' ' + rcv.trace.msg(0, rcv.msg_name, dec='dark')
+        rcv.raw = bytearray()
+    rcv.trace.show(0, msg)
+    if (sig == 'e6b'  and rcv.msg_name == 'GALCNAVRAWPAGE' ) or \
+       (sig == 'lnav' and rcv.msg_name == 'QZSSRAWSUBFRAME'):
+        return rcv.raw
+
+def decode_psdr(rcv, sig):
+    ''' shows Pocket SDR log, and returns raw message of the signal '''
+    rcv.trace.show(0, rcv.msg)
+    if rcv.signame == sig:
+        return rcv.raw
+
+def decode_sept(rcv, sig):
+    ''' shows Septentrio message, and returns raw message of the signal '''
+    if   rcv.msg_name == 'GALRawCNAV':
+        msg = rcv.galrawcnav()
+    elif rcv.msg_name == 'QZSRawL6':
+        msg = rcv.qzsrawl6()
+    elif rcv.msg_name == 'BDSRawB2b':
+        msg = rcv.bdsrawb2b()
+    else:
+        msg = rcv.trace.msg(0, rcv.msg_name, dec='dark')
+        rcv.raw = bytearray()
+    rcv.trace.show(0, msg)
+    if (sig == 'e6b' and rcv.msg_name == 'GALRawCNAV') or \
+       (sig == 'l6'  and rcv.msg_name == 'QZSRawL6'  ) or \
+       (sig == 'b2b' and rcv.msg_name == 'BDSRawB2b' ):
+        return rcv.raw
+
+def decode_ubx(rcv, sig):
+    ''' shows u-blox message, and returns raw message of the signal '''
+    rcv.trace.show(0, rcv.msg)
+    if   sig == 'l1s' : return rcv.decode_qzsl1s(types.SimpleNamespace(duplicate=False))
+    elif sig == 'lnav': return rcv.decode_gnsslnav()
+    elif sig == 'inav': return rcv.decode_galinav()
+
+def time_alst(rcv):
+    ''' returns GPS time in millisecond of the epoch selected by decode_alst '''
+    return rcv.gpsw * WEEK_MS + rcv.last_gpst
+
+def time_nov(rcv):
+    ''' returns GPS time in millisecond of NovAtel header '''
+    return rcv.gpsw * WEEK_MS + rcv.gpst
+
+def time_sept(rcv):
+    ''' returns GPS time in millisecond of SBF header, or None if unknown '''
+    if rcv.wnc == 65535:  # do-not-use value
+        return None
+    return rcv.wnc * WEEK_MS + rcv.tow
+
+RECEIVER = {  # receiver class, decode function, signals of raw output, and time function
+    'alst': (alstread.AllystarReceiver, decode_alst, {'l6'}                     , time_alst),
+    'nov' : (novread.NovReceiver      , decode_nov , {'e6b', 'lnav'}            , time_nov ),
+    'psdr': (psdrread.PocketSdr       , decode_psdr, {'l6', 'e6b', 'inav', 'b2b'}, None     ),
+    'sept': (septread.SeptReceiver    , decode_sept, {'l6', 'e6b', 'b2b'}       , time_sept),
+    'ubx' : (ubxread.UbxReceiver      , decode_ubx , {'l1s', 'lnav', 'inav'}    , None     ),
+}
+
+class Stream:
+    "Input stream that has its own receiver, decoder context, and output"
+
+    def __init__(self, n, spec, template=None, color=False, merge=False, retry=0):
+        name, _, rest = spec.partition(':')
+        sig, _, self.source = rest.partition(':')
+        if name not in RECEIVER or not self.source:
+            raise ValueError(f'invalid stream {spec}, should be RECEIVER:SIGNAL:SOURCE with RECEIVER of {", ".join(RECEIVER)}')
+        rcv_class, self.decode, sigs, self.time = RECEIVER[name]
+        if sig != 'disp' and sig not in sigs:
+            raise ValueError(f'invalid stream {spec}, SIGNAL of {name} should be disp, {", ".join(sorted(sigs))}')
+        if merge and (sig == 'disp' or not self.time):
+            raise ValueError(f'invalid stream {spec} for merge, which needs raw messages with receiver time (alst, nov, sept)')
+        self.sig   = sig
+        self.fp_in = libio.FeedInput()
+        if merge:  # read in the order of merge instead of arrival
+            self.fp_in = libio.fp_in if self.source == '-' else \
+                libio.open_file(self.source, retry=retry)
+        fp_out = sys.stdout  # merged output
+        if template:         # output per stream
+            fp_out = open(template.format(n=n, rcv=name, sig=sig), 'w')
+        fp_disp, self.fp_raw = (fp_out, None) if sig == 'disp' else (None, fp_out)
+        self.rcv   = rcv_class(libtrace.Trace(fp_disp, 0, color), self.fp_in)
+        self.done  = False
+
+    async def put(self, data):
+        ''' decodes the frames received entirely, and keeps the rest
+            until the next data; empty data means end of stream
+        '''
+        if self.done:
+            return
+        if data:
+            self.fp_in.feed(data)
+        else:
+            self.fp_in.eof = True
+        while True:
+            self.fp_in.begin()
+            try:
+                if not self.rcv.read():
+                    self.done = True
+                    return
+            except libio.Incomplete:
+                self.fp_in.rollback()
+                return
+            raw = self.decode(self.rcv, self.sig)
+            if raw and self.fp_raw:
+                self.fp_raw.buffer.write(raw)
+                self.fp_raw.flush()
+
+    def frames(self):
+        ''' yields GPS time in millisecond and raw message of the stream,
+            where the last known time is used for unknown time
+        '''
+        gpst = 0
+        while self.rcv.read():
+            gpst = self.time(self.rcv) or gpst  # before decoding
+            raw = self.decode(self.rcv, self.sig)
+            if raw:
+                yield gpst, raw
+
+    async def receive(self, retry=0):
+        ''' reads the source of the stream until the end '''
+        if '://' in self.source:
+            await libio.NetSource(self.source, retry).receive_loop(self.put)
+        else:
+            await read_file(self.source, self.put)
+
+async def read_file(fname, put):
+    ''' calls coroutine put with the data of file, FIFO, or stdin (-),
+        and with empty bytes at the end
+    '''
+    if fname == '-':
+        fp = sys.stdin.buffer
+    else:  # opening FIFO waits for the writer
+        fp = await asyncio.to_thread(open, fname, 'rb')
+    if stat.S_ISREG(os.fstat(fp.fileno()).st_mode):
+        magic = fp.peek(6)[:6]
+        for head, open_func in libio.DECOMP:
+            if magic.startswith(head):
+                fp = open_func(fp, 'rb')
+                break
+        while data := await asyncio.to_thread(fp.read, libio.BUFSIZE):
+            await put(data)
+    else:  # pipe, FIFO, socket, or terminal waited by the selector
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), fp)
+        while data := await reader.read(libio.RECV_SIZE):
+            await put(data)
+    await put(b'')
+
+def reorder(frames, window):
+    ''' yields frames of (time, raw) in time order, where frames may be
+        out of order within window frames
+    '''
+    heap = []
+    for seq, (gpst, raw) in enumerate(frames):  # seq keeps arrival order
+        heapq.heappush(heap, (gpst, seq, raw))
+        if window < len(heap):
+            gpst, _, raw = heapq.heappop(heap)
+            yield gpst, raw
+    while heap:
+        gpst, _, raw = heapq.heappop(heap)
+        yield gpst, raw
+
+def merge(streams, window=0):
+    ''' yields (time, raw) of the streams in time order by k-way merge,
+        holding a frame and window frames for reordering per stream
+    '''
+    return heapq.merge(*(reorder(stream.frames(), window) for stream in streams),
+        key=lambda frame: frame[0])
+
+class Pacer:
+    "Scheduler that paces frames by their GPS time for replay"
+
+    def __init__(self, speed=0):
+        self.speed  = speed  # factor of real time, 0: as fast as possible
+        self.n      = 0      # number of frames
+        self.t0     = 0      # GPS time of the first frame in millisecond
+        self.t1     = 0      # GPS time of the last  frame in millisecond
+        self.w0     = 0.     # wall clock time of the first frame in second
+        self.w1     = 0.     # wall clock time of the last  frame in second
+        self.jitter = libperf.Reservoir()  # emission delay after schedule in second
+
+    def wait(self, gpst):
+        ''' waits until the schedule of the frame of GPS time in
+            millisecond, sleeping and then spinning for precise timing
+        '''
+        now = time.perf_counter()
+        if self.n == 0:
+            self.t0, self.w0 = gpst, now
+        if self.speed:
+            target = self.w0 + (gpst - self.t0) / 1000 / self.speed
+            if now < target - SPIN:
+                time.sleep(target - SPIN - now)
+            while (now := time.perf_counter()) < target:
+                pass
+            self.jitter.add(now - target)
+        self.n += 1
+        self.t1, self.w1 = gpst, now
+
+    def report(self, fp=sys.stderr):
+        ''' prints achieved and target rate, and scheduling jitter '''
+        span = self.w1 - self.w0
+        rate = (self.n - 1) / span if span > 0 else 0
+        print(f'replay report: {self.n} messages in {span:.3f} s, speed {self.speed or "unlimited"}', file=fp)
+        target = 'unlimited'
+        if self.speed and self.t0 < self.t1:
+            target = f'{(self.n - 1) / ((self.t1 - self.t0) / 1000 / self.speed):.2f}'
+        print(f'rate [msg/s]: target {target}, achieved {rate:.2f}', file=fp)
+        if self.jitter.n:
+            print(f'jitter [ms]: mean {self.jitter.mean() * 1e3:.3f}, '
+                  f'p99 {self.jitter.percentile(99) * 1e3:.3f}, '
+                  f'max {self.jitter.max * 1e3:.3f}', file=fp)
+
+async def run(streams, retry=0):
+    await asyncio.gather(*(stream.receive(retry) for stream in streams))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Multiple receiver raw message read in a process')
+    parser.add_argument(
+        'stream', metavar='RECEIVER:SIGNAL:SOURCE', nargs='+',
+        help=f'read SOURCE of RECEIVER ({", ".join(RECEIVER)}), and send raw messages of SIGNAL (l6, e6b, b2b, inav, l1s, or lnav) or display messages (disp). SOURCE is file (gzip, xz, or bzip2 file is decompressed), FIFO, stdin (-), tcp://HOST:PORT, or ntrip://[USER[:PASSWD]@]HOST[:PORT]/MOUNTPOINT.')
+    parser.add_argument(
+        '-c', '--color', action='store_true',
+        help='apply ANSI color escape sequences even for non-terminal.')
+    parser.add_argument(
+        '-o', '--output', metavar='TEMPLATE',
+        help='write the output of each stream to a file named by TEMPLATE with {n} (stream number from 0), {rcv}, and {sig}, instead of merging all to stdout.')
+    parser.add_argument(
+        '-m', '--merge', action='store_true',
+        help='send raw messages of all the streams in GPS time order of the receiver headers (alst, nov, and sept), instead of arrival order.')
+    parser.add_argument(
+        '-w', '--window', metavar='N', type=int, default=0,
+        help='reorder raw messages out of order within N messages of each stream for --merge option, default 0.')
+    parser.add_argument(
+        '-r', '--replay', metavar='SPEED', type=float,
+        help='pace raw messages for --merge option by their GPS time at SPEED times real time (0: as fast as possible), and show the achieved rate and scheduling jitter to stderr at the end.')
+    parser.add_argument(
+        '--input-retry', metavar='N', type=int, default=0,
+        help='stop a stream after N consecutive reconnection failures of URL SOURCE (0: unlimited), default 0.')
+    parser.add_argument(
+        '--perf-report', action='store_true',
+        help='show performance report of processing stages to stderr at exit.')
+    parser.add_argument(
+        '--metrics', metavar='TARGET',
+        help='export metrics in Prometheus text format to TARGET file rewritten periodically, or to http://127.0.0.1:TARGET/metrics when TARGET is a port number.')
+    args = parser.parse_args()
+    if args.perf_report:
+        libperf.enable()
+    if args.metrics:
+        libmetrics.start(parser.prog, args.metrics)
+    if args.merge and (args.output or args.window < 0):
+        libtrace.err('--merge option sends all to stdout with non-negative --window.')
+        sys.exit(1)
+    if args.replay is not None and (not args.merge or args.replay < 0):
+        libtrace.err('--replay option needs --merge option and non-negative SPEED.')
+        sys.exit(1)
+    try:
+        streams = [Stream(n, spec, args.output, args.color, args.merge, args.input_retry)
+            for n, spec in enumerate(args.stream)]
+    except (OSError, ValueError, KeyError, IndexError) as e:
+        libtrace.err(f'stream error: {e}')
+        sys.exit(1)
+    try:
+        if args.merge:
+            pacer = Pacer(args.replay) if args.replay is not None else None
+            for gpst, raw in merge(streams, args.window):
+                if pacer:
+                    pacer.wait(gpst)
+                sys.stdout.buffer.write(raw)
+                sys.stdout.flush()
+            if pacer:
+                pacer.report()
+        else:
+            asyncio.run(run(streams, args.input_retry))
+    except OSError as e:
+        if isinstance(e, BrokenPipeError):
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, sys.stdout.fileno())
+            sys.exit(1)
+        libtrace.err(f'input error: {e}')
+        sys.exit(1)
+    except KeyboardInterrupt:
+        libtrace.warn("User break - terminated")
+        sys.exit()
+
+# EOF
@@ -35,7 +35,11 @@ import sys
 sys.path.append(os.path.dirname(__file__))
 import ecef2llh
 import libeph
+import libio
+import libmetrics
+import libperf
 import libssr
+import libsummary
 import libtrace
 
 try:
@@ -59,6 +63,9 @@ class Rtcm:
 
     readbuf = b''  # read buffer, used as static variable
     payload = bitstring.ConstBitStream()
+    msgnums = None  # message numbers to be read, or None for all
+    precise = None  # output of SSR corrected orbits and clocks, or None
+    ssr_tow = None  # GPS time of week of the last SSR clock epoch
 
     def __init__(self, trace):
         self.trace   = trace
@@ -69,7 +76,36 @@ class Rtcm:
         self.eph_bds = libeph.EphBds(trace)  # BeiDou  ephemeris
         self.eph_irn = libeph.EphIrn(trace)  # NavIC   ephemeris
         self.ssr     = libssr.Ssr(trace)
+        self.ssr_orb = libeph.SsrOrbit({'G': self.eph_gps, 'R': self.eph_glo,
+            'E': self.eph_gal, 'J': self.eph_qzs, 'C': self.eph_bds})
 
+    def show_eph(self, fp):
+        ''' writes decoded ephemerides of all satellite systems '''
+        self.eph_gps.table.show(fp, 'G')
+        self.eph_glo.table.show(fp, 'R')
+        self.eph_gal.table.show(fp, 'E')
+        self.eph_qzs.table.show(fp, 'J')
+        self.eph_bds.table.show(fp, 'C')
+        self.eph_irn.table.show(fp, 'I')
+
+    def show_satpos(self, fp, tow):
+        ''' writes satellite positions at GPS time of week tow '''
+        for satsys, eph, dt in (
+                ('G', self.eph_gps, 0), ('R', self.eph_glo, 3 * 3600 - libeph.GPST_UTC),
+                ('E', self.eph_gal, 0), ('J', self.eph_qzs, 0),
+                ('C', self.eph_bds, -libeph.BDT_GPST), ('I', self.eph_irn, 0)):
+            rows = eph.table.current()
+            if not len(rows):
+                continue
+            if satsys == 'R':  # in Moscow time of day
+                pos, vel, dts = libeph.GloOrbit(rows).propagate(tow + dt)
+            else:
+                pos, vel, dts = libeph.kepler(rows, tow + dt, satsys)
+            for svid, p, v, t in zip(rows['svid'], pos[:, 0], vel[:, 0], dts[:, 0]):
+                print(f'{satsys}{svid:02d} {p[0]:15.3f} {p[1]:15.3f} {p[2]:15.3f} '
+                      f'{v[0]:10.4f} {v[1]:10.4f} {v[2]:10.4f} {t*1e9:14.3f}', file=fp)
+
+    @libperf.timed('read')
     def read(self):
         '''returns true if successfully reading an RTCM message'''
         BUFMAX = 1000  # maximum length of buffering RTCM message
@@ -78,7 +114,7 @@ class Rtcm:
             if BUFMAX < len(self.readbuf):
                 libtrace.err("RTCM buffer exhausted")
                 return False
-            b = sys.stdin.buffer.read(BUFADD)
+            b = libio.fp_in.read(BUFADD)
             if not b:
                 return False
             self.readbuf += b
@@ -90,6 +126,7 @@ class Rtcm:
                     found_sync = True
                 else:
                     pos += 1
+            libmetrics.bytes_skipped.inc(n=pos)
             if not found_sync:
                 self.readbuf = b''
                 continue
@@ -106,15 +143,31 @@ class Rtcm:
             frame = b'\xd3' + bl + bp
             if bc != rtk_crc24q(frame, len(frame)):     # CRC error
                 libtrace.err("CRC error")
+                libmetrics.check_failed.inc('crc')
+                libmetrics.bytes_skipped.inc()
                 self.readbuf = self.readbuf[pos+1:]
                 continue
             else:  # read properly
                 self.readbuf = self.readbuf[pos+3+mlen+3:]
+                if self.msgnums and int.from_bytes(bp[:2], 'big') >> 4 not in self.msgnums:
+                    continue  # skips unwanted message by its length
                 break
+        libmetrics.frames_read.inc()
         self.payload = bitstring.ConstBitStream(bp)
         return True
 
     def decode(self):
+        msgnum = self.payload.peek('u12')  # message number
+        with libperf.Measure('decode', f'RTCM {msgnum}'):
+            satsys, mtype, msg = self.decode_message()
+        self.trace.show(0, msg)
+        if self.precise:
+            self.show_precise(satsys, mtype)
+
+    def decode_message(self):
+        ''' returns satellite system, message type, and display message
+            of the RTCM message
+        '''
         msgnum = self.payload.read('u12')  # message number
         satsys = msgnum2satsys(msgnum)
         mtype  = msgnum2mtype(msgnum)
@@ -171,7 +224,53 @@ class Rtcm:
             self.payload.pos += 8 - (self.payload.pos % 8)
         if self.payload.pos != len(self.payload.bin):
             msg += self.trace.msg(0, f' packet size mismatch: expected {len(self.payload.bin)}, actual {self.payload.pos}', fg='red')
-        self.trace.show(0, msg)
+        return satsys, mtype, msg
+
+    def show_precise(self, satsys, mtype):
+        ''' writes SSR corrected orbits and clocks of the satellite
+            system at the epoch of clock corrections
+        '''
+        ssr = self.ssr
+        if mtype == 'SSR clock' and satsys == 'R':  # in the last GPS day
+            if self.ssr_tow is None:
+                return
+            tod = (ssr.ssr_epoch - 3 * 3600 + libeph.GPST_UTC) % libeph.DAY_S
+            tow = self.ssr_tow - self.ssr_tow % libeph.DAY_S + tod
+            tow += libeph.DAY_S * round((self.ssr_tow - tow) / libeph.DAY_S)
+            systems = ['R']
+        elif mtype == 'SSR clock':
+            tow = ssr.ssr_epoch + (libeph.BDT_GPST if satsys == 'C' else 0)
+            systems = [satsys]
+        elif mtype == 'CSSR' and ssr.subtype == 3:  # hourly epoch after mask
+            tow = ssr.epoch - ssr.epoch % 3600 + ssr.hepoch
+            if ssr.hepoch < ssr.epoch % 3600 - 1800:
+                tow += 3600
+            systems = None
+        else:
+            return
+        tow = self.ssr_tow = tow % libeph.WEEK_S
+        names, pos, dts = self.ssr_orb.compute(tow, ssr.orbit, ssr.clock,
+            ssr.orbit_rate, ssr.clock_rate, systems)
+        for name, p, t in zip(names, pos, dts):
+            print(f'{name} {tow:6d} {p[0]:15.3f} {p[1]:15.3f} {p[2]:15.3f} {t*1e9:14.3f}', file=self.precise)
+
+    def summarize(self, summary):
+        ''' counts message numbers per satellite system and per minute
+            from message header, without decoding message fields
+        '''
+        msgnum = self.payload.read('u12')  # message number
+        satsys = msgnum2satsys(msgnum)
+        mtype  = msgnum2mtype(msgnum)
+        item   = str(msgnum)
+        minute = None
+        if mtype == 'CSSR':
+            item += f'.ST{self.payload.read("u4")}'  # subtype
+        elif 'MSM' in mtype and satsys != 'R':
+            self.payload.pos += 12  # reference station id
+            minute = libsummary.tod2minute(self.payload.read('u30') // 1000)
+        elif 'SSR' in mtype and satsys != 'R' and 1000 < msgnum:
+            minute = libsummary.tod2minute(self.payload.read('u20'))
+        summary.add(satsys if satsys else '-', item, minute)
 
     def decode_ant_info(self, msgnum):
         '''returns decoded antenna and receiver information '''
@@ -434,6 +533,7 @@ class Rtcm:
                 msg1 += ' *'  # denotes half-cycle ambiguity
         return msg + self.trace.msg(1, msg1)
 
+@libperf.timed('output')
 def send_rtcm(fp, rtcm_payload):
     if not fp:
         return
@@ -444,6 +544,13 @@ def send_rtcm(fp, rtcm_payload):
     fp.buffer.write(rtcm_crc)
     fp.flush()
 
+def int_set(arg):
+    ''' returns set of integers from comma separated option argument '''
+    try:
+        return {int(x) for x in arg.split(',')}
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'comma separated integers expected ({arg})')
+
 def msgnum2satsys(msgnum):  # message number to satellite system
     satsys = ''
     if   msgnum in {1001, 1002, 1003, 1004, 1019, 1071, 1072, 1073, 1074,
@@ -609,6 +716,7 @@ tbl_CRC24Q = [
 
 # CRC24Q for RTCM3, (1+x)(x^23+x^17+x^13+x^12+x^11+x^9+x^8+x^7+x^5+x^3+1)
 
+@libperf.timed('crc')
 def rtk_crc24q(buff, length):
     crc = 0
     for i in range(length):
@@ -625,16 +733,69 @@ if __name__ == '__main__':
     parser.add_argument(
         '-t', '--trace', type=int, default=0,
         help='show display verbosely: 1=subtype detail, 2=subtype and bit image.')
+    parser.add_argument(
+        '--msgnum', type=int_set,
+        help='read only the comma separated message numbers, such as 1077,1097, skipping the others without decoding.')
+    parser.add_argument(
+        '--input', metavar='FILE',
+        help='read FILE by memory mapping, or by decompression if FILE is gzip, xz, or bzip2 file, or receive from tcp://HOST:PORT or ntrip://[USER[:PASSWD]@]HOST[:PORT]/MOUNTPOINT with reconnection, instead of stdin.')
+    parser.add_argument(
+        '--input-thread', action='store_true',
+        help='decompress --input FILE in a background thread.')
+    parser.add_argument(
+        '--input-retry', metavar='N', type=int, default=0,
+        help='stop after N consecutive reconnection failures of --input URL (0: unlimited), default 0.')
+    parser.add_argument(
+        '--summary', action='store_true',
+        help='show counts of message numbers per satellite system and per minute at the end, reading message headers only (it also turns off display).')
+    parser.add_argument(
+        '--eph', action='store_true',
+        help='show decoded ephemerides in SI units, a line per satellite and IODE, at the end (it also turns off display).')
+    parser.add_argument(
+        '--satpos', metavar='TOW', type=float,
+        help='show ECEF position, velocity, and clock offset of satellites at GPS time of week TOW from the last decoded ephemerides at the end (it also turns off display).')
+    parser.add_argument(
+        '--precise', action='store_true',
+        help='show ECEF position and clock offset of satellites corrected by SSR orbit and clock corrections with broadcast ephemerides of the same IODE at every epoch of clock corrections (it also turns off display).')
+    parser.add_argument(
+        '--perf-report', action='store_true',
+        help='show performance report of processing stages to stderr at exit.')
+    parser.add_argument(
+        '--metrics', metavar='TARGET',
+        help='export metrics in Prometheus text format to TARGET file rewritten periodically, or to http://127.0.0.1:TARGET/metrics when TARGET is a port number.')
     args = parser.parse_args()
+    libio.open_input(args.input, args.input_thread, args.input_retry)
+    if args.perf_report:
+        libperf.enable()
+    if args.metrics:
+        libmetrics.start(parser.prog, args.metrics)
     fp_disp = sys.stdout       # message display file pointer
     if args.trace < 0:
         libtrace.err(f'trace level should be positive ({args.trace}).')
         sys.exit(1)
+    summary = None
+    if args.summary:
+        fp_disp = None
+        summary = libsummary.Summary('satsys')
+    if args.eph or args.satpos is not None or args.precise:
+        fp_disp = None
     trace = libtrace.Trace(fp_disp, args.trace, args.color)
     rtcm = Rtcm(trace)
+    rtcm.msgnums = args.msgnum
+    if args.precise:
+        rtcm.precise = sys.stdout
     try:
         while rtcm.read():
-            rtcm.decode()
+            if summary:
+                rtcm.summarize(summary)
+            else:
+                rtcm.decode()
+        if summary:
+            summary.show()
+        if args.eph:
+            rtcm.show_eph(sys.stdout)
+        if args.satpos is not None:
+            rtcm.show_satpos(sys.stdout, args.satpos)
     except (BrokenPipeError, IOError):
         devnull = os.open(os.devnull, os.O_WRONLY)
         os.dup2(devnull, sys.stdout.fileno())
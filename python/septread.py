@@ -18,6 +18,10 @@ import sys
 
 sys.path.append(os.path.dirname(__file__))
 import libgnsstime
+import libindex
+import libio
+import libmetrics
+import libperf
 import libtrace
 
 LEN_BCNAV3      = 125  # BDS CNAV3 page size is 1000 sym (125 byte)
@@ -30,6 +34,7 @@ SEPT_MSG_NAME = {      # dictionary for obtaining message name from ID
         4242: 'BDSRawB2b' ,  # ref.[1] p.288
 }
 
+@libperf.timed('crc')
 def crc16_ccitt(data):
     crc = 0
     polynomial = 0x1021
@@ -52,24 +57,63 @@ def u4perm(inblk, outblk):
     outblk[2::4] = inblk[1::4]
     outblk[3::4] = inblk[0::4]
 
+def encode_sbf(msg_id, tow, wnc, body):
+    ''' returns SBF block with CRC and padding, [1]
+        tow: time of week in millisecond, wnc: week number
+    '''
+    block = tow.to_bytes(4, 'little') + wnc.to_bytes(2, 'little') + body
+    block += bytes(-(len(block) + 8) % 4)  # the block length should be multiple of 4
+    head = msg_id.to_bytes(2, 'little') + (len(block) + 8).to_bytes(2, 'little')
+    return b'\x24\x40' + crc16_ccitt(head + block) + head + block
+
+def encode_galrawcnav(tow, wnc, satid, cnav, crc_passed=1):
+    ''' returns GALRawCNAV (4024) block, ref.[1] p.282
+        cnav: C/NAV page of 62 bytes
+    '''
+    nav_bits = bytearray(64)
+    u4perm((cnav + bytes(64))[:64], nav_bits)
+    body = bytes([satid + 70, crc_passed, 0, 19, 0, 0]) + nav_bits
+    return encode_sbf(4024, tow, wnc, body)
+
+def encode_qzsrawl6(tow, wnc, l6, parity=1):
+    ''' returns QZSRawL6 (4069) block, ref.[2] p.267
+        l6: QZS L6 frame of 250 bytes
+    '''
+    nav_bits = bytearray(252)
+    u4perm(l6[:LEN_L6_FRM] + bytes(252 - LEN_L6_FRM), nav_bits)
+    body = bytes([l6[4] - 12, parity, 0, 1, 0, 0]) + nav_bits  # PRN to SVID
+    return encode_sbf(4069, tow, wnc, body)
+
+def encode_bdsrawb2b(tow, wnc, b2b, crc_passed=1):
+    ''' returns BDSRawB2b (4242) block, ref.[1] p.288
+        b2b: BDS B2b frame of 125 bytes beginning with preamble
+    '''
+    satid = b2b[2] >> 2  # PRN follows the preamble
+    nav_bits = bytearray(124)
+    u4perm(b2b[2:LEN_BCNAV3] + bytes(124 - LEN_BCNAV3 + 2), nav_bits)
+    svid = satid + 140 if satid <= 40 else satid + 182
+    body = bytes([svid, crc_passed, 0, 34, 0, 0]) + nav_bits
+    return encode_sbf(4242, tow, wnc, body)
+
 
 class SeptReceiver:
     raw = b''
 
-    def __init__(self, trace):
+    def __init__(self, trace, fp=None):
         self.trace = trace
+        self.fp    = fp or libio.fp_in  # own input for multiplexer
 
+    @libperf.timed('read')
     def read(self):
         ''' reads standard input as SBF raw, [1]
             and returns true if successful '''
         while True:
-            sync = bytes(2)
-            while sync != b'\x24\x40':
-                b = sys.stdin.buffer.read(1)
-                if not b:
-                    return False
-                sync = sync[1:2] + b
-            head = sys.stdin.buffer.read(6)
+            sync = b'\x24\x40'
+            nskip = libio.find_sync(self.fp, sync)  # number of skipped bytes
+            if nskip < 0:
+                return False
+            libmetrics.bytes_skipped.inc(n=nskip)
+            head = self.fp.read(6)
             if not head:
                 return False
             crc     =                head[0:2]
@@ -79,18 +123,22 @@ class SeptReceiver:
                 # the message length should be multiple of 4 as in [1].
                 libtrace.err(f'message length {msg_len} should be multiple of 4')
                 return False
-            payload = sys.stdin.buffer.read(msg_len - 8)
+            payload = self.fp.read(msg_len - 8)
             if not payload:
                 return False
-            crc_cal = crc16_ccitt(head[2:6] + payload)
+            crc_cal = crc16_ccitt(bytes(head[2:6]) + payload)
             if crc_cal == crc:
                 break
             else:
                 libtrace.err(f'CRC Error: {crc.hex()} != {crc_cal.hex()}')
+                libmetrics.check_failed.inc('crc')
                 continue
+        libmetrics.frames_read.inc()
         self.msg_id   = msg_id
         self.msg_name = SEPT_MSG_NAME.get(msg_id, f"MT{msg_id}")
         self.payload  = payload
+        self.tow      = int.from_bytes(payload[0:4], 'little')  # ms
+        self.wnc      = int.from_bytes(payload[4:6], 'little')
         return True
 
     def galrawcnav(self):
@@ -114,6 +162,7 @@ class SeptReceiver:
             self.trace.msg(0, self.msg_name, fg='cyan') + \
             self.trace.msg(0, f' E{self.satid:02d} ', fg='yellow')
         if crc_passed != 1:  # CRC check failed
+            libmetrics.check_failed.inc('crc')
             return msg + self.trace.msg(0, 'CRC Error', fg='red') + ' ' + self.raw.hex()
         e6b = bytearray(64)
         u4perm(nav_bits, e6b)
@@ -141,6 +190,7 @@ class SeptReceiver:
             self.trace.msg(0, self.msg_name, fg='cyan') + \
             self.trace.msg(0, f' J{self.satid:02d}({"L6D" if source == 1 else "L6E"}) ', fg='yellow')
         if parity == 0:  # parity check failed
+            libmetrics.check_failed.inc('parity')
             return msg + self.trace.msg(0, 'Parity Error', fg='red') + ' ' + self.raw.hex()
         l6         = bytearray(252)
         u4perm(nav_bits, l6)
@@ -168,6 +218,7 @@ class SeptReceiver:
             self.trace.msg(0, f' C{self.satid:02d} ', fg='yellow')
         # see ref.[1] p.259 for converting from svid to sat code.
         if crc_passed != 1:  # CRC check failed
+            libmetrics.check_failed.inc('crc')
             return msg + self.trace.msg(0, 'CRC Error', fg='red') + ' ' + self.raw.hex()
         b2b   = bytearray(124)
         u4perm(nav_bits, b2b)
@@ -191,16 +242,41 @@ if __name__ == '__main__':
     parser.add_argument(
         '-m', '--message', action='store_true',
         help='show display messages to stderr')
+    parser.add_argument(
+        '--input', metavar='FILE',
+        help='read FILE by memory mapping, or by decompression if FILE is gzip, xz, or bzip2 file, or receive from tcp://HOST:PORT or ntrip://[USER[:PASSWD]@]HOST[:PORT]/MOUNTPOINT with reconnection, instead of stdin.')
+    parser.add_argument(
+        '--input-thread', action='store_true',
+        help='decompress --input FILE in a background thread.')
+    parser.add_argument(
+        '--input-retry', metavar='N', type=int, default=0,
+        help='stop after N consecutive reconnection failures of --input URL (0: unlimited), default 0.')
+    libindex.add_arguments(parser)
+    libio.add_output_arguments(parser)
+    parser.add_argument(
+        '--perf-report', action='store_true',
+        help='show performance report of processing stages to stderr at exit.')
+    parser.add_argument(
+        '--metrics', metavar='TARGET',
+        help='export metrics in Prometheus text format to TARGET file rewritten periodically, or to http://127.0.0.1:TARGET/metrics when TARGET is a port number.')
     args = parser.parse_args()
+    libio.open_input(args.input, args.input_thread, args.input_retry)
+    if args.perf_report:
+        libperf.enable()
+    if args.metrics:
+        libmetrics.start(parser.prog, args.metrics)
+    end = libindex.check_args(args)
     fp_disp, fp_raw = sys.stdout, None
     if args.e6b or args.l6 or args.b2b:
         fp_disp, fp_raw = None, sys.stdout
     if args.message:  # send display messages to stderr
         fp_disp = sys.stderr
+    fp_rotate = libio.open_output(args,
+        'l6' if args.l6 else 'e6b' if args.e6b else 'b2b') if fp_raw else None
     trace = libtrace.Trace(fp_disp, 0, args.color)
     rcv = SeptReceiver(trace)
     try:
-        while rcv.read():
+        while not libindex.reached(libio.fp_in, end) and rcv.read():
             # print(rcv.msg_name, file=fp_disp)
             if   rcv.msg_name == 'GALRawCNAV':
                 msg = rcv.galrawcnav()
@@ -215,8 +291,14 @@ if __name__ == '__main__':
             if (args.e6b and rcv.msg_name == 'GALRawCNAV') or \
                (args.l6  and rcv.msg_name == 'QZSRawL6'  ) or \
                (args.b2b and rcv.msg_name == 'BDSRawB2b' ):
-                fp_raw.buffer.write(rcv.raw)
-                fp_raw.flush()
+                if fp_rotate:
+                    # do-not-use time is replaced with current time
+                    gpsw = rcv.wnc if rcv.wnc != 65535 else None
+                    fp_rotate.write(rcv.raw, gpsw, rcv.tow)
+                    fp_rotate.flush()
+                else:
+                    fp_raw.buffer.write(rcv.raw)
+                    fp_raw.flush()
     except (BrokenPipeError, IOError):
         devnull = os.open(os.devnull, os.O_WRONLY)
         os.dup2(devnull, sys.stdout.fileno())
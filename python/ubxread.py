@@ -24,6 +24,10 @@ sys.path.append(os.path.dirname(__file__))
 from   alstread import checksum
 from   septread import u4perm
 from   rtcmread import rtk_crc24q
+import libindex
+import libio
+import libmetrics
+import libperf
 import libtrace
 
 try:
@@ -40,23 +44,51 @@ LEN_L1OF =  85  # message length of GLO L1OF, L2OF
 LEN_L1S  = 250  # message length of QZS L1S & SBAS L1C/A
 LEN_B1I  = 300  # message length of BDS B1I, B2I
 
+def encode_sfrbx(gnssid, svid, sigid, words):
+    ''' returns UBX-RXM-SFRBX message with checksum, [1] 3.17.9
+        words: navigation data words in bytes, the bit order of which
+            is the same as the signal
+    '''
+    payload = bytearray(len(words))
+    u4perm(words, payload)
+    head = (8 + len(words)).to_bytes(2, 'little') + \
+        bytes([gnssid, svid, sigid, 0, len(words) // 4, 0, 0x02, 0])
+    csum1, csum2 = checksum(b'\x02\x13' + head + payload)
+    return b'\xb5\x62\x02\x13' + head + payload + bytes([csum1, csum2])
+
+def encode_galinav(svid, inav):
+    ''' returns UBX-RXM-SFRBX message of GAL I/NAV (E1B)
+        inav: I/NAV even and odd pages of 114 bits each in bitstring
+    '''
+    tail = bitstring.Bits(6 + 8)  # tail and padding
+    words = inav[:114] + tail + inav[114:228] + tail
+    return encode_sfrbx(2, svid, 1, words.tobytes())
+
+def encode_qzsl1s(prn, l1s):
+    ''' returns UBX-RXM-SFRBX message of QZS L1S
+        l1s: QZS L1S message of 250 bits in bitstring
+    '''
+    words = l1s[:LEN_L1S] + bitstring.Bits(6)
+    return encode_sfrbx(5, prn - 182, 1, words.tobytes())
+
 class UbxReceiver:
     payload_prev = bitstring.BitStream()  # previous payload
 
-    def __init__(self, trace):
+    def __init__(self, trace, fp=None):
         self.trace = trace
+        self.fp    = fp or libio.fp_in  # own input for multiplexer
 
+    @libperf.timed('read')
     def read(self):
         ''' reads from standard input as u-blox raw message,
             and returns true if successful '''
         while True:
-            sync = bytes(4)
-            while sync != b'\xb5\x62\x02\x13':  # ubx-rxm-sfrbx ([1], 3.17.9)
-                b = sys.stdin.buffer.read(1)
-                if not b:
-                    return False
-                sync = sync[1:4] + b
-            head = sys.stdin.buffer.read(10)
+            sync = b'\xb5\x62\x02\x13'  # ubx-rxm-sfrbx ([1], 3.17.9)
+            nskip = libio.find_sync(self.fp, sync)  # number of skipped bytes
+            if nskip < 0:
+                return False
+            libmetrics.bytes_skipped.inc(n=nskip)
+            head = self.fp.read(10)
             if not head:
                 return False
             msg_len = int.from_bytes(head[0: 2], 'little')
@@ -74,15 +106,17 @@ class UbxReceiver:
             if (msg_len-8)/4 != n_word:
                 libtrace.err(f'numWord mismatch: {(msg_len-8)/4} != {n_word}')
                 continue
-            payload = sys.stdin.buffer.read(n_word * 4)
-            csum    = sys.stdin.buffer.read(2)
+            payload = self.fp.read(n_word * 4)
+            csum    = self.fp.read(2)
             if not payload or not csum:
                 return False
             csum1, csum2 = checksum(b'\x02\x13' + head + payload)
             if csum[0] != csum1 or csum[1] != csum2:
                 libtrace.err(f'checksum error: {csum.hex()}!={csum1:02x}{csum2:02x}')
+                libmetrics.check_failed.inc('checksum')
                 continue
             break
+        libmetrics.frames_read.inc()
         # [1] 1.5.2 GNSS identifiers
         gnssname = ['G', 'S', 'E', 'B', 'IMES', 'J', 'R', 'I'][gnssid]
         # [1] 1.5.4 Signal identifiers
@@ -116,6 +150,7 @@ class UbxReceiver:
             crc_calc = rtk_crc24q(inav_crc, len(inav_crc))
             if crc != crc_calc:
                 libtrace.err(f"CRC error {crc_calc.hex()} != {crc.hex()}")
+                libmetrics.check_failed.inc('crc')
             self.payload = inav + bitstring.Bits('uint4=0')
         elif signame == 'L1CA' or signame == 'L2CM':  # GPS or QZS L1C/A
             self.payload = bitstring.BitStream(payload_perm)[:LEN_L1CA+4]
@@ -215,7 +250,30 @@ if __name__ == '__main__':
         help='show display messages to stderr')
     parser.add_argument('-p', '--prn', type=int, default=0,
         help='specify satellite PRN (PRN=0 means all sats)')
+    parser.add_argument(
+        '--input', metavar='FILE',
+        help='read FILE by memory mapping, or by decompression if FILE is gzip, xz, or bzip2 file, or receive from tcp://HOST:PORT or ntrip://[USER[:PASSWD]@]HOST[:PORT]/MOUNTPOINT with reconnection, instead of stdin.')
+    parser.add_argument(
+        '--input-thread', action='store_true',
+        help='decompress --input FILE in a background thread.')
+    parser.add_argument(
+        '--input-retry', metavar='N', type=int, default=0,
+        help='stop after N consecutive reconnection failures of --input URL (0: unlimited), default 0.')
+    libindex.add_arguments(parser)
+    libio.add_output_arguments(parser)
+    parser.add_argument(
+        '--perf-report', action='store_true',
+        help='show performance report of processing stages to stderr at exit.')
+    parser.add_argument(
+        '--metrics', metavar='TARGET',
+        help='export metrics in Prometheus text format to TARGET file rewritten periodically, or to http://127.0.0.1:TARGET/metrics when TARGET is a port number.')
     args = parser.parse_args()
+    libio.open_input(args.input, args.input_thread, args.input_retry)
+    if args.perf_report:
+        libperf.enable()
+    if args.metrics:
+        libmetrics.start(parser.prog, args.metrics)
+    end = libindex.check_args(args)
     fp_disp, fp_raw = sys.stdout, None
     if args.qzqsm or args.l1s or args.sbas or args.inav:
         fp_disp, fp_raw = None, sys.stdout
@@ -225,10 +283,13 @@ if __name__ == '__main__':
     if args.prn < 0:
         libtrace.err(f"PRN must be positive ({args.prn})")
         sys.exit(1)
+    fp_rotate = libio.open_output(args,
+        'l1s' if args.l1s else 'qzqsm' if args.qzqsm else
+        'sbas' if args.sbas else 'inav') if fp_raw else None
     trace = libtrace.Trace(fp_disp, 0, args.color)
     rcv = UbxReceiver(trace)
     try:
-        while rcv.read():
+        while not libindex.reached(libio.fp_in, end) and rcv.read():
             if args.prn != 0 and rcv.prn != args.prn: continue
             rcv.trace.show(0, rcv.msg)
             if fp_raw:
@@ -236,7 +297,10 @@ if __name__ == '__main__':
                 elif args.qzqsm: raw = rcv.decode_qzsl1s_qzqsm(args)
                 elif args.lnav : raw = rcv.decode_gnsslnav()
                 elif args.inav : raw = rcv.decode_galinav()
-                if raw:
+                if raw and fp_rotate:  # UBX-RXM-SFRBX has no receiver time
+                    fp_rotate.write(raw)
+                    fp_rotate.flush()
+                elif raw:
                     fp_raw.buffer.write(raw)
                     fp_raw.flush()
     except (BrokenPipeError, IOError):
@@ -0,0 +1,82 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# caster.py: stand-in TCP server and NTRIP caster for network input test
+# A part of QZS L6 Tool, https://github.com/yoronneko/qzsl6tool
+#
+# Copyright (c) 2024 Satoshi Takahashi, all rights reserved.
+#
+# Released under BSD 2-clause license.
+
+import argparse
+import base64
+import socket
+
+def serve(conn, data, args):
+    ''' answers a request of the client, and returns True
+        if the data is sent
+    '''
+    if args.raw:
+        conn.sendall(data)
+        return True
+    req = b''
+    while b'\r\n\r\n' not in req:
+        if not (recv := conn.recv(4096)):
+            return False
+        req += recv
+    lines = req.decode().split('\r\n')
+    method, path, version = lines[0].split()
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    auth = 'Basic ' + base64.b64encode(args.auth.encode()).decode()
+    if method != 'GET' or path != '/' + args.mount:
+        conn.sendall(b'SOURCETABLE 200 OK\r\n\r\nENDSOURCETABLE\r\n')
+    elif args.auth and headers.get('authorization') != auth:
+        conn.sendall(b'HTTP/1.1 401 Unauthorized\r\n\r\n')
+    elif version == 'HTTP/1.0':  # NTRIP version 1
+        conn.sendall(b'ICY 200 OK\r\n' + data)
+        return True
+    elif headers.get('ntrip-version') != 'Ntrip/2.0':
+        conn.sendall(b'HTTP/1.1 400 Bad Request\r\n\r\n')
+    else:  # NTRIP version 2 in chunked transfer encoding
+        conn.sendall(b'HTTP/1.1 200 OK\r\nContent-Type: gnss/data\r\n'
+            b'Transfer-Encoding: chunked\r\n\r\n')
+        for pos in range(0, len(data), args.chunk):
+            chunk = data[pos:pos + args.chunk]
+            conn.sendall(f'{len(chunk):x}\r\n'.encode() + chunk + b'\r\n')
+        conn.sendall(b'0\r\n\r\n')
+        return True
+    return False
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Stand-in TCP server and NTRIP caster, which sends FILE divided into parts over successive connections, and exits')
+    parser.add_argument('file', metavar='FILE',
+        help='data sent to the clients.')
+    parser.add_argument('-p', '--port', type=int, default=2101,
+        help='port number to listen, default 2101.')
+    parser.add_argument('-n', '--parts', metavar='N', type=int, default=2,
+        help='divide FILE into N parts, each sent over a connection, default 2.')
+    parser.add_argument('-m', '--mount', default='MOUNT',
+        help='mountpoint of NTRIP caster, default MOUNT.')
+    parser.add_argument('-a', '--auth', metavar='USER:PASSWD', default='',
+        help='require basic authentication of NTRIP caster.')
+    parser.add_argument('-c', '--chunk', metavar='N', type=int, default=1000,
+        help='chunk size of NTRIP version 2 response, default 1000.')
+    parser.add_argument('-r', '--raw', action='store_true',
+        help='send raw data without request as TCP server instead of NTRIP caster.')
+    args = parser.parse_args()
+    with open(args.file, 'rb') as f:
+        data = f.read()
+    size = -(-len(data) // args.parts)  # parts divided in the middle of a frame
+    with socket.create_server(('127.0.0.1', args.port)) as server:
+        part = 0
+        while part < args.parts:
+            conn, _ = server.accept()
+            with conn:
+                if serve(conn, data[part * size:(part + 1) * size], args):
+                    part += 1
+
+# EOF
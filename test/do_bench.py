@@ -0,0 +1,209 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# do_bench.py: throughput benchmark of readers and decoders
+# A part of QZS L6 Tool, https://github.com/yoronneko/qzsl6tool
+#
+# Copyright (c) 2024 Satoshi Takahashi, all rights reserved.
+#
+# Released under BSD 2-clause license.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+TESTDIR  = os.path.dirname(os.path.abspath(__file__))
+CODEDIR  = os.path.join(TESTDIR, '../python/')
+SAMPLE   = os.path.join(TESTDIR, '../sample/')
+EXPECT   = os.path.join(TESTDIR, 'expect/')
+BASELINE = os.path.join(TESTDIR, 'bench_baseline.json')
+PREAMBLE_L6 = b'\x1a\xcf\xfc\x1d'  # QZS L6 preamble
+
+# benchmark cases: [name, code, argument, input, message count]
+# input:    file name, or (generator code, argument, source file name) for
+#           synthetic input that is generated with the scale
+# message count: 'line' counts display lines,
+#           bytes counts the pattern in the input
+BENCH_CASE = [
+['qzsl6read'    , 'qzsl6read.py'  , [], SAMPLE + '2019001A.l6'                 , 'line'],
+['qzsl6read-t2' , 'qzsl6read.py'  , ['-t', '2'], EXPECT + '20220326-231200clas.l6', 'line'],
+['rtcmread'     , 'rtcmread.py'   , [], SAMPLE + '20221213-010900.rtcm'        , 'line'],
+['gale6read'    , 'gale6read.py'  , [], EXPECT + '20230305-063900has.e6b'      , 'line'],
+['bdsb2read'    , 'bdsb2read.py'  , [], EXPECT + '20230819-081730hasbds.b2b'   , 'line'],
+['galinavread'  , 'galinavread.py', [], EXPECT + '20230919-114418.inav'        , 'line'],
+['qzsl1sread'   , 'qzsl1sread.py' , [], EXPECT + '20230919-114418.l1s'         , 'line'],
+['septread'     , 'septread.py'   , [], SAMPLE + '20230819-081730hasbds.sbf'   , 'line'],
+['novread'      , 'novread.py'    , [], SAMPLE + '20230819-053733has.nov'      , 'line'],
+['ubxread'      , 'ubxread.py'    , [], SAMPLE + '20230919-114418.ubx'         , 'line'],
+['alstread'     , 'alstread.py'   , [], SAMPLE + '20220326-231200clas.alst'    , 'line'],
+['psdrread'     , 'psdrread.py'   , [], SAMPLE + '20230305-063900has.psdr'     , 'line'],
+['l6rtcm4050'   , 'l6rtcm4050.py' , [], SAMPLE + '2022001A.l6'                 , PREAMBLE_L6],
+['qzsl6read-gen', 'qzsl6read.py'  , [], ('cssrgen.py', ['-n', '6'], None)      , 'line'],
+['septread-gen' , 'septread.py'   , [],
+    ('rcvgen.py', ['sept', '-l', '--garbage', '0.1'], EXPECT + '20230819-082130clas.l6'), 'line'],
+['ubxread-gen'  , 'ubxread.py'    , [],
+    ('rcvgen.py', ['ubx', '--l1s', '--error', '0.1'], EXPECT + '20230919-114418.l1s'), 'line'],
+]
+
+def make_input(src, scale, tmpdir, name):
+    ''' returns input file name of the benchmark case
+        sample data is repeated, and synthetic data is generated
+        with the scale
+    '''
+    fname = os.path.join(tmpdir, name)
+    if isinstance(src, tuple):
+        code, arg, fsrc = src
+        if code == 'cssrgen.py':  # scales the number of subframes
+            arg = [arg[0], str(int(arg[1]) * scale)]
+        else:                     # scales the number of repetitions
+            arg = arg + ['-n', str(scale)]
+        with open(fname, 'wb') as fout:
+            fin = open(fsrc, 'rb') if fsrc else subprocess.DEVNULL
+            subprocess.run([sys.executable, CODEDIR + code] + arg,
+                stdin=fin, stdout=fout, stderr=subprocess.DEVNULL, check=True)
+            if fsrc:
+                fin.close()
+    else:
+        with open(src, 'rb') as f:
+            data = f.read()
+        with open(fname, 'wb') as f:
+            f.write(data * scale)
+    return fname
+
+def run_case(code, arg, fname, count):
+    ''' runs code with the input file, and returns
+        (elapsed time in second, number of messages, peak RSS in kbyte)
+        raises RuntimeError when the code exits with non-zero status
+    '''
+    with open(fname, 'rb') as fin, tempfile.TemporaryFile() as ferr:
+        t_start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, CODEDIR + code] + arg,
+            stdin=fin, stdout=subprocess.PIPE, stderr=ferr)
+        out = proc.stdout.read()
+        proc.stdout.close()
+        _, status, rusage = os.wait4(proc.pid, 0)  # resource usage of this child
+        proc.returncode = os.waitstatus_to_exitcode(status) \
+            if hasattr(os, 'waitstatus_to_exitcode') else status >> 8
+        elapsed = time.perf_counter() - t_start
+        if proc.returncode != 0:
+            ferr.seek(0)
+            msg = ferr.read().decode(errors='replace').strip().splitlines()
+            raise RuntimeError(f'{code} exited with status {proc.returncode}' +
+                (f': {msg[-1]}' if msg else ''))
+    if count == 'line':
+        nmsg = out.count(b'\n')
+    else:
+        with open(fname, 'rb') as f:
+            nmsg = f.read().count(count)
+    rss = rusage.ru_maxrss
+    if sys.platform == 'darwin':  # ru_maxrss is in byte on macOS
+        rss //= 1024
+    return elapsed, nmsg, rss
+
+def bench(cases, scale, nrun):
+    ''' runs benchmark cases and returns the results
+        and the list of failed case names
+    '''
+    result, failed = {}, []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name, code, arg, src, count in cases:
+            fname = make_input(src, scale, tmpdir, name)
+            size  = os.path.getsize(fname)
+            best  = None
+            try:
+                for _ in range(nrun):  # the best of nrun runs
+                    elapsed, nmsg, rss = run_case(code, arg, fname, count)
+                    if best is None or elapsed < best[0]:
+                        best = (elapsed, nmsg, rss)
+            except RuntimeError as e:
+                failed.append(name)
+                print(f"{name:14s} FAILED ({e})")
+                continue
+            elapsed, nmsg, rss = best
+            result[name] = {
+                'msg_per_s'  : round(nmsg / elapsed, 1),
+                'mbyte_per_s': round(size / elapsed / 1e6, 3),
+                'peak_rss_kb': rss,
+                'messages'   : nmsg,
+                'bytes'      : size,
+            }
+            print(f"{name:14s} {nmsg:8d} msg {size/1e6:8.3f} MB {elapsed:7.3f} s "
+                  f"{nmsg/elapsed:9.1f} msg/s {size/elapsed/1e6:7.3f} MB/s "
+                  f"{rss/1024:7.1f} MB RSS")
+    return result, failed
+
+def compare(result, baseline, threshold):
+    ''' returns list of regressed case names, where the throughput
+        is lower than the baseline by more than threshold percent
+    '''
+    regressed = []
+    for name, res in result.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratio = res['mbyte_per_s'] / base['mbyte_per_s'] if base['mbyte_per_s'] else 1
+        change = (ratio - 1) * 100
+        if change < -threshold:
+            regressed.append(name)
+            mark = 'REGRESSED'
+        else:
+            mark = 'ok'
+        print(f"{name:14s} {base['mbyte_per_s']:7.3f} -> {res['mbyte_per_s']:7.3f} MB/s ({change:+6.1f}%) {mark}")
+    return regressed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Throughput benchmark of readers and decoders')
+    parser.add_argument(
+        '-b', '--baseline', default=BASELINE,
+        help=f'baseline JSON file name, default {os.path.relpath(BASELINE)}.')
+    parser.add_argument(
+        '-k', '--keyword', default='',
+        help='run the benchmark cases whose name contains the keyword.')
+    parser.add_argument(
+        '-n', '--nrun', type=int, default=3,
+        help='number of runs of each case to take the best, default 3.')
+    parser.add_argument(
+        '-s', '--scale', type=int, default=4,
+        help='scale of input data, default 4.')
+    parser.add_argument(
+        '-t', '--threshold', type=float, default=20,
+        help='allowed throughput regression in percent, default 20.')
+    parser.add_argument(
+        '-u', '--update', action='store_true',
+        help='store the results as the baseline.')
+    args = parser.parse_args()
+    if args.scale < 1 or args.nrun < 1:
+        print(f'scale and nrun should be positive ({args.scale}, {args.nrun}).', file=sys.stderr)
+        sys.exit(1)
+    cases  = [case for case in BENCH_CASE if args.keyword in case[0]]
+    result, failed = bench(cases, args.scale, args.nrun)
+    if failed:  # the baseline is not stored either
+        print(f"failed: {', '.join(failed)}")
+        sys.exit(1)
+    if args.update:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(result)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'baseline is stored in {args.baseline}')
+        sys.exit(0)
+    if not os.path.exists(args.baseline):
+        print(f'no baseline {args.baseline}, use -u option to store it.')
+        sys.exit(0)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressed = compare(result, baseline, args.threshold)
+    if regressed:
+        print(f"throughput regression: {', '.join(regressed)}")
+        sys.exit(1)
+
+# EOF